@@ -11,17 +11,48 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from config import Config
-from extensions import db, jwt
+from extensions import db, init_db, jwt
+import compression
+import events
+import ingest
+import json_provider
+import media
+import metrics
+import query_counter
+import replicas
+import search
+import stats
+import storage
+import structured_logging
+import sync
+import user_cache
 from routes.auth import auth_bp
 from routes.reports import reports_bp
 from routes.moderator import moderator_bp
 from routes.admin import admin_bp
-from routes.uploads import uploads_bp
+from routes.uploads import uploads_bp, send_upload
 
-def create_app():
+def create_app(config_class=Config):
     """Application factory pattern"""
     app = Flask(__name__)
-    app.config.from_object(Config)
+    app.config.from_object(config_class)
+    
+    # Faster JSON serialization when orjson is available
+    json_provider.init_app(app)
+    
+    # gzip/brotli for large JSON and CSV responses (registered first so it runs
+    # after every other after_request hook)
+    compression.init_app(app)
+    
+    # Leveled, sampled JSON logs with one access line per request
+    structured_logging.init_app(app)
+    
+    # Per-request SQL query counts, N+1 warnings and query budgets
+    query_counter.init_app(app)
+    
+    # Latency histograms, status counts and Server-Timing (after json_provider,
+    # whose encoder it times)
+    metrics.init_app(app)
     
     # Enable CORS for frontend - allow all localhost ports for development
     # Using regex pattern to allow all local network IPs and localhost variants
@@ -35,13 +66,13 @@ def create_app():
              'http://192.168.142.246:5173'
          ],
          supports_credentials=True,
-         allow_headers=['Content-Type', 'Authorization', 'Accept'],
+         allow_headers=['Content-Type', 'Authorization', 'Accept', 'Content-Range'],
          expose_headers=['Content-Type', 'Authorization'],
          methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS'],
          max_age=3600)
     
     # Initialize extensions
-    db.init_app(app)
+    init_db(app)
     jwt.init_app(app)
     
     # JWT Error Handlers
@@ -52,21 +83,27 @@ def create_app():
     @jwt.invalid_token_loader
     def invalid_token_callback(error):
         error_msg = str(error)
-        # Log the error for debugging
-        import traceback
-        print(f"JWT Invalid Token Error: {error_msg}")
-        print(f"Error type: {type(error).__name__}")
-        traceback.print_exc()
+        app.logger.warning('Invalid token', extra={'error': error_msg, 'error_type': type(error).__name__})
         return jsonify({'error': f'Invalid token. Please login again.', 'details': error_msg}), 422
     
     @jwt.unauthorized_loader
     def missing_token_callback(error):
         return jsonify({'error': 'Authorization token is missing'}), 401
     
+    @jwt.revoked_token_loader
+    def revoked_token_callback(jwt_header, jwt_payload):
+        return jsonify({'error': 'Account is deactivated or no longer exists'}), 401
+    
     @jwt.needs_fresh_token_loader
     def token_not_fresh_callback(jwt_header, jwt_payload):
         return jsonify({'error': 'Token is not fresh'}), 401
     
+    # Resolve current_user lazily through a TTL/LRU cache
+    user_cache.init_app(app, jwt)
+    
+    # Send marked read-only views to the read replicas, if any are configured
+    replicas.init_app(app)
+    
     # Register blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(reports_bp)
@@ -77,15 +114,34 @@ def create_app():
     # Serve uploaded files
     @app.route('/uploads/<filename>')
     def uploaded_file(filename):
-        """Serve uploaded files"""
-        from flask import send_from_directory
-        upload_folder = os.path.join(os.path.dirname(__file__), Config.UPLOAD_FOLDER)
-        return send_from_directory(upload_folder, filename)
+        """Serve uploaded files to their owners and moderators, with ETag, caching and Range support"""
+        return send_upload(filename)
     
     # Create tables
     with app.app_context():
         db.create_all()
     
+    # Dashboard counter cache and its repair command
+    stats.init_app(app)
+    
+    # Full-text search index over reports
+    search.init_app(app)
+    
+    # Pub/sub for live moderator queue events
+    events.init_app(app)
+    
+    # Tombstones for deleted reports, read by the delta-sync endpoints
+    sync.init_app(app)
+    
+    # Photos must be stripped of EXIF/GPS before they are stored
+    ingest.init_app(app)
+    
+    # Background thumbnail/poster generation for uploads
+    media.init_app(app)
+    
+    # Cleanup of uploads that were never attached to a report
+    storage.init_app(app)
+    
     @app.route('/api/health', methods=['GET'])
     def health():
         """Health check endpoint"""
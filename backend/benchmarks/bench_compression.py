@@ -0,0 +1,67 @@
+"""
+Response compression benchmark
+Measures CPU time per response against bytes saved when gzip/brotli compress
+report list payloads of typical moderator queue sizes
+
+Usage: python benchmarks/bench_compression.py [--sizes 20,50,200] [--repeat 20]
+"""
+import argparse
+import json
+import sys
+import os
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from config import Config
+import compression
+from benchmarks.bench_serialization import build_reports
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+def bench(label, body, encoding, config, repeat):
+    best = min(_timed(lambda: compression.compress(body, encoding, config)) for _ in range(repeat))
+    compressed = len(compression.compress(body, encoding, config))
+    return {
+        'case': label,
+        'ms_per_response': round(best * 1000, 3),
+        'original_bytes': len(body),
+        'compressed_bytes': compressed,
+        'bytes_saved': len(body) - compressed,
+        'ratio': round(len(body) / compressed, 2)
+    }
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='20,50,200', help='Reports per response')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    app = create_app(BenchConfig)
+    levels = [('gzip', 'COMPRESSION_LEVEL', level) for level in (1, 6, 9)]
+    if compression.brotli is not None:
+        levels += [('br', 'COMPRESSION_BROTLI_QUALITY', quality) for quality in (1, 4, 11)]
+
+    results = []
+    with app.app_context():
+        for size in (int(s) for s in args.sizes.split(',')):
+            body = app.json.dumps({'reports': [r.to_dict() for r in build_reports(size)]}).encode('utf-8')
+            for encoding, key, level in levels:
+                config = {**app.config, key: level}
+                results.append(bench(f'{size} reports {encoding}@{level}', body, encoding, config, args.repeat))
+
+    print(json.dumps({'brotli_available': compression.brotli is not None, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
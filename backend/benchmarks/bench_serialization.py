@@ -0,0 +1,92 @@
+"""
+Serialization micro-benchmark
+Compares report payload throughput for the stdlib and orjson JSON providers,
+with and without a ?fields= projection
+
+Usage: python benchmarks/bench_serialization.py [--count 10000] [--repeat 3]
+"""
+import argparse
+import json
+import sys
+import os
+import time
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask.json.provider import DefaultJSONProvider
+from app import create_app
+from config import Config
+from json_provider import OrjsonProvider, orjson
+from models import Report, ReportAttachment, ReportRelation, ReportTag, User
+
+LIST_FIELDS = ['id', 'report_number', 'title', 'status', 'severity', 'created_at']
+
+
+class BenchConfig(Config):
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+
+
+def build_reports(count):
+    """Build transient reports with realistic field sizes (no database needed)"""
+    reporter = User(id=1, email='reporter@example.com', role='user', full_name='Reporter',
+                    is_active=True, created_at=datetime(2025, 1, 1))
+    start = datetime(2025, 1, 1)
+    reports = []
+    for i in range(count):
+        report = Report(
+            id=i + 1, user_id=1, report_number=f'REP-20250101-{i:04d}',
+            title=f'Harassment near the station #{i}', description='Detailed account of the incident. ' * 30,
+            category='physical', subcategory='verbal', location='Main street bus stop',
+            incident_date=start, severity='high', urgency='urgent', evidence='Screenshots and links. ' * 5,
+            contact_phone='+254700000000', preferred_contact_method='email', follow_up_requested=True,
+            witnesses='Two bystanders at the stop', perpetrator_info='Unknown adult male',
+            anonymous_report=False, status='pending', resolution_notes=None,
+            created_at=start + timedelta(seconds=i), updated_at=start + timedelta(seconds=i)
+        )
+        report.user = reporter
+        report.report_tags = [ReportTag(tag='transport'), ReportTag(tag='night')]
+        report.attachments = [ReportAttachment(position=0, name='photo.jpg', type='image/jpeg',
+                                               url=f'/uploads/{i}_photo.jpg', size=2048000,
+                                               uploaded_at='2025-01-01T00:00:00')]
+        report.relations = [ReportRelation(related_report_id=max(i, 1))]
+        reports.append(report)
+    return reports
+
+
+def bench(label, fn, count, repeat):
+    best = min(_timed(fn) for _ in range(repeat))
+    return {'case': label, 'seconds': round(best, 4), 'reports_per_second': round(count / best)}
+
+
+def _timed(fn):
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--count', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    app = create_app(BenchConfig)
+    providers = {'stdlib': DefaultJSONProvider(app)}
+    if orjson is not None:
+        providers['orjson'] = OrjsonProvider(app)
+
+    with app.app_context():
+        reports = build_reports(args.count)
+        results = []
+        for name, provider in providers.items():
+            results.append(bench(f'{name} full', lambda: provider.dumps([r.to_dict() for r in reports]),
+                                 args.count, args.repeat))
+            results.append(bench(f'{name} fields={",".join(LIST_FIELDS)}',
+                                 lambda: provider.dumps([r.to_dict(fields=LIST_FIELDS) for r in reports]),
+                                 args.count, args.repeat))
+
+    print(json.dumps({'count': args.count, 'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+"""
+SQLite concurrency benchmark
+Runs worker processes (like gunicorn workers) doing a mix of report reads,
+inserts and status updates against a SQLite file, once with SQLite's stock
+settings and once with the production pragmas from extensions.sqlite_pragmas
+(WAL, synchronous=NORMAL, busy_timeout, mmap_size, cache_size). Prints
+throughput, "database is locked" errors and p50/p95/p99 latency per mode
+
+Usage: python benchmarks/bench_sqlite_concurrency.py [--workers 8] [--seconds 10] [--writes 0.2] [--reports 2000]
+"""
+import argparse
+import json
+import multiprocessing
+import random
+import sys
+import os
+import tempfile
+import time
+from datetime import datetime
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import select, update
+from sqlalchemy.exc import OperationalError
+from app import create_app
+from config import Config
+from extensions import db
+from filters import REPORT_STATUSES
+from models import Report
+from load_test import percentile
+import synthetic_data
+
+# Blank settings skip the pragma, leaving SQLite's defaults (rollback journal, synchronous=FULL)
+STOCK = {'SQLITE_JOURNAL_MODE': '', 'SQLITE_SYNCHRONOUS': '', 'SQLITE_BUSY_TIMEOUT_MS': '',
+         'SQLITE_MMAP_SIZE': '', 'SQLITE_CACHE_SIZE': ''}
+TUNED = {name: getattr(Config, name) for name in STOCK}
+
+
+def bench_app(path, settings):
+    config = type('BenchConfig', (Config,), {
+        'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}',
+        'MEDIA_WORKERS': 0,
+        'LOG_LEVEL': 'WARNING',
+        **settings
+    })
+    return create_app(config)
+
+
+def worker(args):
+    """Run the read/write mix until deadline; return (kind, ms, ok) samples"""
+    path, settings, write_ratio, deadline, user_ids, report_ids, seed = args
+    rng = random.Random(seed)
+    app = bench_app(path, settings)
+    samples = []
+    with app.app_context():
+        while time.time() < deadline:
+            roll = rng.random()
+            kind = 'read' if roll >= write_ratio else ('insert' if roll < write_ratio / 2 else 'update')
+            start = time.perf_counter()
+            try:
+                if kind == 'read':
+                    db.session.execute(select(Report).where(Report.user_id == rng.choice(user_ids))
+                                       .order_by(Report.created_at.desc()).limit(50)).scalars().all()
+                    db.session.rollback()  # End the read transaction like a request teardown would
+                elif kind == 'insert':
+                    db.session.add(Report(user_id=rng.choice(user_ids), title='Concurrency bench',
+                                          description=synthetic_data.filler_text(rng, 200, 1500),
+                                          category='online', report_number=f'REP-CONC-{seed}-{len(samples)}'))
+                    db.session.commit()
+                else:
+                    db.session.execute(update(Report).where(Report.id == rng.choice(report_ids))
+                                       .values(status=rng.choice(REPORT_STATUSES), updated_at=datetime.utcnow()))
+                    db.session.commit()
+                ok = True
+            except OperationalError as e:
+                db.session.rollback()
+                if 'locked' not in str(e) and 'busy' not in str(e):
+                    raise
+                ok = False
+            samples.append((kind, (time.perf_counter() - start) * 1000, ok))
+        db.session.remove()
+    return samples
+
+
+def run_mode(name, settings, folder, args):
+    path = os.path.join(folder, f'{name}.db')
+    app = bench_app(path, settings)
+    with app.app_context():
+        synthetic_data.seed(users=50, reports=args.reports, notes_per_report=0, seed=1)
+        user_ids = [u for u, in db.session.execute(select(Report.user_id).distinct())]
+        report_ids = list(db.session.execute(select(Report.id)).scalars())
+        db.session.remove()
+        db.engine.dispose()
+
+    deadline = time.time() + 1 + args.seconds  # Headroom for worker startup
+    jobs = [(path, settings, args.writes, deadline, user_ids, report_ids, i) for i in range(args.workers)]
+    with multiprocessing.get_context('spawn').Pool(args.workers) as pool:
+        samples = [s for chunk in pool.map(worker, jobs) for s in chunk]
+
+    result = {'mode': name, 'operations': len(samples),
+              'ops_per_second': round(len(samples) / args.seconds, 1),
+              'locked_errors': sum(1 for _, _, ok in samples if not ok)}
+    for kind in ('read', 'insert', 'update'):
+        latencies = sorted(ms for k, ms, ok in samples if k == kind and ok)
+        result[kind] = {'count': len(latencies)}
+        if latencies:
+            result[kind].update({f'p{p}_ms': round(percentile(latencies, p), 2) for p in (50, 95, 99)})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=8, help='Worker processes')
+    parser.add_argument('--seconds', type=float, default=10, help='Run time per mode')
+    parser.add_argument('--writes', type=float, default=0.2, help='Fraction of operations that write')
+    parser.add_argument('--reports', type=int, default=2000, help='Reports seeded before the run')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        results = [run_mode('stock', STOCK, folder, args), run_mode('tuned', TUNED, folder, args)]
+    print(json.dumps({'workers': args.workers, 'seconds': args.seconds, 'write_ratio': args.writes,
+                      'results': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
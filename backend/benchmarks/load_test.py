@@ -0,0 +1,244 @@
+"""
+Endpoint load test
+Seeds synthetic data, then drives every blueprint (auth, reports, moderator,
+admin, uploads) at a fixed concurrency and reports throughput and
+p50/p95/p99 latency per endpoint as JSON, so runs can be compared across
+commits. Runs in-process through the Flask test client against a temporary
+SQLite file by default; with --url it drives a running server instead (seed
+that server's database with synthetic_data.py first)
+
+Usage: python benchmarks/load_test.py [--users 100] [--reports 2000] [--requests 200]
+       [--concurrency 8] [--only reports.] [--url http://localhost:5000] [--output run.json]
+"""
+import argparse
+import json
+import random
+import subprocess
+import sys
+import os
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from config import Config
+import synthetic_data
+
+# Uploads are small PDFs: they skip image re-encoding, so timings measure the request path
+PDF = b'%PDF-1.4\n' + b'0' * 2048
+
+
+class BenchConfig(Config):
+    MEDIA_WORKERS = 0
+    LOG_LEVEL = 'WARNING'  # Access lines would dominate the run
+
+
+class ClientDriver:
+    """Requests through the Flask test client, one client per thread"""
+
+    def __init__(self, app):
+        self._app = app
+        self._local = threading.local()
+
+    def request(self, method, path, token=None, json_body=None, upload=None):
+        if not hasattr(self._local, 'client'):
+            self._local.client = self._app.test_client()
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        kwargs = {'headers': headers}
+        if json_body is not None:
+            kwargs['json'] = json_body
+        if upload is not None:
+            name, content = upload
+            kwargs['data'] = {'file': (BytesIO(content), name)}
+            kwargs['content_type'] = 'multipart/form-data'
+        response = self._local.client.open(path, method=method, **kwargs)
+        body = response.get_data()
+        response.close()
+        return response.status_code, body
+
+
+class HttpDriver:
+    """Requests against a running server over HTTP"""
+
+    def __init__(self, base_url):
+        self._base = base_url.rstrip('/')
+
+    def request(self, method, path, token=None, json_body=None, upload=None):
+        headers = {'Authorization': f'Bearer {token}'} if token else {}
+        data = None
+        if json_body is not None:
+            data = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        elif upload is not None:
+            boundary = uuid.uuid4().hex
+            name, content = upload
+            data = (f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{name}"\r\n'
+                    f'Content-Type: application/octet-stream\r\n\r\n').encode('utf-8') + content + \
+                f'\r\n--{boundary}--\r\n'.encode('utf-8')
+            headers['Content-Type'] = f'multipart/form-data; boundary={boundary}'
+        req = urllib.request.Request(self._base + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(req) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+
+def build_scenarios(driver, tokens, report_ids, upload_url):
+    """(name, callable) for each endpoint; callables return the status code"""
+    rng = random.Random(7)
+    user, moderator, admin = tokens['user'], tokens['moderator'], tokens['admin']
+
+    def get(path, token):
+        def call():
+            return driver.request('GET', path() if callable(path) else path, token)[0]
+        return call
+
+    def new_report():
+        body = {'title': 'Load test report', 'description': synthetic_data.filler_text(rng, 200, 1500),
+                'category': 'online', 'tags': ['transport'], 'severity': 'high'}
+        return driver.request('POST', '/api/reports', user, json_body=body)[0]
+
+    def add_note():
+        path = f'/api/moderator/reports/{rng.choice(report_ids)}/note'
+        return driver.request('POST', path, moderator, json_body={'note': 'Reviewed during load test'})[0]
+
+    def upload():
+        # Unique bytes per request, so deduplication doesn't turn uploads into no-ops
+        content = PDF + uuid.uuid4().bytes
+        return driver.request('POST', '/api/uploads', user, upload=('evidence.pdf', content))[0]
+
+    def login():
+        body = {'email': synthetic_data.user_email('user', 0), 'password': synthetic_data.PASSWORD}
+        return driver.request('POST', '/api/auth/login', json_body=body)[0]
+
+    return [
+        ('auth.login', login),
+        ('reports.list', get('/api/reports?limit=50', user)),
+        ('reports.list_all', get('/api/reports?all=true&limit=50', moderator)),
+        ('reports.list_fields', get('/api/reports?all=true&limit=50&fields=id,report_number,title,status,severity,created_at', moderator)),
+        ('reports.search', get('/api/reports/search?q=station', moderator)),
+        ('reports.detail', get(lambda: f'/api/reports/{rng.choice(report_ids)}', moderator)),
+        ('reports.changes', get('/api/reports/changes?all=true&limit=50', moderator)),
+        ('reports.create', new_report),
+        ('moderator.queue', get('/api/moderator/reports?severity=critical&urgency=immediate', moderator)),
+        ('moderator.reviewed', get('/api/moderator/reports/reviewed?limit=50', moderator)),
+        ('moderator.detail', get(lambda: f'/api/moderator/reports/{rng.choice(report_ids)}', moderator)),
+        ('moderator.note', add_note),
+        ('admin.stats', get('/api/admin/stats', admin)),
+        ('admin.users', get('/api/admin/users', admin)),
+        ('admin.export', get('/api/admin/reports/export?status=resolved', admin)),
+        ('uploads.upload', upload),
+        ('uploads.serve', get(upload_url, user)),
+    ]
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return None
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+def run(name, fn, requests, concurrency):
+    """Call fn requests times from concurrency threads; summarize latency and errors"""
+    def timed(_):
+        start = time.perf_counter()
+        try:
+            status = fn()
+        except Exception:
+            status = None
+        return time.perf_counter() - start, status
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        samples = list(pool.map(timed, range(requests)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(seconds * 1000 for seconds, _ in samples)
+    errors = sum(1 for _, status in samples if status is None or status >= 400)
+    return {
+        'endpoint': name,
+        'requests': requests,
+        'errors': errors,
+        'throughput_rps': round(requests / elapsed, 1),
+        'mean_ms': round(sum(latencies) / len(latencies), 2),
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2)
+    }
+
+
+def _commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=100)
+    parser.add_argument('--reports', type=int, default=2000)
+    parser.add_argument('--notes', type=int, default=2, help='Moderator notes per report')
+    parser.add_argument('--requests', type=int, default=200, help='Requests per endpoint')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--only', default='', help='Run endpoints whose name starts with this prefix')
+    parser.add_argument('--url', help='Drive a running server instead of the in-process test client')
+    parser.add_argument('--output', help='Also write the JSON results to this file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        if args.url:
+            driver = HttpDriver(args.url)
+            summary = {'accounts': {role: synthetic_data.user_email(role, 0) for role in ('user', 'moderator', 'admin')}}
+        else:
+            BenchConfig.SQLALCHEMY_DATABASE_URI = f'sqlite:///{os.path.join(folder, "bench.db")}'
+            BenchConfig.UPLOAD_FOLDER = os.path.join(folder, 'uploads')
+            app = create_app(BenchConfig)
+            with app.app_context():
+                summary = synthetic_data.seed(args.users, args.reports, args.notes)
+            driver = ClientDriver(app)
+
+        tokens = {}
+        for role, email in summary['accounts'].items():
+            status, body = driver.request('POST', '/api/auth/login',
+                                          json_body={'email': email, 'password': synthetic_data.PASSWORD})
+            if status != 200:
+                sys.exit(f'Could not log in as {email} ({status}); seed the database with synthetic_data.py')
+            tokens[role] = json.loads(body)['access_token']
+
+        status, body = driver.request('GET', '/api/reports?all=true&limit=200&fields=id', tokens['moderator'])
+        report_ids = [r['id'] for r in json.loads(body)['reports']]
+        status, body = driver.request('POST', '/api/uploads', tokens['user'], upload=('evidence.pdf', PDF))
+        upload_url = json.loads(body)['file']['url']
+
+        results = [run(name, fn, args.requests, args.concurrency)
+                   for name, fn in build_scenarios(driver, tokens, report_ids, upload_url)
+                   if name.startswith(args.only)]
+
+    output = {
+        'commit': _commit(),
+        'target': args.url or 'test-client',
+        'data': {k: v for k, v in summary.items() if k not in ('accounts', 'password')},
+        'requests_per_endpoint': args.requests,
+        'concurrency': args.concurrency,
+        'results': results
+    }
+    text = json.dumps(output, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    print(text)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""
+Synthetic data generator
+Seeds users (with moderators and admins among them), reports with realistic
+field sizes, tags and attachments, and moderator notes. Deterministic for a
+given --seed, so benchmark runs on different commits see the same data
+
+Usage: python benchmarks/synthetic_data.py [--users 200] [--reports 5000] [--notes 2]
+(seeds the database configured by DATABASE_URL)
+"""
+import argparse
+import json
+import random
+import sys
+import os
+from datetime import datetime, timedelta
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash
+from extensions import db
+from filters import REPORT_SEVERITIES, REPORT_STATUSES, REPORT_URGENCIES
+from models import ModeratorNote, Report, ReportAttachment, ReportTag, User
+
+PASSWORD = 'password123'  # Every seeded account's password
+CATEGORIES = ['online', 'physical', 'workplace', 'verbal', 'stalking']
+TAGS = ['transport', 'night', 'school', 'market', 'repeat', 'social-media', 'group', 'witnessed']
+LOCATIONS = ['Main street bus stop', 'Central market', 'University campus', 'Office block B', 'Matatu stage']
+WORDS = ('the a he she they followed shouted near stop station evening morning bus market phone message '
+         'again threatened touched photo crowd street walked home work school friend unknown man group '
+         'afraid reported screenshot account laughed blocked waited').split()
+BATCH_SIZE = 500
+
+
+def filler_text(rng, low, high):
+    """Sentence-like filler between low and high characters long"""
+    target = rng.randint(low, high)
+    words = []
+    while sum(len(w) + 1 for w in words) < target:
+        words.append(rng.choice(WORDS))
+    return ' '.join(words).capitalize()[:target]
+
+
+def user_email(role, i):
+    return f'{role}{i}@bench.test'
+
+
+def seed(users=200, reports=5000, notes_per_report=2, moderators=None, admins=2, seed=42):
+    """
+    Insert synthetic data into the current app's database and return a
+    summary of what was created, including the accounts to log in with.
+    Must be called inside an app context.
+    """
+    rng = random.Random(seed)
+    moderators = moderators if moderators is not None else max(1, users // 20)
+    password_hash = generate_password_hash(PASSWORD)  # Hashing is slow; every account shares one
+    start = datetime.utcnow() - timedelta(days=365)
+
+    people = {'user': [], 'moderator': [], 'admin': []}
+    for role, count in [('user', users), ('moderator', moderators), ('admin', admins)]:
+        for i in range(count):
+            user = User(email=user_email(role, i), password_hash=password_hash, role=role,
+                        full_name=f'Bench {role.title()} {i}', created_at=start)
+            db.session.add(user)
+            people[role].append(user)
+    db.session.commit()
+    reviewers = [u.id for u in people['moderator'] + people['admin']]
+    reporter_ids = [u.id for u in people['user']]
+
+    created = 0
+    while created < reports:
+        batch = []
+        for i in range(created, min(created + BATCH_SIZE, reports)):
+            created_at = start + timedelta(minutes=i * 525600 // max(reports, 1))
+            report = Report(
+                user_id=rng.choice(reporter_ids), report_number=f'REP-BENCH-{i:06d}',
+                title=filler_text(rng, 20, 120), description=filler_text(rng, 200, 2000),
+                category=rng.choice(CATEGORIES), subcategory=rng.choice([None, 'verbal', 'physical']),
+                location=rng.choice(LOCATIONS), incident_date=created_at - timedelta(hours=rng.randint(1, 72)),
+                severity=rng.choice(REPORT_SEVERITIES), urgency=rng.choice(REPORT_URGENCIES),
+                evidence=filler_text(rng, 0, 300), contact_phone='+254700000000',
+                witnesses=filler_text(rng, 0, 200) or None, perpetrator_info=filler_text(rng, 0, 200) or None,
+                anonymous_report=rng.random() < 0.2, status=rng.choice(REPORT_STATUSES),
+                created_at=created_at, updated_at=created_at
+            )
+            report.report_tags = [ReportTag(tag=tag) for tag in rng.sample(TAGS, rng.randint(0, 3))]
+            report.attachments = [ReportAttachment(position=p, name=f'evidence{p}.jpg', type='image/jpeg',
+                                                   url=f'/uploads/bench{i}_{p}.jpg', size=rng.randint(50_000, 3_000_000),
+                                                   uploaded_at=created_at.isoformat())
+                                  for p in range(rng.randint(0, 2))]
+            batch.append(report)
+        db.session.add_all(batch)
+        db.session.flush()
+        for report in batch:
+            for n in range(notes_per_report):
+                db.session.add(ModeratorNote(report_id=report.id, moderator_id=rng.choice(reviewers),
+                                             note=filler_text(rng, 40, 400),
+                                             created_at=report.created_at + timedelta(hours=n + 1)))
+        db.session.commit()
+        db.session.expunge_all()
+        created += len(batch)
+
+    return {
+        'users': users, 'moderators': moderators, 'admins': admins,
+        'reports': reports, 'notes': reports * notes_per_report,
+        'password': PASSWORD,
+        'accounts': {role: user_email(role, 0) for role in people if people[role]}
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--users', type=int, default=200)
+    parser.add_argument('--reports', type=int, default=5000)
+    parser.add_argument('--notes', type=int, default=2, help='Moderator notes per report')
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    from app import create_app
+    app = create_app()
+    with app.app_context():
+        print(json.dumps(seed(args.users, args.reports, args.notes, seed=args.seed), indent=2))
+
+
+if __name__ == '__main__':
+    main()
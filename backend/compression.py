@@ -0,0 +1,122 @@
+"""
+Response compression
+Compresses text responses (JSON, CSV) with brotli or gzip, as negotiated via
+Accept-Encoding. Buffered responses below a size threshold are left alone;
+streamed responses are compressed chunk by chunk and flushed as they go, so
+clients keep receiving data incrementally
+"""
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # optional dependency: gzip only without it
+    brotli = None
+
+
+class _GzipEncoder:
+    def __init__(self, level):
+        # wbits=31: zlib stream with a gzip header and trailer
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data):
+        return self._compressor.compress(data)
+
+    def flush(self):
+        return self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliEncoder:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data):
+        return self._compressor.process(data)
+
+    def flush(self):
+        return self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+def available_encodings(config):
+    """Configured encodings this process can produce, in preference order"""
+    encodings = []
+    for name in config['COMPRESSION_ALGORITHMS']:
+        if name == 'br' and brotli is not None:
+            encodings.append('br')
+        elif name == 'gzip':
+            encodings.append('gzip')
+    return encodings
+
+
+def make_encoder(encoding, config):
+    if encoding == 'br':
+        return _BrotliEncoder(config['COMPRESSION_BROTLI_QUALITY'])
+    return _GzipEncoder(config['COMPRESSION_LEVEL'])
+
+
+def compress(data, encoding, config):
+    """Compress a whole body in one go"""
+    encoder = make_encoder(encoding, config)
+    return encoder.compress(data) + encoder.finish()
+
+
+def _compress_stream(chunks, encoder):
+    for chunk in chunks:
+        if isinstance(chunk, str):
+            chunk = chunk.encode('utf-8')
+        data = encoder.compress(chunk) + encoder.flush()
+        if data:
+            yield data
+    yield encoder.finish()
+
+
+def _negotiate(encodings):
+    for encoding in encodings:
+        # q=0 means "not acceptable"; Accept quality values are 0..1
+        if request.accept_encodings[encoding] > 0:
+            return encoding
+    return None
+
+
+def init_app(app):
+    """Compress eligible responses after every request"""
+    if not app.config['COMPRESSION_ENABLED']:
+        return
+    config = app.config
+    encodings = available_encodings(config)
+    mimetypes = set(config['COMPRESSION_MIMETYPES'])
+
+    @app.after_request
+    def compress_response(response):
+        if response.mimetype not in mimetypes:
+            return response
+        response.vary.add('Accept-Encoding')
+        if (request.method == 'HEAD' or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers or response.direct_passthrough):
+            return response
+
+        encoding = _negotiate(encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, make_encoder(encoding, config))
+            response.headers.pop('Content-Length', None)
+        else:
+            data = response.get_data()
+            if len(data) < config['COMPRESSION_MIN_SIZE']:
+                return response
+            response.set_data(compress(data, encoding, config))
+
+        response.headers['Content-Encoding'] = encoding
+        # A compressed body is a different representation of the resource
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,68 @@
+"""
+Conditional GET helpers
+Build ETag/Last-Modified validators for report payloads from cheap metadata
+(ids, updated_at, counts, request parameters), so an unchanged response can be
+answered with 304 Not Modified before anything is serialized
+"""
+import hashlib
+from flask import request, current_app
+from flask_jwt_extended import get_jwt, get_jwt_identity
+from sqlalchemy import func
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from models import Report
+
+
+def make_etag(*parts):
+    """Opaque validator for a response that depends only on parts"""
+    return hashlib.sha1(repr(parts).encode('utf-8')).hexdigest()
+
+
+def request_key():
+    """Everything in the request that shapes a payload: endpoint, viewer and query string"""
+    return (request.endpoint, get_jwt_identity(), get_jwt().get('role', 'user'),
+            tuple(sorted(request.args.items(multi=True))))
+
+
+def list_validators(query):
+    """
+    (etag, last_modified) for a filtered, not yet paginated report query, from
+    one aggregate over it: any create, update or delete in the result set
+    moves max(updated_at) or the count. Only the ETag catches deletions, so
+    lists should be checked with not_modified(etag) alone.
+    """
+    last_modified, count = query.order_by(None).with_entities(
+        func.max(Report.updated_at), func.count(Report.id)
+    ).one()
+    return make_etag(request_key(), last_modified, count), last_modified
+
+
+def report_validators(report):
+    """(etag, last_modified) for a single report as seen by the current request"""
+    return make_etag(request_key(), report.id, report.updated_at), report.updated_at
+
+
+def not_modified(etag, last_modified=None):
+    """A 304 response if the client's copy is current, else None"""
+    if request.if_none_match:
+        fresh = request.if_none_match.contains_weak(etag)
+    elif request.if_modified_since and last_modified is not None:
+        # HTTP dates have one-second resolution
+        fresh = last_modified.replace(microsecond=0) <= request.if_modified_since.replace(tzinfo=None)
+    else:
+        fresh = False
+    if not fresh:
+        return None
+    return with_validators(current_app.response_class(status=304), etag, last_modified)
+
+
+def with_validators(response, etag, last_modified=None):
+    """Attach validators; clients must revalidate, and only their own cache may store it"""
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    response.vary.add('Authorization')
+    return response
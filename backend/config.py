@@ -14,10 +14,34 @@ class Config:
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///safeher.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
+    # Read replicas (comma-separated URLs); views marked @replica_reads query one of them
+    DB_REPLICA_URIS = [u.strip() for u in os.getenv('DATABASE_REPLICA_URLS', '').split(',') if u.strip()]
+    DB_REPLICA_STICKY_SECONDS = int(os.getenv('DB_REPLICA_STICKY_SECONDS', 10))  # Read from the primary this long after a user's write
+    DB_REPLICA_STICKY_COOKIE = os.getenv('DB_REPLICA_STICKY_COOKIE', 'read_primary')  # Carries that window to every worker
+    
+    # Connection pool for server databases (Postgres/MySQL); see extensions.engine_options
+    DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.getenv('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.getenv('DB_POOL_TIMEOUT', 30))  # Seconds to wait for a free connection
+    DB_POOL_RECYCLE = int(os.getenv('DB_POOL_RECYCLE', 1800))  # Seconds; stay under server idle timeouts
+    DB_POOL_PRE_PING = os.getenv('DB_POOL_PRE_PING', 'true').lower() == 'true'
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv('DB_STATEMENT_TIMEOUT_MS', 0))  # Postgres only; 0 = no limit
+    
+    # SQLite pragmas run on every connection (set one to an empty string to leave SQLite's default)
+    SQLITE_JOURNAL_MODE = os.getenv('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.getenv('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = os.getenv('SQLITE_BUSY_TIMEOUT_MS', '5000')
+    SQLITE_MMAP_SIZE = os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))  # Bytes
+    SQLITE_CACHE_SIZE = os.getenv('SQLITE_CACHE_SIZE', '-65536')  # Negative = KiB, i.e. 64MB
+    
     # JWT Configuration
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'change-this-secret-key-in-production')
     JWT_ACCESS_TOKEN_EXPIRES = timedelta(hours=24)
     
+    # Cache of users resolved from JWT identities (entries, seconds)
+    USER_CACHE_SIZE = int(os.getenv('USER_CACHE_SIZE', 1024))
+    USER_CACHE_TTL = int(os.getenv('USER_CACHE_TTL', 60))
+    
     # Security
     SECRET_KEY = os.getenv('SECRET_KEY', 'change-this-secret-key-in-production')
     
@@ -25,4 +49,100 @@ class Config:
     UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
     MAX_FILE_SIZE = int(os.getenv('MAX_FILE_SIZE', 10 * 1024 * 1024))  # 10MB default
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'pdf', 'doc', 'docx', 'mp4', 'mov', 'avi'}
+    
+    # Photos are re-encoded on upload (needs Pillow): metadata such as EXIF/GPS is stripped,
+    # the longest edge is capped and JPEG/WebP are recompressed at IMAGE_QUALITY
+    IMAGE_INGEST_ENABLED = os.getenv('IMAGE_INGEST_ENABLED', 'true').lower() == 'true'
+    IMAGE_MAX_DIMENSION = int(os.getenv('IMAGE_MAX_DIMENSION', 2560))
+    IMAGE_QUALITY = int(os.getenv('IMAGE_QUALITY', 85))
+    UPLOAD_KEEP_ORIGINALS = os.getenv('UPLOAD_KEEP_ORIGINALS', 'false').lower() == 'true'  # Admin opt-in; originals keep their metadata
+    
+    # Serving /uploads: 'flask' streams the bytes itself; 'x-accel' (nginx) and 'x-sendfile'
+    # (Apache/lighttpd) only authorize and set headers, and the front proxy sends the file
+    UPLOAD_SERVE_MODE = os.getenv('UPLOAD_SERVE_MODE', 'flask')
+    UPLOAD_ACCEL_PREFIX = os.getenv('UPLOAD_ACCEL_PREFIX', '/protected-uploads/')  # nginx internal location
+    UPLOAD_CACHE_MAX_AGE = int(os.getenv('UPLOAD_CACHE_MAX_AGE', 365 * 24 * 60 * 60))  # Content-addressed files never change
+    UPLOAD_LINK_SECONDS = int(os.getenv('UPLOAD_LINK_SECONDS', 300))  # Lifetime of ?token= links for <img>/<a> tags
+    UPLOAD_ORPHAN_HOURS = int(os.getenv('UPLOAD_ORPHAN_HOURS', 48))  # Unattached uploads older than this are swept
+    
+    # Resumable chunked uploads (/api/uploads/sessions)
+    UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 5 * 1024 * 1024))  # Max bytes per PUT
+    UPLOAD_SESSION_TTL = int(os.getenv('UPLOAD_SESSION_TTL', 24 * 60 * 60))  # Seconds before an idle upload is discarded
+    
+    # Background thumbnails/posters for image and video uploads (rendered on real OS threads
+    # under gevent). MEDIA_WORKERS=0 runs no threads; jobs then wait in media_jobs for:
+    # flask --app app process-media
+    MEDIA_WORKERS = int(os.getenv('MEDIA_WORKERS', 2))
+    MEDIA_QUEUE_LIMIT = int(os.getenv('MEDIA_QUEUE_LIMIT', 500))  # Queued jobs before new uploads skip processing
+    MEDIA_MAX_ATTEMPTS = int(os.getenv('MEDIA_MAX_ATTEMPTS', 3))
+    MEDIA_JOB_TIMEOUT = int(os.getenv('MEDIA_JOB_TIMEOUT', 300))  # Seconds
+    MEDIA_THUMBNAIL_SIZE = int(os.getenv('MEDIA_THUMBNAIL_SIZE', 320))  # Longest edge in pixels
+    MEDIA_THUMBNAIL_QUALITY = int(os.getenv('MEDIA_THUMBNAIL_QUALITY', 80))
+    MEDIA_THUMBNAIL_FORMATS = os.getenv('MEDIA_THUMBNAIL_FORMATS', 'jpeg,webp').split(',')
+    MEDIA_POSTER_OFFSET = float(os.getenv('MEDIA_POSTER_OFFSET', 1.0))  # Seconds into the video
+    
+    # JSON responses: 'auto' uses orjson when installed, 'orjson' requires it, 'stdlib' never uses it
+    JSON_PROVIDER = os.getenv('JSON_PROVIDER', 'auto')
+    
+    # Response compression for text payloads (brotli needs the optional brotli package)
+    COMPRESSION_ENABLED = os.getenv('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    COMPRESSION_ALGORITHMS = os.getenv('COMPRESSION_ALGORITHMS', 'br,gzip').split(',')  # Server preference order
+    COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))  # Bytes; smaller bodies aren't worth it
+    COMPRESSION_LEVEL = int(os.getenv('COMPRESSION_LEVEL', 6))  # gzip 1-9
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 4))  # brotli 0-11
+    COMPRESSION_MIMETYPES = os.getenv('COMPRESSION_MIMETYPES', 'application/json,text/csv,text/plain,text/html').split(',')
+    
+    # Request metrics at /api/metrics (Prometheus text format, per process) and Server-Timing headers
+    METRICS_ENABLED = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')  # Scrapers send it as a bearer token; unset turns /api/metrics off
+    SERVER_TIMING_HEADERS = os.getenv('SERVER_TIMING_HEADERS', 'false').lower() == 'true'  # Debug only
+    
+    # Per-request SQL counting: X-Query-Count/X-Query-Time headers, a warning for any statement
+    # repeated QUERY_N_PLUS_ONE_THRESHOLD times in one request (0 disables), and @query_budget
+    # checks (strict mode raises instead of logging; the test suite runs strict)
+    QUERY_DEBUG_HEADERS = os.getenv('QUERY_DEBUG_HEADERS', 'false').lower() == 'true'
+    QUERY_N_PLUS_ONE_THRESHOLD = int(os.getenv('QUERY_N_PLUS_ONE_THRESHOLD', 0))
+    QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'false').lower() == 'true'
+    
+    # Logging: 'json' (one object per line) or 'text'. Debug/info records, including the
+    # per-request access line, are kept at LOG_SAMPLE_RATE (0-1); warnings, errors, 5xx and
+    # requests slower than LOG_SLOW_REQUEST_MS always are
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+    LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+    LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 1.0))
+    LOG_SLOW_REQUEST_MS = int(os.getenv('LOG_SLOW_REQUEST_MS', 1000))
+    
+    # Pagination
+    DEFAULT_PAGE_SIZE = int(os.getenv('DEFAULT_PAGE_SIZE', 50))
+    MAX_PAGE_SIZE = int(os.getenv('MAX_PAGE_SIZE', 200))
+    
+    # Delta sync (/changes endpoints): deleted reports are remembered this long, so older
+    # sync tokens get 410 and a full refetch; recent writes are resent for SYNC_SETTLE_SECONDS
+    # in case they were still committing (purge with: flask --app app purge-tombstones)
+    SYNC_TOMBSTONE_DAYS = int(os.getenv('SYNC_TOMBSTONE_DAYS', 30))
+    SYNC_SETTLE_SECONDS = int(os.getenv('SYNC_SETTLE_SECONDS', 5))
+    
+    # Live moderator events (/api/moderator/events, Server-Sent Events). 'memory' only works
+    # with a single worker process (gunicorn.conf.py refuses more); 'redis' (needs the redis
+    # package) is required to run several. gunicorn.conf.py uses gevent workers, where an open
+    # stream is a greenlet rather than a thread; streams end after EVENTS_STREAM_SECONDS and
+    # clients reconnect with Last-Event-ID
+    EVENTS_BACKEND = os.getenv('EVENTS_BACKEND', 'memory')
+    EVENTS_REDIS_URL = os.getenv('EVENTS_REDIS_URL', 'redis://localhost:6379/0')
+    EVENTS_BACKLOG = int(os.getenv('EVENTS_BACKLOG', 1000))  # Recent events kept for resuming clients
+    EVENTS_HEARTBEAT_SECONDS = int(os.getenv('EVENTS_HEARTBEAT_SECONDS', 15))
+    EVENTS_STREAM_SECONDS = int(os.getenv('EVENTS_STREAM_SECONDS', 300))
+    EVENTS_RETRY_MS = int(os.getenv('EVENTS_RETRY_MS', 3000))  # Client reconnect delay
+    EVENTS_MAX_STREAMS = int(os.getenv('EVENTS_MAX_STREAMS', 200))  # Per process; more get 503
+    EVENTS_TOKEN_SECONDS = int(os.getenv('EVENTS_TOKEN_SECONDS', 600))  # Lifetime of ?token= for EventSource
+    
+    # Most {report_id, status, note} operations accepted by POST /api/moderator/reports/bulk
+    MODERATION_BULK_LIMIT = int(os.getenv('MODERATION_BULK_LIMIT', 500))
+    
+    # CSV export: rows fetched from the database (and flushed to the client) per batch
+    EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', 500))
+    
+    # Serve /api/admin/stats from the stat_counters table, maintained on every write
+    # (repair with: flask --app app rebuild-counters)
+    STATS_COUNTERS_ENABLED = os.getenv('STATS_COUNTERS_ENABLED', 'false').lower() == 'true'
 
@@ -0,0 +1,55 @@
+"""
+Pytest fixtures
+Builds the app against an in-memory SQLite database with a few seeded users
+"""
+import os
+import sys
+import pytest
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from flask_jwt_extended import create_access_token
+from app import create_app
+from config import Config
+from extensions import db
+from models import User
+
+
+class TestConfig(Config):
+    """Configuration used by the test suite"""
+    TESTING = True
+    SQLALCHEMY_DATABASE_URI = 'sqlite://'
+    JWT_SECRET_KEY = 'test-secret-key-that-is-long-enough-for-hs256'
+    MEDIA_WORKERS = 0  # Tests run media jobs synchronously with media.process_pending()
+    QUERY_BUDGET_STRICT = True  # Any request over its @query_budget fails the test
+
+
+@pytest.fixture
+def app():
+    app = create_app(TestConfig)
+    with app.app_context():
+        for email, role in [('user@test.com', 'user'),
+                            ('other@test.com', 'user'),
+                            ('mod@test.com', 'moderator'),
+                            ('admin@test.com', 'admin')]:
+            user = User(email=email, full_name=email.split('@')[0], role=role)
+            user.set_password('password123')
+            db.session.add(user)
+        db.session.commit()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def auth_headers(app):
+    """Return a function building Authorization headers for a seeded user"""
+    def _headers(email):
+        user = User.query.filter_by(email=email).first()
+        token = create_access_token(identity=str(user.id), additional_claims={'role': user.role})
+        return {'Authorization': f'Bearer {token}'}
+    return _headers
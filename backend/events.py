@@ -0,0 +1,249 @@
+"""
+Live report events
+Write routes publish compact report events to a pub/sub backend, and
+moderators receive them over Server-Sent Events. The in-process backend
+serves a single worker; the Redis Streams backend lets several workers (and
+hosts) share one event log. Both keep a bounded backlog so reconnecting
+clients resume from Last-Event-ID. Browsers authenticate the stream with a
+short-lived stream token, so access tokens never appear in URLs
+"""
+from collections import deque
+from threading import Condition, Lock
+import json
+import time
+from flask import current_app
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+try:
+    import redis
+except ImportError:  # optional dependency: memory backend only without it
+    redis = None
+
+# Sent instead of the missed events when a client's Last-Event-ID is no longer in the backlog
+RESYNC_EVENT = 'resync'
+
+
+class MemoryBackend:
+    """Ring buffer of recent events in this process, with blocking reads"""
+
+    def __init__(self, size=1000):
+        self._events = deque(maxlen=size)
+        self._last_id = 0
+        self._changed = Condition()
+
+    def publish(self, event_type, data):
+        with self._changed:
+            self._last_id += 1
+            self._events.append((self._last_id, event_type, data))
+            self._changed.notify_all()
+        return str(self._last_id)
+
+    def last_id(self):
+        return str(self._last_id)
+
+    def read(self, last_id, timeout):
+        """
+        Events after last_id, waiting up to timeout seconds for one to arrive.
+        Returns None if events after last_id have already been dropped (or the
+        id is from before a restart), so the client has to resync.
+        """
+        try:
+            after = int(last_id)
+        except (TypeError, ValueError):
+            return None
+        with self._changed:
+            oldest = self._events[0][0] if self._events else self._last_id + 1
+            if after > self._last_id or after < oldest - 1:
+                return None
+            self._changed.wait_for(lambda: self._last_id > after, timeout)
+            return [(str(event_id), event_type, data)
+                    for event_id, event_type, data in self._events if event_id > after]
+
+
+class RedisBackend:
+    """Event log in a capped Redis stream, shared by every worker"""
+
+    def __init__(self, url, key='safeher:events', size=1000):
+        self._redis = redis.Redis.from_url(url, decode_responses=True)
+        self._key = key
+        self._size = size
+
+    def publish(self, event_type, data):
+        return self._redis.xadd(self._key, {'type': event_type, 'data': json.dumps(data)},
+                                maxlen=self._size, approximate=True)
+
+    def last_id(self):
+        entries = self._redis.xrevrange(self._key, count=1)
+        return entries[0][0] if entries else '0-0'
+
+    def read(self, last_id, timeout):
+        if not last_id or last_id.count('-') != 1:
+            return None
+        # Redis 7 reports the newest trimmed id; anything at or before it may have been missed
+        try:
+            trimmed = self._redis.xinfo_stream(self._key).get('max-deleted-entry-id', '0-0')
+        except redis.ResponseError:  # stream not created yet
+            trimmed = '0-0'
+        if _stream_id(last_id) < _stream_id(trimmed):
+            return None
+        block = int(timeout * 1000) or None  # BLOCK 0 would wait forever
+        result = self._redis.xread({self._key: last_id}, count=100, block=block)
+        return [(event_id, fields['type'], json.loads(fields['data']))
+                for _, entries in result for event_id, fields in entries]
+
+
+def _stream_id(value):
+    ms, seq = value.split('-')
+    return int(ms), int(seq)
+
+
+class StreamSlots:
+    """Caps how many SSE streams one process holds open at a time"""
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.open = 0
+        self._lock = Lock()
+
+    def acquire(self):
+        with self._lock:
+            if self.open >= self.limit:
+                return False
+            self.open += 1
+            return True
+
+    def release(self):
+        with self._lock:
+            self.open -= 1
+
+
+class _SlotStream:
+    """Response iterable that gives its stream slot back when the server closes it"""
+
+    def __init__(self, chunks, slots):
+        self._chunks = chunks
+        self._slots = slots
+        self._released = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._chunks)
+        except StopIteration:
+            self._release()
+            raise
+
+    def close(self):
+        # WSGI servers call close() when the client goes away, and for responses
+        # that were never iterated (e.g. HEAD)
+        self._chunks.close()
+        self._release()
+
+    def _release(self):
+        if not self._released:
+            self._released = True
+            self._slots.release()
+
+
+def create_backend(config):
+    """Build the backend named by EVENTS_BACKEND: 'memory' or 'redis'"""
+    name = config['EVENTS_BACKEND']
+    if name == 'redis':
+        if redis is None:
+            raise RuntimeError("EVENTS_BACKEND is 'redis' but the redis package is not installed")
+        return RedisBackend(config['EVENTS_REDIS_URL'], size=config['EVENTS_BACKLOG'])
+    if name != 'memory':
+        raise RuntimeError(f'Unknown EVENTS_BACKEND: {name}')
+    return MemoryBackend(config['EVENTS_BACKLOG'])
+
+
+def report_event(report):
+    """Compact queue view of a report: enough to place it, not its full text"""
+    return {
+        'id': report.id,
+        'report_number': report.report_number,
+        'title': report.title,
+        'category': report.category,
+        'severity': report.severity,
+        'urgency': report.urgency,
+        'status': report.status,
+        'updated_at': report.updated_at.isoformat() if report.updated_at else None
+    }
+
+
+def publish(event_type, data):
+    """Publish an event after a commit; a backend outage never fails the write"""
+    try:
+        return current_app.extensions['events'].publish(event_type, data)
+    except Exception as e:
+        current_app.logger.warning('Could not publish %s event: %s', event_type, e)
+        return None
+
+
+def _token_serializer():
+    # Own salt: a stream token is useless anywhere but the events endpoint
+    return URLSafeTimedSerializer(current_app.config['JWT_SECRET_KEY'], salt='moderator-events')
+
+
+def issue_stream_token(user_id, role):
+    """Signed token that only opens the event stream, valid for EVENTS_TOKEN_SECONDS"""
+    return _token_serializer().dumps({'sub': str(user_id), 'role': role})
+
+
+def verify_stream_token(token):
+    """The token's claims ({'sub', 'role'}), or None if it is forged or expired"""
+    try:
+        return _token_serializer().loads(token, max_age=current_app.config['EVENTS_TOKEN_SECONDS'])
+    except BadSignature:  # Includes SignatureExpired
+        return None
+
+
+def _format(event_id, event_type, data):
+    return f'id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, separators=(",", ":"))}\n\n'
+
+
+def stream(last_event_id=None):
+    """
+    SSE body for one client. Waits in short, heartbeat-sized reads and ends
+    after EVENTS_STREAM_SECONDS; the browser's EventSource then reconnects
+    with Last-Event-ID and picks up where it left off. Returns None when this
+    process already holds EVENTS_MAX_STREAMS streams.
+    """
+    config = current_app.config
+    backend = current_app.extensions['events']
+    slots = current_app.extensions['event_streams']
+    heartbeat, lifetime = config['EVENTS_HEARTBEAT_SECONDS'], config['EVENTS_STREAM_SECONDS']
+    if not slots.acquire():
+        return None
+
+    def generate():
+        position = last_event_id or backend.last_id()
+        deadline = time.monotonic() + lifetime
+        yield f'retry: {config["EVENTS_RETRY_MS"]}\n\n'
+        while True:
+            events = backend.read(position, max(0, min(heartbeat, deadline - time.monotonic())))
+            if events is None:
+                # Missed events are gone: tell the client to refetch (e.g. via /changes)
+                position = backend.last_id()
+                yield _format(position, RESYNC_EVENT, {})
+            elif events:
+                for event_id, event_type, data in events:
+                    yield _format(event_id, event_type, data)
+                position = events[-1][0]
+            else:
+                yield ': keepalive\n\n'
+            if time.monotonic() >= deadline:
+                return
+
+    return _SlotStream(generate(), slots)
+
+
+def init_app(app):
+    """Create the configured event backend"""
+    app.extensions['events'] = create_backend(app.config)
+    app.extensions['event_streams'] = StreamSlots(app.config['EVENTS_MAX_STREAMS'])
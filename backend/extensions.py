@@ -1,11 +1,98 @@
 """
 Flask extensions initialization
-Centralizes database and JWT setup for the application
+Centralizes database and JWT setup for the application, including the
+engine tuning applied to every database connection and the read replica binds
 """
+from flask import g, has_app_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_jwt_extended import JWTManager
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.sql.dml import UpdateBase
+
+REPLICA_BIND_PREFIX = 'replica_'
+
+
+class RoutingSession(Session):
+    """
+    Session that runs reads on the replica bind chosen for the current request
+    (g.db_read_bind, set by replicas.py). Flushes and INSERT/UPDATE/DELETE
+    statements always go to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and not isinstance(clause, UpdateBase):
+            key = g.get('db_read_bind')
+            if key is not None:
+                return self._db.engines[key]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
 
 # Initialize extensions
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 jwt = JWTManager()
 
+
+def engine_options(config, uri=None):
+    """
+    Engine options for uri (default: the primary database). Server databases
+    get a sized, pre-pinged connection pool (and a statement timeout on
+    Postgres); SQLite is tuned per connection by sqlite_pragmas instead.
+    Options already set in SQLALCHEMY_ENGINE_OPTIONS win.
+    """
+    url = make_url(uri or config['SQLALCHEMY_DATABASE_URI'])
+    options = {'pool_pre_ping': config['DB_POOL_PRE_PING']}
+    if url.get_backend_name() == 'sqlite':
+        if url.database in (None, '', ':memory:'):
+            # In-memory databases live in a single shared connection; pool sizing doesn't apply
+            return {**options, **config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+        options['connect_args'] = {'check_same_thread': False}
+    else:
+        options.update(pool_size=config['DB_POOL_SIZE'], max_overflow=config['DB_MAX_OVERFLOW'],
+                       pool_timeout=config['DB_POOL_TIMEOUT'], pool_recycle=config['DB_POOL_RECYCLE'])
+        if url.get_backend_name() == 'postgresql' and config['DB_STATEMENT_TIMEOUT_MS']:
+            options['connect_args'] = {'options': f"-c statement_timeout={config['DB_STATEMENT_TIMEOUT_MS']}"}
+    return {**options, **config.get('SQLALCHEMY_ENGINE_OPTIONS', {})}
+
+
+def sqlite_pragmas(config):
+    """PRAGMA statements run on every new SQLite connection (blank settings are skipped)"""
+    pragmas = [
+        ('journal_mode', config['SQLITE_JOURNAL_MODE']),  # WAL: readers don't block behind the writer
+        ('synchronous', config['SQLITE_SYNCHRONOUS']),  # NORMAL is durable across crashes in WAL mode
+        ('busy_timeout', config['SQLITE_BUSY_TIMEOUT_MS']),  # Wait for the write lock instead of failing
+        ('mmap_size', config['SQLITE_MMAP_SIZE']),
+        ('cache_size', config['SQLITE_CACHE_SIZE']),
+    ]
+    return [f'PRAGMA {name}={value}' for name, value in pragmas if value not in (None, '')]
+
+
+def _install_pragmas(engine, pragmas):
+    @event.listens_for(engine, 'connect')
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+
+def init_db(app):
+    """Apply engine options, add the replica binds, bind Flask-SQLAlchemy and install the SQLite pragmas"""
+    binds = dict(app.config.get('SQLALCHEMY_BINDS') or {})
+    for i, uri in enumerate(app.config['DB_REPLICA_URIS']):
+        binds[f'{REPLICA_BIND_PREFIX}{i}'] = {'url': uri, **engine_options(app.config, uri)}
+    app.config['SQLALCHEMY_BINDS'] = binds
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config)
+    db.init_app(app)
+    # Replicas mirror the primary's tables rather than holding models of their own;
+    # drop the empty metadata Flask-SQLAlchemy made for them so create_all/drop_all skip them
+    for key in binds:
+        if key.startswith(REPLICA_BIND_PREFIX):
+            db.metadatas.pop(key, None)
+
+    with app.app_context():
+        pragmas = sqlite_pragmas(app.config)
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite':
+                _install_pragmas(engine, pragmas)
@@ -0,0 +1,61 @@
+"""
+Report list filters
+Translates query-string filters into SQL conditions backed by the composite
+(column, created_at) indexes on reports
+"""
+from datetime import datetime, timedelta
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from models import Report
+
+REPORT_STATUSES = ['pending', 'in_review', 'resolved', 'rejected']
+REPORT_SEVERITIES = ['low', 'medium', 'high', 'critical']
+REPORT_URGENCIES = ['immediate', 'urgent', 'normal', 'low']
+
+
+def _parse_choices(name, value, allowed):
+    """Parse a comma-separated filter value and validate each entry"""
+    values = [v.strip() for v in value.split(',') if v.strip()]
+    invalid = [v for v in values if v not in allowed]
+    if not values or invalid:
+        raise ValueError(f'Invalid {name} filter. Allowed values: {", ".join(allowed)}')
+    return values
+
+
+def parse_date(name, value, end_of_range=False):
+    """Parse an ISO date/datetime; a bare end date covers that whole day"""
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00')).replace(tzinfo=None)
+    except ValueError:
+        raise ValueError(f'Invalid {name}. Use ISO format, e.g. 2025-01-31')
+    if end_of_range and len(value) == 10:
+        parsed += timedelta(days=1)
+    return parsed
+
+
+def apply_report_filters(query, args, default_statuses=None):
+    """
+    Apply ?status=, ?category=, ?severity=, ?urgency=, ?incident_from= and
+    ?incident_to= to a Report query. status, severity and urgency accept
+    comma-separated lists. Raises ValueError for invalid values.
+    """
+    status = args.get('status', 'all')
+    if status != 'all':
+        query = query.filter(Report.status.in_(_parse_choices('status', status, REPORT_STATUSES)))
+    elif default_statuses:
+        query = query.filter(Report.status.in_(default_statuses))
+
+    if args.get('category'):
+        query = query.filter(Report.category == args['category'].strip())
+    if args.get('severity'):
+        query = query.filter(Report.severity.in_(_parse_choices('severity', args['severity'], REPORT_SEVERITIES)))
+    if args.get('urgency'):
+        query = query.filter(Report.urgency.in_(_parse_choices('urgency', args['urgency'], REPORT_URGENCIES)))
+
+    if args.get('incident_from'):
+        query = query.filter(Report.incident_date >= parse_date('incident_from', args['incident_from']))
+    if args.get('incident_to'):
+        query = query.filter(Report.incident_date < parse_date('incident_to', args['incident_to'], end_of_range=True))
+
+    return query
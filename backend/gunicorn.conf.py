@@ -0,0 +1,24 @@
+"""
+Gunicorn settings for production
+gevent workers let each process hold many idle /api/moderator/events streams
+without a thread apiece. Run with: gunicorn -c gunicorn.conf.py "app:create_app()"
+"""
+import multiprocessing
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+# The 'memory' events backend lives in one process: moderators on other workers would
+# miss its events and their Last-Event-ID values would mean nothing there. It runs one
+# worker; scaling out needs EVENTS_BACKEND=redis
+if os.getenv('EVENTS_BACKEND', 'memory') == 'memory':
+    workers = int(os.getenv('GUNICORN_WORKERS', 1))
+    if workers != 1:
+        raise RuntimeError("EVENTS_BACKEND 'memory' needs GUNICORN_WORKERS=1; use EVENTS_BACKEND=redis for more workers")
+else:
+    workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gevent'
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))  # Concurrent requests/streams per worker
+# Event streams end after EVENTS_STREAM_SECONDS; don't kill a worker that is serving them
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+graceful_timeout = 30
+accesslog = None  # structured_logging already writes one line per request
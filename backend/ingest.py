@@ -0,0 +1,119 @@
+"""
+Image ingest
+Re-encodes uploaded photos before they are stored: drops EXIF/GPS and other
+metadata, caps the resolution and recompresses, so victims' locations never
+reach storage and moderators download smaller files
+"""
+from blinker import Namespace
+import shutil
+import time
+from flask import current_app
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import storage
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # required while IMAGE_INGEST_ENABLED; init_app refuses to start without it
+    Image = None
+
+_signals = Namespace()
+
+# Sent after every re-encoded image with original_size, stored_size, seconds and sha256.
+# Connect a receiver to feed metrics: image_ingested.connect(receiver, app)
+image_ingested = _signals.signal('image-ingested')
+
+IMAGE_EXTENSIONS = {'jpg', 'jpeg', 'png', 'webp'}
+
+# Formats that are re-encoded, with their save options; anything else (e.g. animated GIF) is left alone
+SAVE_OPTIONS = {
+    'JPEG': lambda quality: {'quality': quality, 'optimize': True, 'progressive': True},
+    'WEBP': lambda quality: {'quality': quality},
+    'PNG': lambda quality: {'optimize': True},
+}
+
+
+def applies_to(filename, content_type):
+    """Whether an upload should go through the re-encoder"""
+    if not current_app.config['IMAGE_INGEST_ENABLED']:
+        return False
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    return ext in IMAGE_EXTENSIONS or (content_type or '').lower() in ('image/jpeg', 'image/png', 'image/webp')
+
+
+def reencode(source, target):
+    """
+    Write a metadata-free, size-capped copy of the image at source to target.
+    Returns False if the format isn't one we re-encode; raises ValueError if
+    the file isn't a readable image.
+    """
+    max_dimension = current_app.config['IMAGE_MAX_DIMENSION']
+    try:
+        with Image.open(source) as image:
+            image_format = image.format
+            if image_format not in SAVE_OPTIONS:
+                return False
+            # Apply the EXIF rotation to the pixels, since the tag itself is dropped
+            image = ImageOps.exif_transpose(image)
+            image.thumbnail((max_dimension, max_dimension))
+            if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+            # A fresh save without exif=/icc_profile= arguments carries no metadata
+            image.save(target, image_format, **SAVE_OPTIONS[image_format](current_app.config['IMAGE_QUALITY']))
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise ValueError(f'Could not process image: {e}')
+    return True
+
+
+def save_image(path, content_type=None):
+    """
+    Store the image at path (a temp file, consumed) after re-encoding it.
+    The original is kept under uploads/originals/ only if UPLOAD_KEEP_ORIGINALS is set.
+    """
+    started = time.perf_counter()
+    original_size = os.path.getsize(path)
+    target = storage.new_temp_path()
+    try:
+        if not reencode(path, target):
+            return storage.save_file(path, content_type)
+        stored = storage.save_file(target, content_type)
+    finally:
+        if os.path.exists(target):
+            os.remove(target)
+
+    if current_app.config['UPLOAD_KEEP_ORIGINALS']:
+        storage.keep_original(path, stored.sha256)
+    else:
+        os.remove(path)
+
+    seconds = time.perf_counter() - started
+    current_app.logger.debug('Re-encoded image %s: %d -> %d bytes in %.1f ms',
+                              stored.sha256[:12], original_size, stored.size, seconds * 1000)
+    image_ingested.send(
+        current_app._get_current_object(),
+        original_size=original_size,
+        stored_size=stored.size,
+        seconds=seconds,
+        sha256=stored.sha256
+    )
+    return stored
+
+
+def save_image_stream(stream, content_type=None):
+    """save_image() for an upload stream"""
+    path = storage.new_temp_path()
+    try:
+        with open(path, 'wb') as out:
+            shutil.copyfileobj(stream, out, storage.BUFFER_SIZE)
+        return save_image(path, content_type)
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def init_app(app):
+    """Refuse to start if photos would be stored with their EXIF/GPS metadata"""
+    if app.config['IMAGE_INGEST_ENABLED'] and Image is None:
+        raise RuntimeError('IMAGE_INGEST_ENABLED is on but Pillow is not installed; '
+                           'install it (pip install -r requirements.txt) or set IMAGE_INGEST_ENABLED=false')
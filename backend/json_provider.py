@@ -0,0 +1,63 @@
+"""
+JSON provider
+Serializes responses with orjson when it is installed, falling back to
+Flask's standard library provider otherwise
+"""
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # optional dependency
+    orjson = None
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """
+    Drop-in replacement for Flask's DefaultJSONProvider backed by orjson.
+    Output is equivalent to the default provider's (sorted keys, compact,
+    raw UTF-8 instead of \\u escapes); datetimes and other non-native types
+    still go through Flask's default() hook, so they render exactly as before.
+    """
+
+    def _options(self):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            # orjson has no equivalent for stdlib json arguments like indent
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._options()).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self.compact is False or (self.compact is None and self._app.debug):
+            # Pretty-printed debug output: let the stdlib provider indent it
+            return super().response(obj)
+        body = orjson.dumps(obj, default=self.default, option=self._options())
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+def get_provider_class(name='auto'):
+    """Resolve the JSON_PROVIDER setting: 'auto', 'orjson' or 'stdlib'"""
+    if name == 'stdlib':
+        return DefaultJSONProvider
+    if orjson is None:
+        if name == 'orjson':
+            raise RuntimeError("JSON_PROVIDER is 'orjson' but orjson is not installed")
+        return DefaultJSONProvider
+    return OrjsonProvider
+
+
+def init_app(app):
+    """Install the configured JSON provider on the app"""
+    provider_class = get_provider_class(app.config.get('JSON_PROVIDER', 'auto'))
+    app.json_provider_class = provider_class
+    app.json = provider_class(app)
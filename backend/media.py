@@ -0,0 +1,281 @@
+"""
+Background media processing
+Uploads enqueue a durable job (media_jobs table); a small thread pool claims
+jobs and renders downscaled thumbnails for images and a poster frame for
+videos, then records the derivative URLs on matching report attachments.
+Under gevent that pool is made of greenlets, so the CPU-bound rendering
+itself runs on gevent's pool of real OS threads
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from threading import Lock
+import json
+import shutil
+import subprocess
+import click
+from flask import current_app
+from sqlalchemy import update
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from extensions import db
+from models import MediaJob, Report, ReportAttachment
+import storage
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # optional dependency: image thumbnails are skipped without it
+    Image = None
+
+try:
+    from gevent import get_hub
+    from gevent.monkey import is_module_patched
+except ImportError:  # only installed for the production gunicorn workers
+    get_hub = None
+
+IMAGE_FORMATS = {'jpeg': ('JPEG', 'image/jpeg', '.jpg'), 'webp': ('WEBP', 'image/webp', '.webp')}
+# Types derivatives are stored with (thumbnails plus the JPEG poster frame)
+DERIVATIVE_TYPES = {content_type for _, content_type, _ in IMAGE_FORMATS.values()}
+
+
+def _media_kind(content_type):
+    content_type = (content_type or '').lower()
+    if content_type.startswith('image/'):
+        return 'image'
+    if content_type.startswith('video/'):
+        return 'video'
+    return None
+
+
+def _render_thumbnails(path):
+    """Downscaled copies of an image, one per configured format: {key: (temp_path, content_type, ext)}"""
+    if Image is None:
+        raise RuntimeError('Pillow is not installed')
+    size = current_app.config['MEDIA_THUMBNAIL_SIZE']
+    rendered = {}
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+        image = image.convert('RGB')
+        for name in current_app.config['MEDIA_THUMBNAIL_FORMATS']:
+            pil_format, content_type, ext = IMAGE_FORMATS[name]
+            target = storage.new_temp_path()
+            image.save(target, pil_format, quality=current_app.config['MEDIA_THUMBNAIL_QUALITY'])
+            key = 'thumbnail' if name == 'jpeg' else f'thumbnail_{name}'
+            rendered[key] = (target, content_type, ext)
+    return rendered
+
+
+def _render_poster(path):
+    """A single downscaled JPEG frame of a video, grabbed with ffmpeg"""
+    ffmpeg = shutil.which('ffmpeg')
+    if ffmpeg is None:
+        raise RuntimeError('ffmpeg is not installed')
+    size = current_app.config['MEDIA_THUMBNAIL_SIZE']
+    target = storage.new_temp_path() + '.jpg'
+    subprocess.run([
+        ffmpeg, '-nostdin', '-loglevel', 'error', '-y',
+        '-ss', str(current_app.config['MEDIA_POSTER_OFFSET']), '-i', path,
+        '-frames:v', '1', '-vf', f'scale={size}:{size}:force_original_aspect_ratio=decrease', target
+    ], check=True, timeout=current_app.config['MEDIA_JOB_TIMEOUT'])
+    return {'poster': (target, 'image/jpeg', '.jpg')}
+
+
+RENDERERS = {'image': _render_thumbnails, 'video': _render_poster}
+
+
+def _render(renderer, path):
+    """
+    Run a renderer. When gevent has patched threading, the pool's "threads" are
+    greenlets sharing one OS thread with every request and event stream of the
+    worker, and Pillow would block them all until it finished: hand the work
+    to gevent's threadpool of real OS threads and wait for it cooperatively.
+    """
+    if get_hub is None or not is_module_patched('threading'):
+        return renderer(path)
+    app = current_app._get_current_object()
+
+    def run():
+        with app.app_context():
+            return renderer(path)
+    return get_hub().threadpool.apply(run)
+
+
+def enqueue(stored, content_type=None):
+    """
+    Queue derivative generation for a stored blob (no-op for non-media files or
+    content that already has a job). Call before committing the upload; the
+    job row commits with it, then dispatch() wakes the workers.
+    """
+    content_type = content_type or stored.content_type
+    if _media_kind(content_type) is None:
+        return None
+    job = MediaJob.query.filter_by(sha256=stored.sha256).first()
+    if job is not None:
+        return job
+    job = MediaJob(sha256=stored.sha256, content_type=content_type)
+    if MediaJob.query.filter_by(status='queued').count() >= current_app.config['MEDIA_QUEUE_LIMIT']:
+        # Backpressure: the upload still succeeds, it just gets no previews
+        job.status = 'skipped'
+        job.error = 'Media queue full'
+    db.session.add(job)
+    return job
+
+
+def _claim_next():
+    """Atomically move the oldest queued job to running; returns its id or None"""
+    while True:
+        job_id = db.session.query(MediaJob.id).filter_by(status='queued').order_by(MediaJob.id).limit(1).scalar()
+        if job_id is None:
+            return None
+        claimed = db.session.execute(
+            update(MediaJob).where(MediaJob.id == job_id, MediaJob.status == 'queued')
+            .values(status='running', attempts=MediaJob.attempts + 1, updated_at=datetime.utcnow())
+        ).rowcount
+        db.session.commit()
+        if claimed:
+            return job_id
+        # Another worker took it first; try the next one
+
+
+def _attach_derivatives(sha256, derivatives):
+    """Record derivative URLs on every attachment that points at this blob"""
+    rows = ReportAttachment.query.filter(ReportAttachment.url.like(f'/uploads/{sha256}%')).all()
+    for attachment in rows:
+        extra = json.loads(attachment.extra) if attachment.extra else {}
+        extra['derivatives'] = derivatives
+        attachment.extra = json.dumps(extra)
+    if rows:
+        # The reports' payloads changed: move their validators
+        db.session.execute(update(Report).where(Report.id.in_({a.report_id for a in rows}))
+                           .values(updated_at=datetime.utcnow()))
+
+
+def apply_derivatives(attachments):
+    """Copy finished derivatives onto attachments whose uploads were processed
+    before the report was saved (one query for the whole list)"""
+    by_sha = {}
+    for attachment in attachments:
+        sha256 = storage.sha256_from_url(attachment.url)
+        if sha256:
+            by_sha.setdefault(sha256, []).append(attachment)
+    if not by_sha:
+        return
+    for job in MediaJob.query.filter(MediaJob.sha256.in_(by_sha), MediaJob.status == 'done'):
+        for attachment in by_sha[job.sha256]:
+            extra = json.loads(attachment.extra) if attachment.extra else {}
+            extra['derivatives'] = job.get_derivatives()
+            attachment.extra = json.dumps(extra)
+
+
+def process_job(job_id):
+    """Render and store the derivatives for one claimed job"""
+    job = db.session.get(MediaJob, job_id)
+    renderer = RENDERERS.get(_media_kind(job.content_type))
+    rendered = {}
+    try:
+        rendered = _render(renderer, storage.blob_path(job.sha256))
+        derivatives = {}
+        for key, (path, content_type, ext) in rendered.items():
+            stored = storage.save_file(path, content_type)
+            derivatives[key] = f'/uploads/{storage.public_name(stored.sha256, key + ext)}'
+        job.derivatives = json.dumps(derivatives)
+        job.status = 'done'
+        job.error = None
+        _attach_derivatives(job.sha256, derivatives)
+    except RuntimeError as e:
+        # Missing optional tooling: retrying won't help
+        job.status = 'skipped'
+        job.error = str(e)
+    except Exception as e:
+        db.session.rollback()
+        job = db.session.get(MediaJob, job_id)
+        job.status = 'queued' if job.attempts < current_app.config['MEDIA_MAX_ATTEMPTS'] else 'failed'
+        job.error = str(e)
+    finally:
+        for path, _, _ in rendered.values():
+            if os.path.exists(path):
+                os.remove(path)
+    db.session.commit()
+    return job
+
+
+def process_pending(limit=None):
+    """Process queued jobs in this thread until the queue is empty (or limit jobs ran)"""
+    processed = 0
+    while limit is None or processed < limit:
+        job_id = _claim_next()
+        if job_id is None:
+            break
+        process_job(job_id)
+        processed += 1
+    return processed
+
+
+class MediaPipeline:
+    """Fixed-size thread pool draining the media_jobs table"""
+
+    def __init__(self, app, workers):
+        self.app = app
+        self.workers = workers
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='media') if workers else None
+        self._active = 0
+        self._rescan = False
+        self._lock = Lock()
+
+    def dispatch(self):
+        """Start a drain loop on an idle worker, or tell a busy one to look again"""
+        if self.executor is None:
+            return
+        with self._lock:
+            if self._active >= self.workers:
+                self._rescan = True
+                return
+            self._active += 1
+        self.executor.submit(self._drain)
+
+    def _drain(self):
+        with self.app.app_context():
+            while True:
+                try:
+                    process_pending()
+                except Exception:
+                    self.app.logger.exception('Media worker failed')
+                finally:
+                    db.session.remove()
+                with self._lock:
+                    # A job enqueued while every worker was busy must not be stranded
+                    if not self._rescan:
+                        self._active -= 1
+                        return
+                    self._rescan = False
+
+
+def dispatch():
+    """Wake the worker pool after an enqueue has been committed"""
+    pipeline = current_app.extensions.get('media')
+    if pipeline is not None:
+        pipeline.dispatch()
+
+
+def init_app(app):
+    """Start the worker pool, requeue jobs interrupted by a restart, and add the process-media command"""
+    pipeline = MediaPipeline(app, app.config['MEDIA_WORKERS'])
+    app.extensions['media'] = pipeline
+
+    @app.cli.command('process-media')
+    @click.option('--limit', type=int, default=None, help='Stop after this many jobs')
+    def process_media_command(limit):
+        """Process queued thumbnail/poster jobs in the foreground"""
+        click.echo(f'Processed {process_pending(limit)} media job(s)')
+
+    if pipeline.executor is not None:
+        with app.app_context():
+            # Jobs left running longer than the timeout belonged to a worker that died
+            cutoff = datetime.utcnow() - timedelta(seconds=app.config['MEDIA_JOB_TIMEOUT'])
+            MediaJob.query.filter(MediaJob.status == 'running', MediaJob.updated_at < cutoff).update({'status': 'queued'})
+            db.session.commit()
+            pending = MediaJob.query.filter_by(status='queued').first() is not None
+        if pending:
+            for _ in range(pipeline.workers):
+                pipeline.dispatch()
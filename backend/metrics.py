@@ -0,0 +1,181 @@
+"""
+Request metrics
+Times every request and exposes per-endpoint latency histograms, status
+counts and an in-flight gauge at /api/metrics in Prometheus text format; the
+endpoint only exists when METRICS_TOKEN is set. With SERVER_TIMING_HEADERS on,
+each response also gets a Server-Timing header splitting database time (from
+query_counter) and JSON serialization time out of the total. Metrics are kept per process
+"""
+from threading import Lock
+import time
+from flask import Response, g, has_request_context, request
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from query_counter import current_tracker
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values):
+    pairs = ','.join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return '{' + pairs + '}' if pairs else ''
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, *values, amount=1):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            for values, total in sorted(self._values.items()):
+                yield f'{self.name}{_labels(self.labels, values)} {total}'
+
+
+class Gauge(Counter):
+    def dec(self, *values):
+        self.inc(*values, amount=-1)
+
+    def collect(self):
+        lines = list(super().collect())
+        lines[1] = f'# TYPE {self.name} gauge'
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        self._series = {}  # label values -> [bucket counts..., count, sum]
+        self._lock = Lock()
+
+    def observe(self, value, *values):
+        with self._lock:
+            series = self._series.setdefault(values, [0] * (len(self.buckets) + 1) + [0.0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.help}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            for values, series in sorted(self._series.items()):
+                for bound, count in zip(self.buckets, series):
+                    yield f'{self.name}_bucket{_labels(self.labels + ("le",), values + (bound,))} {count}'
+                yield f'{self.name}_bucket{_labels(self.labels + ("le",), values + ("+Inf",))} {series[-2]}'
+                yield f'{self.name}_count{_labels(self.labels, values)} {series[-2]}'
+                yield f'{self.name}_sum{_labels(self.labels, values)} {series[-1]:.6f}'
+
+
+class Registry:
+    """The metrics one app process records"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        route = ('blueprint', 'endpoint', 'method')
+        self.duration = Histogram('safeher_http_request_duration_seconds', 'Request latency', route, buckets)
+        self.db_duration = Histogram('safeher_http_request_db_seconds', 'Database time per request', route, buckets)
+        self.requests = Counter('safeher_http_requests_total', 'Requests by status code', route + ('status',))
+        self.in_flight = Gauge('safeher_http_requests_in_flight', 'Requests being handled')
+
+    def render(self):
+        lines = []
+        for metric in (self.duration, self.db_duration, self.requests, self.in_flight):
+            lines.extend(metric.collect())
+        return '\n'.join(lines) + '\n'
+
+
+def _add_timing(name, seconds):
+    """Accumulate time spent in one phase of the current request"""
+    if has_request_context() and 'timings' in g:
+        g.timings[name] = g.timings.get(name, 0.0) + seconds
+
+
+def _time_json(provider):
+    """Count the provider's encoding as serialization time (outermost call only, dumps nests in response)"""
+    def wrap(fn):
+        def timed(*args, **kwargs):
+            if not has_request_context() or g.get('serializing'):
+                return fn(*args, **kwargs)
+            g.serializing = True
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                g.serializing = False
+                _add_timing('serialize', time.perf_counter() - start)
+        return timed
+
+    provider.dumps = wrap(provider.dumps)
+    provider.response = wrap(provider.response)
+
+
+def _route_labels():
+    # Unmatched URLs share one label so scanners can't blow up the series count
+    return (request.blueprint or '', request.endpoint or 'unmatched', request.method)
+
+
+def init_app(app):
+    """Time requests, add Server-Timing (when enabled) and serve /api/metrics"""
+    if not app.config['METRICS_ENABLED']:
+        return
+    registry = Registry()
+    app.extensions['metrics'] = registry
+    _time_json(app.json)
+
+    @app.before_request
+    def start_timer():
+        g.request_start = time.perf_counter()
+        g.timings = {}
+        registry.in_flight.inc()
+
+    @app.after_request
+    def add_server_timing(response):
+        g.response_status = response.status_code
+        # Timings tell an outsider how long queries take, so only debug setups expose them
+        if not app.config['SERVER_TIMING_HEADERS']:
+            return response
+        total = time.perf_counter() - g.request_start
+        parts = []
+        tracker = current_tracker()
+        if tracker is not None:
+            parts.append(f'db;dur={tracker.seconds * 1000:.1f};desc="{tracker.count} queries"')
+        parts += [f'{name};dur={seconds * 1000:.1f}' for name, seconds in sorted(g.timings.items())]
+        parts.append(f'total;dur={total * 1000:.1f}')
+        response.headers['Server-Timing'] = ', '.join(parts)
+        return response
+
+    @app.teardown_request
+    def record_request(exc):
+        if 'request_start' not in g:
+            return
+        labels = _route_labels()
+        registry.duration.observe(time.perf_counter() - g.request_start, *labels)
+        tracker = current_tracker()
+        registry.db_duration.observe(tracker.seconds if tracker else 0.0, *labels)
+        registry.requests.inc(*labels, str(g.get('response_status', 500)))
+        registry.in_flight.dec()
+
+    @app.route('/api/metrics', methods=['GET'])
+    def metrics():
+        """Prometheus scrape endpoint; scrapers send METRICS_TOKEN as a bearer token"""
+        token = app.config['METRICS_TOKEN']
+        if not token:
+            # No token configured: the endpoint is off rather than public
+            return {'error': 'Not found'}, 404
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            return {'error': 'Metrics token required'}, 401
+        return Response(registry.render(), mimetype='text/plain; version=0.0.4')
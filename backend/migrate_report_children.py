@@ -0,0 +1,132 @@
+"""
+Database migration script for normalizing report JSON columns
+Moves the tags, file_attachments and related_report_ids JSON arrays stored on
+reports into the report_tags, report_attachments and report_relations tables
+"""
+import json
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from extensions import db
+from models import ReportAttachment
+from sqlalchemy import text
+
+BATCH_SIZE = 1000
+LEGACY_COLUMNS = ['tags', 'file_attachments', 'related_report_ids']
+
+
+def _load(value):
+    """Decode a legacy JSON array, treating bad data as empty"""
+    try:
+        decoded = json.loads(value) if value else []
+    except ValueError:
+        return []
+    return decoded if isinstance(decoded, list) else []
+
+
+def _child_rows(report_id, tags, attachments, related_ids):
+    """Build parameter rows for the child tables from one report's legacy values"""
+    tag_rows, attachment_rows, relation_rows = [], [], []
+    
+    for tag in dict.fromkeys(str(t).strip() for t in _load(tags)):
+        if tag:
+            tag_rows.append({'report_id': report_id, 'tag': tag})
+    
+    for position, item in enumerate(a for a in _load(attachments) if isinstance(a, dict)):
+        attachment = ReportAttachment.from_dict(item, position)
+        attachment_rows.append({
+            'report_id': report_id, 'position': position, 'name': attachment.name,
+            'type': attachment.type, 'url': attachment.url, 'size': attachment.size,
+            'uploaded_at': attachment.uploaded_at, 'extra': attachment.extra
+        })
+    
+    related = []
+    for value in _load(related_ids):
+        try:
+            related.append(int(value))
+        except (TypeError, ValueError):
+            continue
+    for related_id in dict.fromkeys(related):
+        relation_rows.append({'report_id': report_id, 'related_report_id': related_id})
+    
+    return tag_rows, attachment_rows, relation_rows
+
+
+def migrate_report_children():
+    """Backfill child tables from the legacy JSON columns in batches"""
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            with db.engine.connect() as conn:
+                # Get existing columns
+                result = conn.execute(text("PRAGMA table_info(reports)"))
+                existing_columns = [row[1] for row in result]
+                columns = [c for c in LEGACY_COLUMNS if c in existing_columns]
+                
+                if not columns:
+                    print("No legacy JSON columns found - nothing to migrate")
+                    return True
+                
+                select_columns = ', '.join(c if c in columns else f'NULL AS {c}' for c in LEGACY_COLUMNS)
+                pending = ' OR '.join(f'{c} IS NOT NULL' for c in columns)
+                last_id, migrated = 0, 0
+                
+                while True:
+                    rows = conn.execute(text(
+                        f"SELECT id, {select_columns} FROM reports "
+                        f"WHERE id > :last_id AND ({pending}) ORDER BY id LIMIT :batch"
+                    ), {'last_id': last_id, 'batch': BATCH_SIZE}).fetchall()
+                    if not rows:
+                        break
+                    
+                    tag_rows, attachment_rows, relation_rows = [], [], []
+                    for row in rows:
+                        tags, attachments, relations = _child_rows(*row)
+                        tag_rows += tags
+                        attachment_rows += attachments
+                        relation_rows += relations
+                    
+                    # Insert each batch with executemany and clear the legacy values in the
+                    # same transaction, so re-running the script never duplicates rows
+                    if tag_rows:
+                        conn.execute(text(
+                            "INSERT OR IGNORE INTO report_tags (report_id, tag) VALUES (:report_id, :tag)"
+                        ), tag_rows)
+                    if attachment_rows:
+                        conn.execute(text(
+                            "INSERT INTO report_attachments (report_id, position, name, type, url, size, uploaded_at, extra) "
+                            "VALUES (:report_id, :position, :name, :type, :url, :size, :uploaded_at, :extra)"
+                        ), attachment_rows)
+                    if relation_rows:
+                        conn.execute(text(
+                            "INSERT OR IGNORE INTO report_relations (report_id, related_report_id) "
+                            "VALUES (:report_id, :related_report_id)"
+                        ), relation_rows)
+                    conn.execute(text(
+                        f"UPDATE reports SET {', '.join(f'{c} = NULL' for c in columns)} "
+                        f"WHERE id IN ({', '.join(str(row[0]) for row in rows)})"
+                    ))
+                    conn.commit()
+                    
+                    last_id = rows[-1][0]
+                    migrated += len(rows)
+                    print(f"Migrated {migrated} reports (up to id {last_id})")
+                
+                print("\n✅ Migration completed successfully!")
+                print(f"{migrated} reports moved to report_tags, report_attachments and report_relations.")
+                
+        except Exception as e:
+            print(f"\n❌ Migration failed: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return False
+    
+    return True
+
+if __name__ == '__main__':
+    print("Starting database migration...")
+    print("This will move report tags, attachments and related reports into their own tables.\n")
+    migrate_report_children()
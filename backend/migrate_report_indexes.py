@@ -0,0 +1,41 @@
+"""
+Database migration script for report indexes
+Creates the indexes declared on the models that db.create_all() does not add
+to tables which already exist (e.g. the composite (status, created_at) indexes)
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from extensions import db
+
+def migrate_report_indexes():
+    """Create any model-declared indexes missing from existing tables"""
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            with db.engine.connect() as conn:
+                for table in db.metadata.sorted_tables:
+                    for index in sorted(table.indexes, key=lambda i: i.name):
+                        # checkfirst skips indexes that are already present
+                        index.create(conn, checkfirst=True)
+                        print(f"Index {index.name} on {table.name} created/verified")
+                conn.commit()
+                
+                print("\n✅ Migration completed successfully!")
+                print("All declared indexes exist.")
+                
+        except Exception as e:
+            print(f"\n❌ Migration failed: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return False
+    
+    return True
+
+if __name__ == '__main__':
+    print("Starting database migration...")
+    print("This will add missing indexes to existing tables.\n")
+    migrate_report_indexes()
@@ -0,0 +1,48 @@
+"""
+Database migration script for stored_files
+Adds last_uploaded_at, which the sweep-uploads command uses to find uploads
+that were never attached to a report, and backfills it from created_at
+"""
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app import create_app
+from extensions import db
+from sqlalchemy import inspect, text
+
+def migrate_stored_files():
+    """Add stored_files.last_uploaded_at if it doesn't exist"""
+    app = create_app()
+    
+    with app.app_context():
+        try:
+            with db.engine.connect() as conn:
+                existing_columns = [column['name'] for column in inspect(conn).get_columns('stored_files')]
+                if 'last_uploaded_at' in existing_columns:
+                    print("Column last_uploaded_at already exists")
+                else:
+                    print("Adding column: last_uploaded_at")
+                    conn.execute(text("ALTER TABLE stored_files ADD COLUMN last_uploaded_at TIMESTAMP"))
+                
+                # Existing blobs count as uploaded when they were first stored
+                updated = conn.execute(text(
+                    "UPDATE stored_files SET last_uploaded_at = created_at WHERE last_uploaded_at IS NULL"
+                )).rowcount
+                conn.commit()
+                print(f"Backfilled last_uploaded_at on {updated} blob(s)")
+                
+                print("\n✅ Migration completed successfully!")
+                
+        except Exception as e:
+            print(f"\n❌ Migration failed: {str(e)}")
+            import traceback
+            traceback.print_exc()
+            return False
+    
+    return True
+
+if __name__ == '__main__':
+    print("Starting database migration...")
+    print("This will add last_uploaded_at to the stored_files table.\n")
+    migrate_stored_files()
@@ -3,10 +3,12 @@ SQLAlchemy database models
 Defines User, Report, and ModeratorNote models with relationships
 """
 from datetime import datetime
+import json
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from extensions import db
+from sqlalchemy.orm import joinedload, load_only, selectinload
 from werkzeug.security import generate_password_hash, check_password_hash
 
 class User(db.Model):
@@ -51,6 +53,17 @@ class User(db.Model):
 class Report(db.Model):
     """Harassment report model with comprehensive fields"""
     __tablename__ = 'reports'
+    __table_args__ = (
+        # Composite indexes for filtered lists ordered newest first
+        # (existing databases: python migrate_report_indexes.py)
+        db.Index('ix_reports_user_created', 'user_id', 'created_at'),
+        db.Index('ix_reports_user_updated', 'user_id', 'updated_at'),  # Delta sync of a user's own reports
+        db.Index('ix_reports_status_created', 'status', 'created_at'),
+        db.Index('ix_reports_category_created', 'category', 'created_at'),
+        db.Index('ix_reports_severity_created', 'severity', 'created_at'),
+        db.Index('ix_reports_urgency_created', 'urgency', 'created_at'),
+        db.Index('ix_reports_incident_date', 'incident_date'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
@@ -61,7 +74,6 @@ class Report(db.Model):
     description = db.Column(db.Text, nullable=False)
     category = db.Column(db.String(50), nullable=False)  # e.g., 'online', 'physical', 'workplace'
     subcategory = db.Column(db.String(50), nullable=True)  # More specific category
-    tags = db.Column(db.Text)  # JSON array of tags
     
     # Incident Details
     location = db.Column(db.String(200), nullable=True)  # Where the incident occurred
@@ -71,7 +83,6 @@ class Report(db.Model):
     
     # Evidence & Files
     evidence = db.Column(db.Text)  # Text evidence (URLs, notes)
-    file_attachments = db.Column(db.Text)  # JSON array of file metadata: [{"name": "...", "type": "...", "url": "...", "size": ...}]
     
     # Contact & Follow-up
     contact_phone = db.Column(db.String(20), nullable=True)
@@ -83,60 +94,148 @@ class Report(db.Model):
     perpetrator_info = db.Column(db.Text, nullable=True)  # Perpetrator information if known
     anonymous_report = db.Column(db.Boolean, default=False, nullable=False)  # Hide reporter identity
     
-    # Related Reports
-    related_report_ids = db.Column(db.Text)  # JSON array of related report IDs
-    
     # Status & Resolution
     status = db.Column(db.String(20), default='pending', nullable=False)  # 'pending', 'in_review', 'resolved', 'rejected'
     resolution_notes = db.Column(db.Text, nullable=True)  # Notes visible to reporter when resolved
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False, index=True)
-    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False, index=True)
     
     # Relationships
     notes = db.relationship('ModeratorNote', backref='report', lazy=True, cascade='all, delete-orphan')
+    # Tags, file attachments and related report IDs live in indexed child tables
+    # (previously JSON arrays in the tags/file_attachments/related_report_ids columns)
+    report_tags = db.relationship('ReportTag', lazy=True, cascade='all, delete-orphan', order_by='ReportTag.id')
+    attachments = db.relationship('ReportAttachment', lazy=True, cascade='all, delete-orphan', order_by='ReportAttachment.position')
+    relations = db.relationship('ReportRelation', lazy=True, cascade='all, delete-orphan', order_by='ReportRelation.id',
+                                foreign_keys='ReportRelation.report_id')
+    
+    # How each serialized field is produced, in output order ('notes' is added by to_dict)
+    SERIALIZED_FIELDS = {
+        'id': lambda r: r.id,
+        'user_id': lambda r: r.user_id,
+        'report_number': lambda r: r.report_number or r.generate_report_number(),
+        'title': lambda r: r.title,
+        'description': lambda r: r.description,
+        'category': lambda r: r.category,
+        'subcategory': lambda r: r.subcategory,
+        'tags': lambda r: [t.tag for t in r.report_tags],
+        'location': lambda r: r.location,
+        'incident_date': lambda r: r.incident_date.isoformat() if r.incident_date else None,
+        'severity': lambda r: r.severity,
+        'urgency': lambda r: r.urgency,
+        'evidence': lambda r: r.evidence,
+        'file_attachments': lambda r: [a.to_dict() for a in r.attachments],
+        'contact_phone': lambda r: r.contact_phone,
+        'preferred_contact_method': lambda r: r.preferred_contact_method,
+        'follow_up_requested': lambda r: r.follow_up_requested,
+        'witnesses': lambda r: r.witnesses,
+        'perpetrator_info': lambda r: r.perpetrator_info,
+        'anonymous_report': lambda r: r.anonymous_report,
+        'related_report_ids': lambda r: [rel.related_report_id for rel in r.relations],
+        'status': lambda r: r.status,
+        'resolution_notes': lambda r: r.resolution_notes,
+        'created_at': lambda r: r.created_at.isoformat(),
+        'updated_at': lambda r: r.updated_at.isoformat(),
+        'user': lambda r: ({'id': None, 'email': 'Anonymous', 'full_name': 'Anonymous'} if r.anonymous_report
+                           else r.user.to_dict() if r.user else None)
+    }
+    
+    # (columns, relationship) each serialized field reads, where that isn't just the column of the same name
+    FIELD_SOURCES = {
+        'tags': ((), 'report_tags'),
+        'file_attachments': ((), 'attachments'),
+        'related_report_ids': ((), 'relations'),
+        'user': (('user_id', 'anonymous_report'), 'user'),
+        'notes': ((), None),
+    }
+    
+    @classmethod
+    def parse_fields(cls, value):
+        """Parse a ?fields= projection (comma-separated); None means every field"""
+        if not value:
+            return None
+        fields = [f.strip() for f in value.split(',') if f.strip()]
+        unknown = [f for f in fields if f not in cls.SERIALIZED_FIELDS and f != 'notes']
+        if not fields or unknown:
+            raise ValueError(f'Unknown fields: {", ".join(unknown)}' if unknown else 'fields must not be empty')
+        return fields
+    
+    @classmethod
+    def eager_options(cls, include_notes=False, fields=None):
+        """
+        Loader options for list endpoints that serialize many reports.
+        Reporters (and note moderators) are joined into the query that loads
+        their rows; each collection is fetched in one batched query instead
+        of lazy loading it row by row.
+        With a fields projection, only the columns and relationships those
+        fields read are loaded.
+        """
+        if fields is None:
+            relationships = ['user', 'report_tags', 'attachments', 'relations']
+            options = []
+        else:
+            # Sort keys are always loaded so pagination cursors don't trigger refreshes
+            columns, relationships = {'created_at', 'updated_at'}, []
+            for name in fields:
+                field_columns, relationship = cls.FIELD_SOURCES.get(name, ((name,), None))
+                columns.update(field_columns)
+                if relationship:
+                    relationships.append(relationship)
+            options = [load_only(*[getattr(cls, c) for c in sorted(columns)])]
+        
+        # Many-to-one, so the join never multiplies rows or breaks a LIMIT
+        options += [joinedload(cls.user) if name == 'user' else selectinload(getattr(cls, name))
+                    for name in relationships]
+        if include_notes:
+            options.append(selectinload(cls.notes).joinedload(ModeratorNote.moderator))
+        return options
+    
+    def set_tags(self, tags):
+        """Replace the report's tags (blank and duplicate tags are dropped)"""
+        seen = []
+        for tag in tags or []:
+            tag = str(tag).strip()
+            if tag and tag not in seen:
+                seen.append(tag)
+        # Reuse rows for tags that are kept so the (report_id, tag) constraint holds during the flush
+        existing = {t.tag: t for t in self.report_tags}
+        self.report_tags = [existing.get(tag) or ReportTag(tag=tag) for tag in seen]
+    
+    def set_attachments(self, attachments):
+        """Replace the report's file attachment metadata"""
+        self.attachments = [ReportAttachment.from_dict(item, position)
+                            for position, item in enumerate(attachments or []) if isinstance(item, dict)]
+    
+    def set_related_report_ids(self, report_ids):
+        """Replace the IDs of reports this one is related to"""
+        seen = []
+        for report_id in report_ids or []:
+            try:
+                report_id = int(report_id)
+            except (TypeError, ValueError):
+                continue
+            if report_id not in seen:
+                seen.append(report_id)
+        existing = {r.related_report_id: r for r in self.relations}
+        self.relations = [existing.get(report_id) or ReportRelation(related_report_id=report_id) for report_id in seen]
     
     def generate_report_number(self):
-        """Generate unique report number: REP-YYYYMMDD-XXXX"""
-        if not self.report_number:
-            date_str = datetime.utcnow().strftime('%Y%m%d')
-            # Use last 4 digits of ID, or random if not saved yet
-            id_suffix = f"{self.id:04d}" if self.id else "0000"
-            self.report_number = f"REP-{date_str}-{id_suffix}"
-        return self.report_number
-    
-    def to_dict(self, include_notes=False):
-        """Serialize report to dictionary"""
-        import json
-        result = {
-            'id': self.id,
-            'user_id': self.user_id,
-            'report_number': self.report_number or self.generate_report_number(),
-            'title': self.title,
-            'description': self.description,
-            'category': self.category,
-            'subcategory': self.subcategory,
-            'tags': json.loads(self.tags) if self.tags else [],
-            'location': self.location,
-            'incident_date': self.incident_date.isoformat() if self.incident_date else None,
-            'severity': self.severity,
-            'urgency': self.urgency,
-            'evidence': self.evidence,
-            'file_attachments': json.loads(self.file_attachments) if self.file_attachments else [],
-            'contact_phone': self.contact_phone,
-            'preferred_contact_method': self.preferred_contact_method,
-            'follow_up_requested': self.follow_up_requested,
-            'witnesses': self.witnesses,
-            'perpetrator_info': self.perpetrator_info,
-            'anonymous_report': self.anonymous_report,
-            'related_report_ids': json.loads(self.related_report_ids) if self.related_report_ids else [],
-            'status': self.status,
-            'resolution_notes': self.resolution_notes,
-            'created_at': self.created_at.isoformat(),
-            'updated_at': self.updated_at.isoformat(),
-            'user': self.user.to_dict() if self.user and not self.anonymous_report else {'id': None, 'email': 'Anonymous', 'full_name': 'Anonymous'} if self.anonymous_report else (self.user.to_dict() if self.user else None)
-        }
+        """
+        Report number REP-YYYYMMDD-XXXX from the creation date and ID. Only
+        computes it: create_report stores it, and serializing a row that has
+        none must not dirty it (a flush would bump updated_at and the ETag).
+        """
+        date_str = (self.created_at or datetime.utcnow()).strftime('%Y%m%d')
+        # Use last 4 digits of ID, or zeros if not saved yet
+        id_suffix = f"{self.id:04d}" if self.id else "0000"
+        return f"REP-{date_str}-{id_suffix}"
+    
+    def to_dict(self, include_notes=False, fields=None):
+        """Serialize report to dictionary, optionally only the named fields (see parse_fields)"""
+        names = self.SERIALIZED_FIELDS if fields is None else [f for f in fields if f != 'notes']
+        result = {name: self.SERIALIZED_FIELDS[name](self) for name in names}
         
         if include_notes:
             result['notes'] = [note.to_dict() for note in self.notes]
@@ -147,9 +246,99 @@ class Report(db.Model):
         return f'<Report {self.id}: {self.title}>'
 
 
+class ReportTag(db.Model):
+    """A tag on a report"""
+    __tablename__ = 'report_tags'
+    __table_args__ = (
+        db.UniqueConstraint('report_id', 'tag', name='uq_report_tags_report_tag'),
+        db.Index('ix_report_tags_tag_report', 'tag', 'report_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    report_id = db.Column(db.Integer, db.ForeignKey('reports.id'), nullable=False, index=True)
+    tag = db.Column(db.String(100), nullable=False)
+    
+    def __repr__(self):
+        return f'<ReportTag {self.tag} on Report {self.report_id}>'
+
+
+class ReportAttachment(db.Model):
+    """File attachment metadata for a report (the file itself lives in uploads)"""
+    __tablename__ = 'report_attachments'
+    
+    # Keys stored in their own columns; anything else the client sends is kept in `extra`
+    FIELDS = ('name', 'type', 'url', 'size', 'uploaded_at')
+    
+    id = db.Column(db.Integer, primary_key=True)
+    report_id = db.Column(db.Integer, db.ForeignKey('reports.id'), nullable=False, index=True)
+    position = db.Column(db.Integer, default=0, nullable=False)
+    name = db.Column(db.String(255), nullable=True)
+    type = db.Column(db.String(100), nullable=True)
+    url = db.Column(db.String(500), nullable=True, index=True)
+    size = db.Column(db.Integer, nullable=True)
+    uploaded_at = db.Column(db.String(40), nullable=True)  # ISO timestamp as returned by the upload endpoint
+    extra = db.Column(db.Text, nullable=True)  # JSON object of any other metadata keys
+    
+    @classmethod
+    def from_dict(cls, data, position=0):
+        """Build an attachment row from upload metadata"""
+        # Explicit nulls are kept in `extra` so they come back from to_dict
+        extra = {k: v for k, v in data.items() if k not in cls.FIELDS or v is None}
+        size = data.get('size')
+        if isinstance(size, str):
+            try:
+                size = int(size.strip())
+            except ValueError:
+                extra['size'] = size  # Not a number: keep the client's value as-is
+                size = None
+        elif isinstance(size, (int, float)) and not isinstance(size, bool):
+            size = int(size)
+        elif size is not None:
+            extra['size'] = size
+            size = None
+        return cls(
+            position=position,
+            name=data.get('name'),
+            type=data.get('type'),
+            url=data.get('url'),
+            size=size,
+            uploaded_at=data.get('uploaded_at'),
+            extra=json.dumps(extra) if extra else None
+        )
+    
+    def to_dict(self):
+        """Serialize back to the upload metadata shape"""
+        result = {field: getattr(self, field) for field in self.FIELDS if getattr(self, field) is not None}
+        if self.extra:
+            result.update(json.loads(self.extra))
+        return result
+    
+    def __repr__(self):
+        return f'<ReportAttachment {self.name} on Report {self.report_id}>'
+
+
+class ReportRelation(db.Model):
+    """A link from one report to a related report"""
+    __tablename__ = 'report_relations'
+    __table_args__ = (
+        db.UniqueConstraint('report_id', 'related_report_id', name='uq_report_relations_pair'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    report_id = db.Column(db.Integer, db.ForeignKey('reports.id'), nullable=False, index=True)
+    related_report_id = db.Column(db.Integer, nullable=False, index=True)  # Not a foreign key: clients may reference unknown IDs
+    
+    def __repr__(self):
+        return f'<ReportRelation {self.report_id} -> {self.related_report_id}>'
+
+
 class ModeratorNote(db.Model):
     """Notes added by moderators on reports"""
     __tablename__ = 'moderator_notes'
+    __table_args__ = (
+        # "Reports this moderator reviewed" is answered from this index alone
+        db.Index('ix_moderator_notes_moderator_report', 'moderator_id', 'report_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     report_id = db.Column(db.Integer, db.ForeignKey('reports.id'), nullable=False, index=True)
@@ -171,3 +360,97 @@ class ModeratorNote(db.Model):
     def __repr__(self):
         return f'<ModeratorNote {self.id} on Report {self.report_id}>'
 
+
+
+class ReportTombstone(db.Model):
+    """Marker left behind by a deleted report so delta-sync clients can drop it"""
+    __tablename__ = 'report_tombstones'
+    __table_args__ = (
+        db.Index('ix_report_tombstones_deleted_report', 'deleted_at', 'report_id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    report_id = db.Column(db.Integer, nullable=False)  # The report row itself is gone
+    user_id = db.Column(db.Integer, nullable=True, index=True)  # Reporter, so users only see their own deletions
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<ReportTombstone {self.report_id} at {self.deleted_at}>'
+
+
+class StatCounter(db.Model):
+    """Denormalized dashboard counters kept in step with reports and users"""
+    __tablename__ = 'stat_counters'
+    
+    name = db.Column(db.String(50), primary_key=True)  # e.g. 'reports', 'reports.status.pending', 'users.role.admin'
+    value = db.Column(db.Integer, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f'<StatCounter {self.name}={self.value}>'
+
+
+class UploadSession(db.Model):
+    """A resumable chunked upload in progress (bytes are staged in a temp file)"""
+    __tablename__ = 'upload_sessions'
+    
+    id = db.Column(db.String(32), primary_key=True)  # Random hex token used in the upload URL
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, index=True)
+    filename = db.Column(db.String(255), nullable=False)  # Sanitized original filename
+    content_type = db.Column(db.String(100), nullable=True)
+    total_size = db.Column(db.Integer, nullable=False)  # Declared up front and checked against MAX_FILE_SIZE
+    received_bytes = db.Column(db.Integer, default=0, nullable=False)  # Contiguous bytes stored so far
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False, index=True)
+    
+    def to_dict(self):
+        """Serialize upload progress"""
+        return {
+            'upload_id': self.id,
+            'filename': self.filename,
+            'size': self.total_size,
+            'offset': self.received_bytes,
+            'complete': self.received_bytes >= self.total_size
+        }
+    
+    def __repr__(self):
+        return f'<UploadSession {self.id} {self.received_bytes}/{self.total_size}>'
+
+
+class StoredFile(db.Model):
+    """Content-addressed upload blob, stored once per distinct SHA-256"""
+    __tablename__ = 'stored_files'
+    
+    sha256 = db.Column(db.String(64), primary_key=True)
+    size = db.Column(db.Integer, nullable=False)
+    content_type = db.Column(db.String(100), nullable=True)
+    ref_count = db.Column(db.Integer, default=1, nullable=False)  # Uploads that resolved to this content
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    # Bumped by every upload of this content; unattached blobs are swept this long after it
+    last_uploaded_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=True)
+    
+    def __repr__(self):
+        return f'<StoredFile {self.sha256[:12]} refs={self.ref_count}>'
+
+
+class MediaJob(db.Model):
+    """Durable queue entry for generating thumbnails/posters of an uploaded blob"""
+    __tablename__ = 'media_jobs'
+    __table_args__ = (
+        db.Index('ix_media_jobs_status_id', 'status', 'id'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)  # One job per distinct content
+    content_type = db.Column(db.String(100), nullable=True)
+    status = db.Column(db.String(20), default='queued', nullable=False)  # queued, running, done, failed, skipped
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    error = db.Column(db.Text, nullable=True)
+    derivatives = db.Column(db.Text, nullable=True)  # JSON object, e.g. {"thumbnail": "/uploads/<sha>.jpg"}
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+    
+    def get_derivatives(self):
+        return json.loads(self.derivatives) if self.derivatives else {}
+    
+    def __repr__(self):
+        return f'<MediaJob {self.sha256[:12]} {self.status}>'
@@ -0,0 +1,64 @@
+"""
+Keyset pagination helpers
+Encodes opaque (timestamp, id) cursors and applies them to ordered queries
+"""
+import base64
+from datetime import datetime
+from sqlalchemy import and_, or_
+
+
+def parse_limit(value, default, maximum):
+    """Parse a ?limit= value, clamped to 1..maximum"""
+    if value in (None, ''):
+        return default
+    try:
+        limit = int(value)
+    except (TypeError, ValueError):
+        limit = 0
+    if limit < 1:
+        raise ValueError('limit must be a positive integer')
+    return min(limit, maximum)
+
+
+def encode_cursor(timestamp, row_id):
+    """Encode the sort key of the last row on a page as an opaque cursor"""
+    raw = f"{timestamp.isoformat()}|{row_id}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Decode a cursor back into (timestamp, id); raises ValueError if malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        timestamp_str, id_str = raw.split('|', 1)
+        return datetime.fromisoformat(timestamp_str), int(id_str)
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def paginate(query, sort_column, id_column, cursor=None, limit=50):
+    """
+    Apply keyset pagination on (sort_column DESC, id_column DESC).
+
+    Seeks past the cursor instead of using OFFSET, so the database walks the
+    sort index from the cursor position and page N costs the same as page 1.
+    Returns (items, next_cursor); next_cursor is None on the last page.
+    """
+    if cursor:
+        cursor_ts, cursor_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            sort_column < cursor_ts,
+            and_(sort_column == cursor_ts, id_column < cursor_id)
+        ))
+
+    # Fetch one extra row to find out whether another page exists
+    rows = query.order_by(sort_column.desc(), id_column.desc()).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_column.key), getattr(last, id_column.key))
+
+    return rows, next_cursor
@@ -0,0 +1,124 @@
+"""
+SQL query counting
+Counts the statements each request executes, and the time they take, from
+SQLAlchemy engine events. Optionally flags statements repeated within one
+request as suspected N+1 lazy loads, reports the counts in X-Query-Count /
+X-Query-Time headers, and checks per-endpoint query budgets declared with
+@query_budget. Tests can wrap any block in track_queries()
+"""
+from collections import Counter
+from contextlib import contextmanager
+from functools import wraps
+from threading import local
+import time
+from flask import current_app, g, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+_state = local()
+
+
+class QueryTracker:
+    """Statements executed while this tracker is active"""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    def record(self, statement, seconds):
+        self.count += 1
+        self.seconds += seconds
+        self.statements[statement] += 1
+
+    def repeated(self, threshold):
+        """Statements run at least threshold times, most frequent first"""
+        return [(sql, n) for sql, n in self.statements.most_common() if n >= threshold]
+
+
+def _active():
+    if not hasattr(_state, 'trackers'):
+        _state.trackers = []
+    return _state.trackers
+
+
+@contextmanager
+def track_queries():
+    """Count the queries run on this thread inside the block (nested trackers all see them)"""
+    tracker = QueryTracker()
+    _active().append(tracker)
+    try:
+        yield tracker
+    finally:
+        _active().remove(tracker)
+
+
+def query_budget(limit):
+    """Declare the most queries a view may run, however many rows it returns"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            return view(*args, **kwargs)
+        wrapper.query_budget = limit
+        return wrapper
+    return decorator
+
+
+def current_tracker():
+    """The current request's tracker, or None outside a request"""
+    return g.get('query_tracker')
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    context.query_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    seconds = time.perf_counter() - context.query_start
+    for tracker in _active():
+        tracker.record(statement, seconds)
+
+
+def init_app(app):
+    """Track queries per request and check them after each response"""
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+
+    @app.before_request
+    def start_tracking():
+        tracker = QueryTracker()
+        _active().append(tracker)
+        g.query_tracker = tracker
+
+    @app.after_request
+    def report_queries(response):
+        tracker = current_tracker()
+        if tracker is None:
+            return response
+        config = current_app.config
+        if config['QUERY_DEBUG_HEADERS']:
+            response.headers['X-Query-Count'] = str(tracker.count)
+            response.headers['X-Query-Time'] = f'{tracker.seconds * 1000:.1f}ms'
+
+        threshold = config['QUERY_N_PLUS_ONE_THRESHOLD']
+        if threshold:
+            for statement, times in tracker.repeated(threshold):
+                current_app.logger.warning('Suspected N+1 query', extra={
+                    'endpoint': request.endpoint, 'times': times, 'statement': statement})
+
+        view = current_app.view_functions.get(request.endpoint)
+        budget = getattr(view, 'query_budget', None)
+        if budget is not None and tracker.count > budget:
+            message = f'{request.endpoint} ran {tracker.count} queries (budget {budget})'
+            if config['QUERY_BUDGET_STRICT']:
+                raise AssertionError(message)
+            current_app.logger.warning('Query budget exceeded', extra={
+                'endpoint': request.endpoint, 'queries': tracker.count, 'budget': budget})
+        return response
+
+    @app.teardown_request
+    def stop_tracking(exc):
+        tracker = g.pop('query_tracker', None)
+        if tracker in _active():
+            _active().remove(tracker)
@@ -0,0 +1,78 @@
+"""
+Read replicas
+Sends the queries of read-only views marked @replica_reads to one of the
+replica binds configured in DATABASE_REPLICA_URLS; every other request, and
+every flush, uses the primary. A user who just wrote through the API reads
+from the primary for DB_REPLICA_STICKY_SECONDS afterwards, so their own
+changes show up before the replicas catch up. The marker travels in a signed
+cookie that every worker honours, with a per-process memory as a fallback
+for clients that don't keep cookies
+"""
+import random
+from flask import g, request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from extensions import REPLICA_BIND_PREFIX
+from user_cache import TTLCache
+
+READ_METHODS = ('GET', 'HEAD')
+
+
+def replica_reads(view):
+    """Allow a read-only view to query a replica (lagging slightly behind the primary)"""
+    view.replica_reads = True
+    return view
+
+
+def init_app(app):
+    """Route marked GET requests to a random replica unless the user wrote recently"""
+    replicas = sorted(key for key in app.config['SQLALCHEMY_BINDS'] if key.startswith(REPLICA_BIND_PREFIX))
+    if not replicas:
+        return
+    sticky_seconds = app.config['DB_REPLICA_STICKY_SECONDS']
+    cookie_name = app.config['DB_REPLICA_STICKY_COOKIE']
+    # Signed so a client can't pin someone else (or everyone) to the primary
+    signer = URLSafeTimedSerializer(app.config['SECRET_KEY'], salt='read-primary')
+    # Process-local: each worker only remembers the writes it served itself
+    recent_writers = TTLCache(maxsize=100_000, ttl=sticky_seconds)
+
+    def wrote_recently(identity):
+        if recent_writers.get(identity) is True:
+            return True
+        marker = request.cookies.get(cookie_name)
+        if not marker:
+            return False
+        try:
+            return signer.loads(marker, max_age=sticky_seconds) == identity
+        except BadSignature:  # Includes SignatureExpired
+            return False
+
+    @app.before_request
+    def choose_read_bind():
+        view = app.view_functions.get(request.endpoint)
+        if request.method not in READ_METHODS or not getattr(view, 'replica_reads', False):
+            return
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+        if identity is not None and wrote_recently(identity):
+            return
+        g.db_read_bind = random.choice(replicas)
+
+    @app.after_request
+    def stick_to_primary(response):
+        if request.method in READ_METHODS or request.method == 'OPTIONS' or response.status_code >= 400:
+            return response
+        try:
+            identity = get_jwt_identity()
+        except RuntimeError:
+            return response  # Unauthenticated write (login, register)
+        if identity is not None:
+            recent_writers.set(identity, True)
+            # Read primary until now + DB_REPLICA_STICKY_SECONDS, on whichever worker serves the next read
+            response.set_cookie(cookie_name, signer.dumps(identity), max_age=sticky_seconds,
+                                secure=request.is_secure, httponly=True, samesite='Lax')
+        return response
+
+    @app.teardown_request
+    def clear_read_bind(exc):
+        g.pop('db_read_bind', None)
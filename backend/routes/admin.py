@@ -2,7 +2,7 @@
 Admin routes
 Admin-only endpoints for user management, stats, and exports
 """
-from flask import Blueprint, request, jsonify, Response
+from flask import Blueprint, request, jsonify, Response, current_app, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt
 import csv
 from io import StringIO
@@ -10,7 +10,11 @@ import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from extensions import db
+from filters import REPORT_STATUSES, parse_date
 from models import User, Report
+from replicas import replica_reads
+from stats import get_stats as load_stats
+from user_cache import invalidate_user
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/api/admin')
 
@@ -87,6 +91,7 @@ def update_user(user_id):
     
     try:
         db.session.commit()
+        invalidate_user(user.id)
         return jsonify({
             'message': 'User updated successfully',
             'user': user.to_dict()
@@ -98,69 +103,81 @@ def update_user(user_id):
 
 @admin_bp.route('/stats', methods=['GET'])
 @jwt_required()
+@replica_reads
 def get_stats():
-    """Get system statistics (admin only)"""
+    """Get system statistics (admin only) from one GROUP BY per table or the counter cache"""
     if not require_admin():
         return jsonify({'error': 'Admin access required'}), 403
     
-    # Count reports by status
-    stats = {
-        'total_reports': Report.query.count(),
-        'reports_by_status': {
-            'pending': Report.query.filter_by(status='pending').count(),
-            'in_review': Report.query.filter_by(status='in_review').count(),
-            'resolved': Report.query.filter_by(status='resolved').count(),
-            'rejected': Report.query.filter_by(status='rejected').count()
-        },
-        'total_users': User.query.count(),
-        'users_by_role': {
-            'user': User.query.filter_by(role='user').count(),
-            'moderator': User.query.filter_by(role='moderator').count(),
-            'admin': User.query.filter_by(role='admin').count()
-        }
-    }
-    
-    return jsonify(stats), 200
+    return jsonify(load_stats()), 200
 
 
 @admin_bp.route('/reports/export', methods=['GET'])
 @jwt_required()
+@replica_reads
 def export_reports():
-    """Export all reports as CSV (admin only)"""
+    """Stream reports as CSV (admin only), optionally filtered by ?from=&to=&status="""
     if not require_admin():
         return jsonify({'error': 'Admin access required'}), 403
     
-    reports = Report.query.order_by(Report.created_at.desc()).all()
+    filters = []
+    try:
+        if request.args.get('from'):
+            filters.append(Report.created_at >= parse_date('from', request.args['from']))
+        if request.args.get('to'):
+            filters.append(Report.created_at < parse_date('to', request.args['to'], end_of_range=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    # Create CSV in memory
-    output = StringIO()
-    writer = csv.writer(output)
+    status = request.args.get('status')
+    if status:
+        if status not in REPORT_STATUSES:
+            return jsonify({'error': 'Invalid status filter'}), 400
+        filters.append(Report.status == status)
     
-    # Write header
-    writer.writerow([
-        'ID', 'User Email', 'Title', 'Category', 'Status', 
-        'Description', 'Evidence', 'Created At', 'Updated At'
-    ])
+    batch_size = current_app.config['EXPORT_BATCH_SIZE']
     
-    # Write data
-    for report in reports:
+    def generate():
+        # Select plain columns with the reporter email joined in SQL, and
+        # fetch them in batches so memory stays flat regardless of table size
+        rows = db.session.query(
+            Report.id, User.email, Report.title, Report.category, Report.status,
+            Report.description, Report.evidence, Report.created_at, Report.updated_at
+        ).outerjoin(User, Report.user_id == User.id).filter(*filters).order_by(
+            Report.created_at.desc()
+        ).yield_per(batch_size)
+        
+        output = StringIO()
+        writer = csv.writer(output)
+        
+        # Write header
         writer.writerow([
-            report.id,
-            report.user.email if report.user else 'N/A',
-            report.title,
-            report.category,
-            report.status,
-            report.description,
-            report.evidence or '',
-            report.created_at.isoformat(),
-            report.updated_at.isoformat()
+            'ID', 'User Email', 'Title', 'Category', 'Status', 
+            'Description', 'Evidence', 'Created At', 'Updated At'
         ])
+        
+        # Write data, flushing one chunk per batch
+        for count, row in enumerate(rows, start=1):
+            writer.writerow([
+                row.id,
+                row.email or 'N/A',
+                row.title,
+                row.category,
+                row.status,
+                row.description,
+                row.evidence or '',
+                row.created_at.isoformat(),
+                row.updated_at.isoformat()
+            ])
+            if count % batch_size == 0:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate(0)
+        
+        yield output.getvalue()
     
-    # Create response
-    output.seek(0)
     return Response(
-        output.getvalue(),
+        stream_with_context(generate()),
         mimetype='text/csv',
         headers={'Content-Disposition': 'attachment; filename=safeher_reports_export.csv'}
     )
-
@@ -2,7 +2,7 @@
 Authentication routes
 Handles user registration and login with JWT token generation
 """
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import create_access_token
 import sys
 import os
@@ -15,11 +15,10 @@ auth_bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """Register a new user (default role: 'user')"""
-    print(f"Register endpoint hit - Content-Type: {request.content_type}")
-    print(f"Request data: {request.data}")
+    # Never log the body: it holds the password
+    current_app.logger.debug('Register request', extra={'content_type': request.content_type})
     
     data = request.get_json()
-    print(f"Parsed JSON: {data}")
     
     # Validation
     if not data or not data.get('email') or not data.get('password') or not data.get('full_name'):
@@ -57,11 +56,10 @@ def register():
 @auth_bp.route('/login', methods=['POST'])
 def login():
     """Login user and return JWT token"""
-    print(f"Login endpoint hit - Content-Type: {request.content_type}")
-    print(f"Request data: {request.data}")
+    # Never log the body: it holds the password
+    current_app.logger.debug('Login request', extra={'content_type': request.content_type})
     
     data = request.get_json()
-    print(f"Parsed JSON: {data}")
     
     if not data or not data.get('email') or not data.get('password'):
         return jsonify({'error': 'Email and password required'}), 400
@@ -2,14 +2,23 @@
 Moderator routes
 Moderator-specific actions for reviewing and managing reports
 """
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from flask import Blueprint, Response, request, jsonify, current_app
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt, verify_jwt_in_request
 from datetime import datetime
+from sqlalchemy import insert
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import events
+from conditional import list_validators, not_modified, report_validators, with_validators
 from extensions import db
+from filters import REPORT_STATUSES, apply_report_filters
 from models import Report, ModeratorNote, User
+from pagination import paginate, parse_limit
+from query_counter import query_budget
+from replicas import replica_reads
+from sync import SyncTokenExpired, collect_changes
+from user_cache import load_user
 
 moderator_bp = Blueprint('moderator', __name__, url_prefix='/api/moderator')
 
@@ -21,27 +30,121 @@ def require_moderator():
         return False
     return True
 
+# Active-user check (cold user cache), ETag aggregate, the page joined with reporters, then
+# one batched query each for tags, attachments, relations and notes with their moderators
+QUEUE_QUERY_BUDGET = 7
+
 @moderator_bp.route('/reports', methods=['GET'])
 @jwt_required()
+@query_budget(QUEUE_QUERY_BUDGET)
+@replica_reads
 def get_moderator_queue():
     """Get reports queue for moderators (pending and in_review) with full details"""
     if not require_moderator():
         return jsonify({'error': 'Moderator or admin access required'}), 403
     
-    # Filter by status
-    status_filter = request.args.get('status', 'all')
+    try:
+        fields = Report.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    include_notes = fields is None or 'notes' in fields
+    
+    # Filter by status (default: show pending and in_review), category, severity,
+    # urgency and incident date range
+    try:
+        query = apply_report_filters(Report.query, request.args, default_statuses=['pending', 'in_review'])
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    query = Report.query
+    etag, last_modified = list_validators(query)
+    unchanged = not_modified(etag)
+    if unchanged:
+        return unchanged
+    
+    reports = query.options(*Report.eager_options(include_notes=include_notes, fields=fields)) \
+        .order_by(Report.created_at.desc()).all()
+    
+    return with_validators(jsonify([report.to_dict(include_notes=include_notes, fields=fields) for report in reports]),
+                           etag, last_modified)
+
+
+@moderator_bp.route('/reports/changes', methods=['GET'])
+@jwt_required()
+@query_budget(8)
+def get_queue_changes():
+    """Queue reports created, updated or removed since ?since=<sync token> (same filters as the queue)"""
+    if not require_moderator():
+        return jsonify({'error': 'Moderator or admin access required'}), 403
+    
+    try:
+        fields = Report.parse_fields(request.args.get('fields'))
+        include_notes = fields is None or 'notes' in fields
+        view = apply_report_filters(Report.query, request.args, default_statuses=['pending', 'in_review'])
+        limit = parse_limit(request.args.get('limit'),
+                            current_app.config['DEFAULT_PAGE_SIZE'],
+                            current_app.config['MAX_PAGE_SIZE'])
+        # Reports resolved, rejected or otherwise filtered out since the token come back as removed
+        reports, removed, sync_token, has_more = collect_changes(
+            Report.query, view, request.args.get('since'), limit,
+            options=Report.eager_options(include_notes=include_notes, fields=fields)
+        )
+    except SyncTokenExpired as e:
+        return jsonify({'error': str(e)}), 410
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    if status_filter != 'all':
-        query = query.filter_by(status=status_filter)
+    return jsonify({
+        'reports': [report.to_dict(include_notes=include_notes, fields=fields) for report in reports],
+        'removed': removed,
+        'sync_token': sync_token,
+        'has_more': has_more
+    }), 200
+
+
+@moderator_bp.route('/events/token', methods=['POST'])
+@jwt_required()
+def events_token():
+    """Short-lived token for opening the event stream with EventSource"""
+    if not require_moderator():
+        return jsonify({'error': 'Moderator or admin access required'}), 403
+    return jsonify({
+        'token': events.issue_stream_token(get_jwt_identity(), get_jwt().get('role')),
+        'expires_in': current_app.config['EVENTS_TOKEN_SECONDS']
+    }), 200
+
+
+@moderator_bp.route('/events', methods=['GET'])
+def queue_events():
+    """
+    Server-Sent Events stream of report.created, report.status_changed and
+    note.added. EventSource can't set headers, so browsers pass a stream
+    token from POST /events/token as ?token=; reconnects resume after the
+    Last-Event-ID header
+    """
+    if request.args.get('token'):
+        claims = events.verify_stream_token(request.args['token'])
+        if claims is None:
+            return jsonify({'error': 'Stream token is invalid or expired'}), 401
+        user = load_user(int(claims['sub']))
+        if user is None or not user.is_active:
+            return jsonify({'error': 'Account is deactivated or no longer exists'}), 401
+        role = claims.get('role')
     else:
-        # Default: show pending and in_review
-        query = query.filter(Report.status.in_(['pending', 'in_review']))
+        verify_jwt_in_request()  # Authorization header only; access tokens never go in the URL
+        role = get_jwt().get('role', 'user')
+    if role not in ['moderator', 'admin']:
+        return jsonify({'error': 'Moderator or admin access required'}), 403
     
-    reports = query.order_by(Report.created_at.desc()).all()
+    body = events.stream(request.headers.get('Last-Event-ID') or request.args.get('last_event_id'))
+    if body is None:
+        response = jsonify({'error': 'Too many open event streams, try again shortly'})
+        response.headers['Retry-After'] = str(current_app.config['EVENTS_RETRY_MS'] // 1000 or 1)
+        return response, 503
     
-    return jsonify([report.to_dict(include_notes=True) for report in reports]), 200
+    response = Response(body, mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx: pass events through unbuffered
+    return response
 
 
 @moderator_bp.route('/reports/<int:report_id>', methods=['GET'])
@@ -51,33 +154,66 @@ def get_report_details(report_id):
     if not require_moderator():
         return jsonify({'error': 'Moderator or admin access required'}), 403
     
+    try:
+        fields = Report.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
     report = Report.query.get_or_404(report_id)
-    return jsonify(report.to_dict(include_notes=True)), 200
+    etag, last_modified = report_validators(report)
+    unchanged = not_modified(etag, last_modified)
+    if unchanged:
+        return unchanged
+    
+    return with_validators(jsonify(report.to_dict(include_notes=fields is None or 'notes' in fields, fields=fields)),
+                           etag, last_modified)
 
 
 @moderator_bp.route('/reports/reviewed', methods=['GET'])
 @jwt_required()
+@query_budget(7)
+@replica_reads
 def get_reviewed_reports():
-    """Get reports reviewed by the current moderator"""
+    """Get reports reviewed by the current moderator, most recently updated first"""
     if not require_moderator():
         return jsonify({'error': 'Moderator or admin access required'}), 403
     
     current_user_id = int(get_jwt_identity())
     
     # Get reports where this moderator has added notes
-    reports_with_notes = db.session.query(Report).join(ModeratorNote).filter(
+    reviewed_ids = db.session.query(ModeratorNote.report_id).filter(
         ModeratorNote.moderator_id == current_user_id
-    ).distinct().all()
+    )
+    try:
+        fields = Report.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    include_notes = fields is None or 'notes' in fields
     
-    # Filter by status if provided
-    status_filter = request.args.get('status', 'all')
-    if status_filter != 'all':
-        reports_with_notes = [r for r in reports_with_notes if r.status == status_filter]
+    query = Report.query.filter(Report.id.in_(reviewed_ids))
     
-    # Sort by most recently updated
-    reports_with_notes.sort(key=lambda x: x.updated_at, reverse=True)
+    # Filter by status if provided, then page by most recently updated
+    try:
+        query = apply_report_filters(query, request.args)
+        limit = parse_limit(request.args.get('limit'),
+                            current_app.config['DEFAULT_PAGE_SIZE'],
+                            current_app.config['MAX_PAGE_SIZE'])
+        
+        etag, last_modified = list_validators(query)
+        unchanged = not_modified(etag)
+        if unchanged:
+            return unchanged
+        
+        reports, next_cursor = paginate(query.options(*Report.eager_options(include_notes=include_notes, fields=fields)),
+                                        Report.updated_at, Report.id,
+                                        cursor=request.args.get('cursor'), limit=limit)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
-    return jsonify([report.to_dict(include_notes=True) for report in reports_with_notes]), 200
+    return with_validators(jsonify({
+        'reports': [report.to_dict(include_notes=include_notes, fields=fields) for report in reports],
+        'next_cursor': next_cursor
+    }), etag, last_modified)
 
 
 @moderator_bp.route('/reports/<int:report_id>/note', methods=['POST'])
@@ -102,13 +238,19 @@ def add_note(report_id):
         note=data['note'].strip()
     )
     
+    previous_status = report.status
+    
     # Update status if provided
     if 'status' in data and data['status'] in ['pending', 'in_review', 'resolved', 'rejected']:
         report.status = data['status']
+    # A new note changes the report's payload even when the status doesn't change
+    report.updated_at = datetime.utcnow()
     
     try:
         db.session.add(note)
         db.session.commit()
+        events.publish('note.added', {**events.report_event(report), 'note_id': note.id,
+                                      'moderator_id': current_user_id, 'previous_status': previous_status})
         
         return jsonify({
             'message': 'Note added successfully',
@@ -119,3 +261,106 @@ def add_note(report_id):
         db.session.rollback()
         return jsonify({'error': f'Failed to add note: {str(e)}'}), 500
 
+
+def _parse_bulk_operation(item):
+    """Validate one bulk operation; returns (report_id, status, note) or raises ValueError"""
+    if not isinstance(item, dict):
+        raise ValueError('Operation must be an object')
+    report_id = item.get('report_id')
+    if not isinstance(report_id, int) or isinstance(report_id, bool):
+        raise ValueError('report_id must be an integer')
+    status = item.get('status')
+    if status is not None and status not in REPORT_STATUSES:
+        raise ValueError(f'Invalid status. Allowed values: {", ".join(REPORT_STATUSES)}')
+    note = item.get('note')
+    if note is not None and (not isinstance(note, str) or not note.strip()):
+        raise ValueError('note must be non-empty text')
+    if status is None and note is None:
+        raise ValueError('Operation needs a status or a note')
+    return report_id, status, note.strip() if note else None
+
+
+@moderator_bp.route('/reports/bulk', methods=['POST'])
+@jwt_required()
+def bulk_moderate():
+    """
+    Apply a batch of {report_id, status, note} operations in one transaction.
+    mode 'atomic' (default) applies nothing if any operation is invalid;
+    'best_effort' applies the valid ones. Results are returned per operation.
+    """
+    if not require_moderator():
+        return jsonify({'error': 'Moderator or admin access required'}), 403
+    
+    data = request.get_json(silent=True) or {}
+    operations = data.get('operations')
+    mode = data.get('mode', 'atomic')
+    limit = current_app.config['MODERATION_BULK_LIMIT']
+    if not isinstance(operations, list) or not operations:
+        return jsonify({'error': 'operations must be a non-empty list'}), 400
+    if len(operations) > limit:
+        return jsonify({'error': f'At most {limit} operations per request'}), 400
+    if mode not in ('atomic', 'best_effort'):
+        return jsonify({'error': "mode must be 'atomic' or 'best_effort'"}), 400
+    
+    current_user_id = int(get_jwt_identity())
+    parsed = []
+    for item in operations:
+        try:
+            parsed.append(_parse_bulk_operation(item))
+        except ValueError as e:
+            parsed.append(e)
+    
+    # Every affected report in one query
+    ids = {op[0] for op in parsed if not isinstance(op, ValueError)}
+    reports = {report.id: report for report in Report.query.filter(Report.id.in_(ids))} if ids else {}
+    
+    results, applied = [], []
+    for item, op in zip(operations, parsed):
+        if not isinstance(op, ValueError) and op[0] not in reports:
+            op = ValueError('Report not found')
+        if isinstance(op, ValueError):
+            report_id = item.get('report_id') if isinstance(item, dict) else None
+            results.append({'report_id': report_id, 'ok': False, 'error': str(op)})
+        else:
+            results.append({'report_id': op[0], 'ok': True})
+            applied.append(op)
+    
+    if mode == 'atomic' and len(applied) < len(operations):
+        for result in results:
+            if result['ok']:
+                result.update(ok=False, error='Not applied: another operation in the batch failed')
+        return jsonify({'applied': 0, 'results': results}), 400
+    
+    now = datetime.utcnow()
+    notes, published = [], []
+    for report_id, status, note in applied:
+        report = reports[report_id]
+        previous_status = report.status
+        if status is not None:
+            report.status = status
+        report.updated_at = now
+        if note is not None:
+            notes.append({'report_id': report_id, 'moderator_id': current_user_id, 'note': note, 'created_at': now})
+            published.append(['note.added', report, previous_status, None])
+        elif report.status != previous_status:
+            published.append(['report.status_changed', report, previous_status, None])
+    
+    try:
+        if notes:
+            # One batched INSERT for the whole batch; ids come back in operation order
+            note_ids = db.session.scalars(
+                insert(ModeratorNote).returning(ModeratorNote.id, sort_by_parameter_order=True), notes).all()
+            for event, note_id in zip((e for e in published if e[0] == 'note.added'), note_ids):
+                event[3] = note_id
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to apply operations: {str(e)}'}), 500
+    
+    for event_type, report, previous_status, note_id in published:
+        payload = {**events.report_event(report), 'previous_status': previous_status}
+        if event_type == 'note.added':
+            payload.update(note_id=note_id, moderator_id=current_user_id)
+        events.publish(event_type, payload)
+    
+    return jsonify({'applied': len(applied), 'results': results}), 200
@@ -3,31 +3,60 @@ Report routes
 CRUD operations for harassment reports (auth required)
 """
 from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt, current_user
 from werkzeug.utils import secure_filename
+from collections import Counter
 from datetime import datetime
-import json
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import events
+from conditional import list_validators, not_modified, report_validators, with_validators
 from extensions import db
-from models import Report, User
+from filters import apply_report_filters
+from media import apply_derivatives
+from models import Report, ReportRelation, ReportTag
+from pagination import paginate, parse_limit
+from query_counter import query_budget
+from replicas import replica_reads
+from search import search_reports
+from sync import SyncTokenExpired, collect_changes
+import storage
 
 reports_bp = Blueprint('reports', __name__, url_prefix='/api/reports')
 
+
+def _apply_link_filters(query, args):
+    """Tag and "related to" filters, answered from the child-table indexes"""
+    if args.get('tag'):
+        query = query.filter(Report.id.in_(
+            db.session.query(ReportTag.report_id).filter(ReportTag.tag == args['tag'])
+        ))
+    if args.get('related_to'):
+        try:
+            related_to = int(args['related_to'])
+        except ValueError:
+            raise ValueError('related_to must be a report ID')
+        query = query.filter(Report.id.in_(
+            db.session.query(ReportRelation.report_id).filter(ReportRelation.related_report_id == related_to)
+        ))
+    return query
+
+
 @reports_bp.route('', methods=['GET'])
 @jwt_required()
+@query_budget(6)
+@replica_reads
 def get_reports():
     """Get reports - own reports for users, all for moderators/admins"""
     try:
         current_user_id_str = get_jwt_identity()
-        print(f"DEBUG get_reports: current_user_id = {current_user_id_str}")
+        current_app.logger.debug('Listing reports', extra={'user_id': current_user_id_str})
         if not current_user_id_str:
             return jsonify({'error': 'Invalid token: user ID not found'}), 422
         
         # Convert string ID to integer for database query
         current_user_id = int(current_user_id_str)
-        current_user = User.query.get(current_user_id)
         if not current_user:
             return jsonify({'error': 'User not found'}), 404
         
@@ -37,17 +66,114 @@ def get_reports():
         # Check if requesting all reports (moderator/admin only)
         show_all = request.args.get('all', 'false').lower() == 'true'
         
-        if show_all and role in ['moderator', 'admin']:
-            reports = Report.query.order_by(Report.created_at.desc()).all()
-        else:
+        try:
+            fields = Report.parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+        
+        query = Report.query
+        if not (show_all and role in ['moderator', 'admin']):
             # Users see only their own reports
-            reports = Report.query.filter_by(user_id=current_user_id).order_by(Report.created_at.desc()).all()
+            query = query.filter_by(user_id=current_user_id)
+        
+        try:
+            query = apply_report_filters(_apply_link_filters(query, request.args), request.args)
+            limit = parse_limit(request.args.get('limit'),
+                                current_app.config['DEFAULT_PAGE_SIZE'],
+                                current_app.config['MAX_PAGE_SIZE'])
+            
+            # Unchanged result set: answer 304 from one aggregate query
+            etag, last_modified = list_validators(query)
+            unchanged = not_modified(etag)
+            if unchanged:
+                return unchanged
+            
+            reports, next_cursor = paginate(query.options(*Report.eager_options(fields=fields)),
+                                            Report.created_at, Report.id,
+                                            cursor=request.args.get('cursor'), limit=limit)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
-        return jsonify([report.to_dict() for report in reports]), 200
+        return with_validators(jsonify({
+            'reports': [report.to_dict(fields=fields) for report in reports],
+            'next_cursor': next_cursor
+        }), etag, last_modified)
     except Exception as e:
         return jsonify({'error': f'Error fetching reports: {str(e)}'}), 500
 
 
+@reports_bp.route('/changes', methods=['GET'])
+@jwt_required()
+@query_budget(7)
+def get_report_changes():
+    """Reports created, updated or removed since ?since=<sync token> (same filters as GET /api/reports)"""
+    current_user_id = int(get_jwt_identity())
+    role = get_jwt().get('role', 'user')
+    show_all = request.args.get('all', 'false').lower() == 'true' and role in ['moderator', 'admin']
+    
+    scope = Report.query if show_all else Report.query.filter_by(user_id=current_user_id)
+    try:
+        fields = Report.parse_fields(request.args.get('fields'))
+        view = apply_report_filters(_apply_link_filters(scope, request.args), request.args)
+        limit = parse_limit(request.args.get('limit'),
+                            current_app.config['DEFAULT_PAGE_SIZE'],
+                            current_app.config['MAX_PAGE_SIZE'])
+        reports, removed, sync_token, has_more = collect_changes(
+            scope, view, request.args.get('since'), limit,
+            user_id=None if show_all else current_user_id,
+            options=Report.eager_options(fields=fields)
+        )
+    except SyncTokenExpired as e:
+        return jsonify({'error': str(e)}), 410
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'reports': [report.to_dict(fields=fields) for report in reports],
+        'removed': removed,
+        'sync_token': sync_token,
+        'has_more': has_more
+    }), 200
+
+
+@reports_bp.route('/search', methods=['GET'])
+@jwt_required()
+@query_budget(6)
+@replica_reads
+def search():
+    """Full-text search over reports (own reports for users, all for moderators/admins)"""
+    q = request.args.get('q', '').strip()
+    if not q:
+        return jsonify({'error': 'Search query (q) is required'}), 400
+    
+    current_user_id = int(get_jwt_identity())
+    role = get_jwt().get('role', 'user')
+    
+    try:
+        fields = Report.parse_fields(request.args.get('fields'))
+        limit = parse_limit(request.args.get('limit'),
+                            current_app.config['DEFAULT_PAGE_SIZE'],
+                            current_app.config['MAX_PAGE_SIZE'])
+        offset = int(request.args.get('offset', 0))
+        if offset < 0:
+            raise ValueError('offset must not be negative')
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    reports, has_more = search_reports(
+        q,
+        user_id=None if role in ['moderator', 'admin'] else current_user_id,
+        limit=limit,
+        offset=offset,
+        fields=fields
+    )
+    
+    return jsonify({
+        'reports': [report.to_dict(fields=fields) for report in reports],
+        'next_offset': offset + limit if has_more else None
+    }), 200
+
+
 @reports_bp.route('', methods=['POST'])
 @jwt_required()
 def create_report():
@@ -74,32 +200,32 @@ def create_report():
         description=data['description'].strip(),
         category=data['category'].strip(),
         subcategory=data.get('subcategory', '').strip() if data.get('subcategory') else None,
-        tags=json.dumps(data.get('tags', [])) if data.get('tags') else None,
         location=data.get('location', '').strip() if data.get('location') else None,
         incident_date=incident_date,
         severity=data.get('severity', 'medium'),
         urgency=data.get('urgency', 'normal'),
         evidence=data.get('evidence', ''),
-        file_attachments=json.dumps(data.get('file_attachments', [])) if data.get('file_attachments') else None,
         contact_phone=data.get('contact_phone', '').strip() if data.get('contact_phone') else None,
         preferred_contact_method=data.get('preferred_contact_method', 'email'),
         follow_up_requested=bool(data.get('follow_up_requested', False)),
         witnesses=data.get('witnesses', '').strip() if data.get('witnesses') else None,
         perpetrator_info=data.get('perpetrator_info', '').strip() if data.get('perpetrator_info') else None,
         anonymous_report=bool(data.get('anonymous_report', False)),
-        related_report_ids=json.dumps(data.get('related_report_ids', [])) if data.get('related_report_ids') else None,
         status='pending'
     )
+    report.set_tags(data.get('tags'))
+    report.set_attachments(data.get('file_attachments'))
+    apply_derivatives(report.attachments)
+    report.set_related_report_ids(data.get('related_report_ids'))
     
     try:
         db.session.add(report)
         db.session.flush()  # Flush to get the ID
         # Generate report number after ID is assigned
         if not report.report_number:
-            date_str = datetime.utcnow().strftime('%Y%m%d')
-            id_suffix = f"{report.id:04d}"
-            report.report_number = f"REP-{date_str}-{id_suffix}"
+            report.report_number = report.generate_report_number()
         db.session.commit()
+        events.publish('report.created', events.report_event(report))
         return jsonify({
             'message': 'Report created successfully',
             'report': report.to_dict()
@@ -114,7 +240,6 @@ def create_report():
 def get_report(report_id):
     """Get a specific report (authorize view) with notes for users"""
     current_user_id = int(get_jwt_identity())
-    current_user = User.query.get(current_user_id)
     claims = get_jwt()
     role = claims.get('role', 'user')
     
@@ -124,9 +249,20 @@ def get_report(report_id):
     if report.user_id != current_user_id and role not in ['moderator', 'admin']:
         return jsonify({'error': 'Unauthorized to view this report'}), 403
     
+    try:
+        fields = Report.parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    etag, last_modified = report_validators(report)
+    unchanged = not_modified(etag, last_modified)
+    if unchanged:
+        return unchanged
+    
     # Include notes for users to see moderator feedback
     include_notes = report.user_id == current_user_id or role in ['moderator', 'admin']
-    return jsonify(report.to_dict(include_notes=include_notes)), 200
+    include_notes = include_notes and (fields is None or 'notes' in fields)
+    return with_validators(jsonify(report.to_dict(include_notes=include_notes, fields=fields)), etag, last_modified)
 
 
 @reports_bp.route('/<int:report_id>', methods=['PUT'])
@@ -134,7 +270,6 @@ def get_report(report_id):
 def update_report(report_id):
     """Update report (owner can update limited fields, moderator/admin can update status and resolution notes)"""
     current_user_id = int(get_jwt_identity())
-    current_user = User.query.get(current_user_id)
     claims = get_jwt()
     role = claims.get('role', 'user')
     
@@ -145,6 +280,8 @@ def update_report(report_id):
     if report.user_id != current_user_id and role not in ['moderator', 'admin']:
         return jsonify({'error': 'Unauthorized to update this report'}), 403
     
+    previous_status = report.status
+    
     # Update fields based on role
     if report.user_id == current_user_id:
         # Users can update their own report's editable fields
@@ -157,7 +294,7 @@ def update_report(report_id):
         if 'subcategory' in data:
             report.subcategory = data['subcategory'].strip() if data['subcategory'] else None
         if 'tags' in data:
-            report.tags = json.dumps(data['tags']) if data['tags'] else None
+            report.set_tags(data['tags'])
         if 'location' in data:
             report.location = data['location'].strip() if data.get('location') else None
         if 'incident_date' in data:
@@ -175,7 +312,14 @@ def update_report(report_id):
         if 'evidence' in data:
             report.evidence = data['evidence']
         if 'file_attachments' in data:
-            report.file_attachments = json.dumps(data['file_attachments']) if data['file_attachments'] else None
+            previous = Counter(storage.sha256_from_url(a.url) for a in report.attachments)
+            report.set_attachments(data['file_attachments'])
+            apply_derivatives(report.attachments)
+            # Blobs no longer attached give up a reference (and are deleted once unused)
+            previous -= Counter(storage.sha256_from_url(a.url) for a in report.attachments)
+            for sha256 in previous.elements():
+                if sha256:
+                    storage.release(sha256)
         if 'contact_phone' in data:
             report.contact_phone = data['contact_phone'].strip() if data.get('contact_phone') else None
         if 'preferred_contact_method' in data:
@@ -187,7 +331,7 @@ def update_report(report_id):
         if 'perpetrator_info' in data:
             report.perpetrator_info = data['perpetrator_info'].strip() if data.get('perpetrator_info') else None
         if 'related_report_ids' in data:
-            report.related_report_ids = json.dumps(data['related_report_ids']) if data['related_report_ids'] else None
+            report.set_related_report_ids(data['related_report_ids'])
     else:
         # Moderators/admins can update status and resolution notes
         if 'status' in data and data['status'] in ['pending', 'in_review', 'resolved', 'rejected']:
@@ -195,8 +339,16 @@ def update_report(report_id):
         if 'resolution_notes' in data:
             report.resolution_notes = data['resolution_notes'].strip() if data.get('resolution_notes') else None
     
+    status_changed = report.status != previous_status
+    
+    # Tag/attachment/relation edits only touch child tables, so bump the row explicitly
+    # to keep ETags and Last-Modified honest
+    report.updated_at = datetime.utcnow()
+    
     try:
         db.session.commit()
+        if status_changed:
+            events.publish('report.status_changed', {**events.report_event(report), 'previous_status': previous_status})
         return jsonify({
             'message': 'Report updated successfully',
             'report': report.to_dict()
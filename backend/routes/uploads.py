@@ -1,23 +1,173 @@
 """
 File upload routes
-Handles file uploads for report evidence
+Handles file uploads for report evidence, including resumable chunked uploads
 """
-from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required
+from flask import Blueprint, Response, abort, request, jsonify, current_app, send_file
+from flask_jwt_extended import jwt_required, get_jwt, get_jwt_identity, verify_jwt_in_request
+from itsdangerous import BadSignature, URLSafeTimedSerializer
+from sqlalchemy import or_
+from werkzeug.security import safe_join
 from werkzeug.utils import secure_filename
+import mimetypes
 import os
+import re
+import secrets
 import sys
-from datetime import datetime
+from datetime import datetime, timedelta
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from config import Config
+from extensions import db
+from models import MediaJob, Report, ReportAttachment, UploadSession
+import ingest
+import media
+import storage
 
 uploads_bp = Blueprint('uploads', __name__, url_prefix='/api/uploads')
 
+# Bytes copied from the request stream to disk per read
+STREAM_BUFFER_SIZE = 64 * 1024
+
+CONTENT_RANGE_RE = re.compile(r'^bytes (\d+)-(\d+)/(\d+)$')
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in Config.ALLOWED_EXTENSIONS
 
+def content_type_for(filename):
+    """Type of an upload, from its (allowlisted) extension; the client's Content-Type is never trusted"""
+    ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+    if ext not in Config.ALLOWED_EXTENSIONS:
+        return 'application/octet-stream'
+    return mimetypes.guess_type(f'file.{ext}')[0] or 'application/octet-stream'
+
+def _serve_type(content_type):
+    """(mimetype, inline) for a stored file; anything but an allowed upload or thumbnail type is served as a download"""
+    safe_types = {content_type_for(f'file.{ext}') for ext in Config.ALLOWED_EXTENSIONS} | media.DERIVATIVE_TYPES
+    if content_type not in safe_types:
+        return 'application/octet-stream', False
+    return content_type, content_type.startswith(('image/', 'video/'))
+
+def _harden(response, filename, inline):
+    """Stop browsers sniffing uploads into HTML/script, and download non-media files"""
+    response.headers['X-Content-Type-Options'] = 'nosniff'
+    response.headers.set('Content-Disposition', 'inline' if inline else 'attachment', filename=filename)
+    return response
+
+def _partial_path(upload_id):
+    """Temp file that chunks of an upload session are written into"""
+    folder = os.path.join(storage.upload_root(), '.partial')
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, f'{upload_id}.part')
+
+def _too_large_error():
+    max_size = current_app.config['MAX_FILE_SIZE']
+    return jsonify({
+        'error': f'File too large. Maximum size: {max_size / (1024 * 1024):.1f}MB'
+    }), 400
+
+def _file_metadata(original_filename, stored, content_type):
+    """Metadata shape stored in a report's file_attachments"""
+    return {
+        'name': original_filename,
+        'type': content_type or 'application/octet-stream',
+        'url': f'/uploads/{storage.public_name(stored.sha256, original_filename)}',
+        'size': stored.size,
+        'sha256': stored.sha256,
+        'uploaded_at': datetime.utcnow().isoformat()
+    }
+
+def _link_serializer():
+    # Own salt: a file link opens that one file and nothing else
+    return URLSafeTimedSerializer(current_app.config['SECRET_KEY'], salt='upload-link')
+
+def signed_url(filename):
+    """/uploads/<filename> with a ?token= that opens it without an Authorization header for UPLOAD_LINK_SECONDS"""
+    return f'/uploads/{filename}?token={_link_serializer().dumps(filename)}'
+
+def _link_allows(filename):
+    token = request.args.get('token')
+    if not token:
+        return False
+    try:
+        return _link_serializer().loads(token, max_age=current_app.config['UPLOAD_LINK_SECONDS']) == filename
+    except BadSignature:  # Includes SignatureExpired
+        return False
+
+def can_read_upload(filename, user_id, role):
+    """Moderators and admins read every upload; users only files (and their thumbnails) attached to their own reports"""
+    if role in ('moderator', 'admin'):
+        return True
+    sha256 = storage.sha256_from_url(filename)
+    if sha256 is None:
+        attached = ReportAttachment.url.endswith(f'/uploads/{filename}', autoescape=True)
+    else:
+        # A thumbnail or poster is readable wherever the upload it was rendered from is
+        sources = [sha256] + [job.sha256 for job in
+                              MediaJob.query.filter(MediaJob.derivatives.contains(f'/{sha256}.'))]
+        attached = or_(*[ReportAttachment.url.contains(f'/{source}.') for source in sources])
+    return db.session.query(ReportAttachment.id).join(Report) \
+        .filter(Report.user_id == user_id, attached).first() is not None
+
+def _offload(relative_path, mimetype, etag, max_age, immutable):
+    """Hand the transfer to the front proxy: headers only, no body"""
+    mode = current_app.config['UPLOAD_SERVE_MODE']
+    response = Response(status=200, mimetype=mimetype or 'application/octet-stream')
+    if mode == 'x-accel':
+        response.headers['X-Accel-Redirect'] = current_app.config['UPLOAD_ACCEL_PREFIX'].rstrip('/') + '/' + relative_path
+    else:
+        response.headers['X-Sendfile'] = os.path.join(storage.upload_root(), relative_path)
+    response.set_etag(etag)
+    # Evidence is private: browsers may keep it, shared caches and CDNs must not
+    response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    response.cache_control.immutable = immutable or None
+    return response
+
+def send_upload(filename):
+    """
+    Serve /uploads/<filename> to the owner of a report it is attached to, or
+    to a moderator/admin (JWT in the Authorization header), or to anyone with
+    a ?token= link from signed_url(). Content-addressed files get their
+    SHA-256 as a strong ETag and a private, immutable Cache-Control; legacy
+    flat files get an mtime/size ETag and must be revalidated. If-None-Match
+    yields 304 and Range requests yield 206 in every mode.
+    """
+    if not _link_allows(filename):
+        verify_jwt_in_request()
+        if not can_read_upload(filename, int(get_jwt_identity()), get_jwt().get('role', 'user')):
+            return jsonify({'error': 'Access denied'}), 403
+    
+    stored = storage.resolve(filename)
+    if stored:
+        path, blob = stored
+        relative_path = os.path.relpath(path, storage.upload_root())
+        mimetype, inline = _serve_type(blob.content_type)
+        etag, max_age, immutable = blob.sha256, current_app.config['UPLOAD_CACHE_MAX_AGE'], True
+    else:
+        path = safe_join(storage.upload_root(), filename)
+        if path is None or not os.path.isfile(path):
+            abort(404)
+        relative_path = filename
+        mimetype, inline = _serve_type(content_type_for(filename))
+        stat = os.stat(path)
+        etag, max_age, immutable = f'{int(stat.st_mtime)}-{stat.st_size}', 0, False
+    
+    if current_app.config['UPLOAD_SERVE_MODE'] in ('x-accel', 'x-sendfile'):
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+            response.set_etag(etag)
+            return _harden(response, filename, inline)
+        return _harden(_offload(relative_path, mimetype, etag, max_age, immutable), filename, inline)
+    
+    response = send_file(path, mimetype=mimetype, download_name=filename, as_attachment=not inline,
+                         conditional=True, etag=etag, max_age=max_age)
+    # send_file marks anything with a max_age public; evidence is private
+    response.cache_control.public = False
+    response.cache_control.private = True
+    response.cache_control.immutable = immutable or None
+    return _harden(response, filename, inline)
+
 @uploads_bp.route('', methods=['POST'])
 @jwt_required()
 def upload_file():
@@ -40,37 +190,255 @@ def upload_file():
     file_size = file.tell()
     file.seek(0)
     
-    if file_size > Config.MAX_FILE_SIZE:
-        return jsonify({
-            'error': f'File too large. Maximum size: {Config.MAX_FILE_SIZE / (1024 * 1024):.1f}MB'
-        }), 400
+    if file_size > current_app.config['MAX_FILE_SIZE']:
+        return _too_large_error()
     
     try:
-        # Create upload directory if it doesn't exist
-        upload_folder = os.path.join(os.path.dirname(os.path.dirname(__file__)), Config.UPLOAD_FOLDER)
-        os.makedirs(upload_folder, exist_ok=True)
-        
         # Generate secure filename
-        timestamp = datetime.utcnow().strftime('%Y%m%d_%H%M%S')
         original_filename = secure_filename(file.filename)
-        filename = f"{timestamp}_{original_filename}"
-        filepath = os.path.join(upload_folder, filename)
+        content_type = content_type_for(original_filename)
         
-        # Save file
-        file.save(filepath)
+        # Save file, hashing it as it is written; identical content is stored once.
+        # Photos are re-encoded first so their EXIF/GPS metadata is never stored
+        if ingest.applies_to(original_filename, content_type):
+            stored = ingest.save_image_stream(file.stream, content_type)
+        else:
+            stored = storage.save_stream(file.stream, content_type)
+        media.enqueue(stored, content_type)
+        db.session.commit()
+        # Thumbnails are rendered in the background; the response doesn't wait
+        media.dispatch()
         
-        # Return file metadata
+        # Return file metadata, and a link the uploader can preview it with before it is attached
+        metadata = _file_metadata(original_filename, stored, content_type)
         return jsonify({
             'message': 'File uploaded successfully',
-            'file': {
-                'name': original_filename,
-                'type': file.content_type or 'application/octet-stream',
-                'url': f'/uploads/{filename}',
-                'size': file_size,
-                'uploaded_at': datetime.utcnow().isoformat()
-            }
+            'file': metadata,
+            'preview_url': signed_url(metadata['url'].rsplit('/', 1)[-1])
         }), 201
     
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'Failed to upload file: {str(e)}'}), 500
 
+
+@uploads_bp.route('/files/<filename>/token', methods=['POST'])
+@jwt_required()
+def file_link(filename):
+    """Short-lived link to an upload the caller may read, for <img>/<a> tags that can't send headers"""
+    if not can_read_upload(filename, int(get_jwt_identity()), get_jwt().get('role', 'user')):
+        return jsonify({'error': 'Access denied'}), 403
+    return jsonify({
+        'url': signed_url(filename),
+        'expires_in': current_app.config['UPLOAD_LINK_SECONDS']
+    }), 200
+
+
+def _get_session(upload_id):
+    """Load an upload session owned by the current user, or None"""
+    session = db.session.get(UploadSession, upload_id)
+    if session is None or session.user_id != int(get_jwt_identity()):
+        return None
+    return session
+
+def _purge_expired_sessions():
+    """Drop abandoned upload sessions and their temp files"""
+    cutoff = datetime.utcnow() - timedelta(seconds=current_app.config['UPLOAD_SESSION_TTL'])
+    expired = UploadSession.query.filter(UploadSession.updated_at < cutoff).all()
+    for session in expired:
+        if os.path.exists(_partial_path(session.id)):
+            os.remove(_partial_path(session.id))
+        db.session.delete(session)
+
+@uploads_bp.route('/sessions', methods=['POST'])
+@jwt_required()
+def create_upload_session():
+    """Start a resumable upload: declare filename, size and type up front"""
+    data = request.get_json(silent=True) or {}
+    
+    if not data.get('filename'):
+        return jsonify({'error': 'filename is required'}), 400
+    
+    if not allowed_file(data['filename']):
+        return jsonify({
+            'error': f'File type not allowed. Allowed types: {", ".join(Config.ALLOWED_EXTENSIONS)}'
+        }), 400
+    
+    try:
+        size = int(data.get('size'))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'size (in bytes) is required'}), 400
+    if size <= 0:
+        return jsonify({'error': 'size must be positive'}), 400
+    
+    # Reject oversized files before a single byte is transferred
+    if size > current_app.config['MAX_FILE_SIZE']:
+        return _too_large_error()
+    
+    filename = secure_filename(data['filename'])
+    session = UploadSession(
+        id=secrets.token_hex(16),
+        user_id=int(get_jwt_identity()),
+        filename=filename,
+        content_type=content_type_for(filename),
+        total_size=size
+    )
+    
+    try:
+        _purge_expired_sessions()
+        open(_partial_path(session.id), 'wb').close()
+        db.session.add(session)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Failed to start upload: {str(e)}'}), 500
+    
+    result = session.to_dict()
+    result['chunk_size'] = current_app.config['UPLOAD_CHUNK_SIZE']
+    return jsonify(result), 201
+
+
+@uploads_bp.route('/sessions/<upload_id>', methods=['GET'])
+@jwt_required()
+def get_upload_session(upload_id):
+    """Report how many bytes were received, so a client can resume after a disconnect"""
+    session = _get_session(upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload session not found'}), 404
+    return jsonify(session.to_dict()), 200
+
+
+@uploads_bp.route('/sessions/<upload_id>', methods=['PUT'])
+@jwt_required()
+def upload_chunk(upload_id):
+    """
+    Store one chunk. The body is the raw bytes and the Content-Range header
+    (bytes start-end/total) says where they go. Chunks must be contiguous:
+    start has to equal the current offset (re-sending the last chunk is fine).
+    """
+    session = _get_session(upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload session not found'}), 404
+    
+    match = CONTENT_RANGE_RE.match(request.headers.get('Content-Range', ''))
+    if not match:
+        return jsonify({'error': 'Content-Range header required: bytes start-end/total'}), 400
+    start, end, total = (int(g) for g in match.groups())
+    length = end - start + 1
+    
+    if total != session.total_size or end < start or end >= total:
+        return jsonify({'error': 'Content-Range does not match the upload size'}), 416
+    if length > current_app.config['UPLOAD_CHUNK_SIZE']:
+        return jsonify({'error': f'Chunk too large. Maximum: {current_app.config["UPLOAD_CHUNK_SIZE"]} bytes'}), 413
+    if request.content_length is not None and request.content_length != length:
+        return jsonify({'error': 'Content-Length does not match Content-Range'}), 400
+    if start > session.received_bytes:
+        # A gap would corrupt the file; tell the client where to resume from
+        return jsonify({'error': 'Chunk out of order', **session.to_dict()}), 409
+    
+    # Stream the body straight to its position in the temp file
+    written = 0
+    try:
+        with open(_partial_path(upload_id), 'r+b') as part:
+            part.seek(start)
+            while written < length:
+                buffer = request.stream.read(min(STREAM_BUFFER_SIZE, length - written))
+                if not buffer:
+                    break
+                part.write(buffer)
+                written += len(buffer)
+    except FileNotFoundError:
+        return jsonify({'error': 'Upload session not found'}), 404
+    
+    if written < length:
+        # Connection dropped mid-chunk; the bytes that did arrive are kept
+        # on disk but only complete chunks advance the offset
+        return jsonify({'error': 'Incomplete chunk', **session.to_dict()}), 400
+    
+    # Advance the offset only if no concurrent request already moved it
+    new_offset = max(session.received_bytes, end + 1)
+    updated = UploadSession.query.filter_by(id=upload_id, received_bytes=session.received_bytes).update({
+        'received_bytes': new_offset,
+        'updated_at': datetime.utcnow()
+    })
+    db.session.commit()
+    db.session.refresh(session)
+    
+    return jsonify(session.to_dict()), 200 if updated else 409
+
+
+@uploads_bp.route('/sessions/<upload_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_upload_session(upload_id):
+    """Finalize a fully received upload and return the file metadata"""
+    session = _get_session(upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload session not found'}), 404
+    
+    part_path = _partial_path(upload_id)
+    if session.received_bytes < session.total_size:
+        return jsonify({'error': 'Upload is incomplete', **session.to_dict()}), 409
+    
+    # Claim the received bytes with an atomic rename, so only one of several
+    # concurrent completes goes on to store them
+    claimed_path = f'{part_path}.{secrets.token_hex(8)}.finalizing'
+    try:
+        os.replace(part_path, claimed_path)
+    except FileNotFoundError:
+        return jsonify({'error': 'Upload is already being finalized'}), 409
+    if os.path.getsize(claimed_path) < session.total_size:
+        os.replace(claimed_path, part_path)
+        return jsonify({'error': 'Upload is incomplete', **session.to_dict()}), 409
+    part_path = claimed_path
+    
+    try:
+        if ingest.applies_to(session.filename, session.content_type):
+            stored = ingest.save_image(part_path, session.content_type)
+        else:
+            stored = storage.save_file(part_path, session.content_type)
+        metadata = _file_metadata(session.filename, stored, session.content_type)
+        media.enqueue(stored, session.content_type)
+        db.session.delete(session)
+        db.session.commit()
+        media.dispatch()
+        
+        return jsonify({
+            'message': 'File uploaded successfully',
+            'file': metadata,
+            'preview_url': signed_url(metadata['url'].rsplit('/', 1)[-1])
+        }), 201
+    
+    except ValueError as e:
+        db.session.rollback()
+        _unclaim(part_path, upload_id)
+        return jsonify({'error': str(e)}), 400
+    
+    except Exception as e:
+        db.session.rollback()
+        _unclaim(part_path, upload_id)
+        return jsonify({'error': f'Failed to finalize upload: {str(e)}'}), 500
+
+
+def _unclaim(claimed_path, upload_id):
+    """Put claimed bytes back after a failed complete, so the client can retry"""
+    if os.path.exists(claimed_path):
+        os.replace(claimed_path, _partial_path(upload_id))
+
+
+@uploads_bp.route('/sessions/<upload_id>', methods=['DELETE'])
+@jwt_required()
+def cancel_upload_session(upload_id):
+    """Abandon an upload and discard the received bytes"""
+    session = _get_session(upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload session not found'}), 404
+    
+    if os.path.exists(_partial_path(upload_id)):
+        os.remove(_partial_path(upload_id))
+    db.session.delete(session)
+    db.session.commit()
+    return jsonify({'message': 'Upload cancelled'}), 200
@@ -0,0 +1,125 @@
+"""
+Full-text search over reports
+Uses an SQLite FTS5 index (or a Postgres tsvector GIN index) kept in sync by
+database triggers, ranked by BM25 / ts_rank
+"""
+import re
+from sqlalchemy import text
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from extensions import db
+from models import Report
+
+SEARCH_COLUMNS = ['title', 'description', 'location', 'witnesses', 'perpetrator_info']
+
+# BM25 column weights, in SEARCH_COLUMNS order: title matches count most
+BM25_WEIGHTS = '10.0, 1.0, 2.0, 1.0, 1.0'
+
+_SQLITE_SETUP = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS reports_fts USING fts5(
+        {', '.join(SEARCH_COLUMNS)},
+        content='reports', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS reports_fts_ai AFTER INSERT ON reports BEGIN
+        INSERT INTO reports_fts(rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES (new.id, {', '.join('new.' + c for c in SEARCH_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS reports_fts_ad AFTER DELETE ON reports BEGIN
+        INSERT INTO reports_fts(reports_fts, rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES ('delete', old.id, {', '.join('old.' + c for c in SEARCH_COLUMNS)});
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS reports_fts_au AFTER UPDATE OF {', '.join(SEARCH_COLUMNS)} ON reports BEGIN
+        INSERT INTO reports_fts(reports_fts, rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES ('delete', old.id, {', '.join('old.' + c for c in SEARCH_COLUMNS)});
+        INSERT INTO reports_fts(rowid, {', '.join(SEARCH_COLUMNS)})
+        VALUES (new.id, {', '.join('new.' + c for c in SEARCH_COLUMNS)});
+    END""",
+]
+
+_PG_DOCUMENT = "to_tsvector('english', " + " || ' ' || ".join(f"coalesce({c}, '')" for c in SEARCH_COLUMNS) + ")"
+
+_PG_SETUP = [
+    f"CREATE INDEX IF NOT EXISTS ix_reports_search ON reports USING GIN ({_PG_DOCUMENT})",
+]
+
+
+def _dialect():
+    return db.engine.dialect.name
+
+
+def create_search_index():
+    """Create the search index and its sync triggers, backfilling existing rows"""
+    dialect = _dialect()
+    with db.engine.begin() as conn:
+        if dialect == 'sqlite':
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'reports_fts'"
+            )).first()
+            for statement in _SQLITE_SETUP:
+                conn.execute(text(statement))
+            if not exists:
+                conn.execute(text("INSERT INTO reports_fts(reports_fts) VALUES ('rebuild')"))
+        elif dialect == 'postgresql':
+            # The expression index is maintained by Postgres itself on every write
+            for statement in _PG_SETUP:
+                conn.execute(text(statement))
+
+
+def _fts5_query(q):
+    """Turn free text into a safe FTS5 query: every word must match, last word as a prefix"""
+    words = re.findall(r'\w+', q, flags=re.UNICODE)
+    if not words:
+        return None
+    terms = [f'"{word}"' for word in words]
+    terms[-1] += '*'
+    return ' '.join(terms)
+
+
+def search_reports(q, user_id=None, limit=20, offset=0, fields=None):
+    """
+    Return (reports, has_more) matching q, best match first.
+    Pass user_id to restrict results to one reporter's own reports, and
+    fields to load only what a Report.to_dict() projection needs.
+    """
+    params = {'limit': limit + 1, 'offset': offset}
+    owner_filter = ''
+    if user_id is not None:
+        owner_filter = 'AND r.user_id = :user_id'
+        params['user_id'] = user_id
+
+    if _dialect() == 'postgresql':
+        params['q'] = q
+        sql = f"""
+            SELECT r.id FROM reports r
+            WHERE {_PG_DOCUMENT} @@ websearch_to_tsquery('english', :q) {owner_filter}
+            ORDER BY ts_rank_cd({_PG_DOCUMENT}, websearch_to_tsquery('english', :q)) DESC, r.id DESC
+            LIMIT :limit OFFSET :offset
+        """
+    else:
+        params['q'] = _fts5_query(q)
+        if params['q'] is None:
+            return [], False
+        sql = f"""
+            SELECT r.id FROM reports_fts
+            JOIN reports r ON r.id = reports_fts.rowid
+            WHERE reports_fts MATCH :q {owner_filter}
+            ORDER BY bm25(reports_fts, {BM25_WEIGHTS}), r.id DESC
+            LIMIT :limit OFFSET :offset
+        """
+
+    ids = [row[0] for row in db.session.execute(text(sql), params)]
+    has_more = len(ids) > limit
+    ids = ids[:limit]
+    if not ids:
+        return [], False
+
+    # Load the page in one query and restore rank order
+    by_id = {r.id: r for r in Report.query.options(*Report.eager_options(fields=fields)).filter(Report.id.in_(ids))}
+    return [by_id[i] for i in ids if i in by_id], has_more
+
+
+def init_app(app):
+    """Create the search index for the configured database"""
+    with app.app_context():
+        create_search_index()
@@ -128,6 +128,16 @@ if [ -f "migrate_reports.py" ]; then
     python3 migrate_reports.py || {
         echo -e "${YELLOW}Migration script encountered issues (this may be normal if tables are already up to date)${NC}"
     }
+    if [ -f "migrate_report_indexes.py" ]; then
+        python3 migrate_report_indexes.py || {
+            echo -e "${YELLOW}Index migration encountered issues${NC}"
+        }
+    fi
+    if [ -f "migrate_report_children.py" ]; then
+        python3 migrate_report_children.py || {
+            echo -e "${YELLOW}Report child-table migration encountered issues${NC}"
+        }
+    fi
     echo -e "${GREEN}✓ Migrations completed${NC}"
 else
     echo -e "${YELLOW}Migration script not found. Skipping.${NC}"
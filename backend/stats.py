@@ -0,0 +1,155 @@
+"""
+Dashboard statistics
+Aggregated report/user counts, plus an optional counter cache that is kept
+up to date inside the same transaction as the rows it counts
+"""
+import click
+from flask import current_app
+from sqlalchemy import event, func, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from extensions import db
+from filters import REPORT_STATUSES
+from models import Report, User, StatCounter
+
+USER_ROLES = ['user', 'moderator', 'admin']
+
+
+def _shape(total_reports, by_status, total_users, by_role):
+    """Build the /api/admin/stats payload; missing buckets count as zero"""
+    return {
+        'total_reports': total_reports,
+        'reports_by_status': {status: by_status.get(status, 0) for status in REPORT_STATUSES},
+        'total_users': total_users,
+        'users_by_role': {role: by_role.get(role, 0) for role in USER_ROLES}
+    }
+
+
+def collect_stats():
+    """Compute stats with one GROUP BY query per table"""
+    by_status = dict(db.session.query(Report.status, func.count(Report.id)).group_by(Report.status).all())
+    by_role = dict(db.session.query(User.role, func.count(User.id)).group_by(User.role).all())
+    return _shape(sum(by_status.values()), by_status, sum(by_role.values()), by_role)
+
+
+def read_counter_stats():
+    """Read stats from the counter table in a single primary-key scan"""
+    counters = dict(db.session.query(StatCounter.name, StatCounter.value).all())
+    by_status = {status: counters.get(f'reports.status.{status}', 0) for status in REPORT_STATUSES}
+    by_role = {role: counters.get(f'users.role.{role}', 0) for role in USER_ROLES}
+    return _shape(counters.get('reports', 0), by_status, counters.get('users', 0), by_role)
+
+
+def get_stats():
+    """Return dashboard stats from the counter cache if enabled, else aggregate"""
+    if current_app.config.get('STATS_COUNTERS_ENABLED'):
+        return read_counter_stats()
+    return collect_stats()
+
+
+def rebuild_counters():
+    """Recompute every counter from the source tables (consistency repair)"""
+    stats = collect_stats()
+    values = {'reports': stats['total_reports'], 'users': stats['total_users']}
+    values.update({f'reports.status.{k}': v for k, v in stats['reports_by_status'].items()})
+    values.update({f'users.role.{k}': v for k, v in stats['users_by_role'].items()})
+
+    StatCounter.query.delete()
+    db.session.add_all([StatCounter(name=name, value=value) for name, value in values.items()])
+    db.session.commit()
+    return values
+
+
+def _attribute_change(obj, attr):
+    """Return (old, new) for an attribute changed on a persistent object, else None"""
+    history = inspect(obj).attrs[attr].history
+    if not history.has_changes():
+        return None
+    old = history.deleted[0] if history.deleted else None
+    new = history.added[0] if history.added else None
+    return (old, new) if old != new else None
+
+
+def _counter_deltas(session):
+    """Work out counter increments for the pending inserts, updates and deletes"""
+    deltas = {}
+
+    def bump(name, amount):
+        deltas[name] = deltas.get(name, 0) + amount
+
+    for obj, sign in [(o, 1) for o in session.new] + [(o, -1) for o in session.deleted]:
+        if isinstance(obj, Report):
+            bump('reports', sign)
+            bump(f'reports.status.{obj.status or "pending"}', sign)
+        elif isinstance(obj, User):
+            bump('users', sign)
+            bump(f'users.role.{obj.role or "user"}', sign)
+
+    for obj in session.dirty:
+        if isinstance(obj, Report):
+            change = _attribute_change(obj, 'status')
+            prefix = 'reports.status'
+        elif isinstance(obj, User):
+            change = _attribute_change(obj, 'role')
+            prefix = 'users.role'
+        else:
+            continue
+        if change:
+            old, new = change
+            bump(f'{prefix}.{old}', -1)
+            bump(f'{prefix}.{new}', 1)
+
+    return {name: amount for name, amount in deltas.items() if amount}
+
+
+UPSERT_DIALECTS = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}
+
+
+def _increment(session, name, amount):
+    """
+    Atomically add amount to a counter, creating its row if it is missing (a
+    value the last rebuild never saw, or a table that was never seeded), so a
+    delta is never dropped. Run rebuild-counters to repair rows created this way
+    on a table that already had data.
+    """
+    table = StatCounter.__table__
+    insert = UPSERT_DIALECTS.get(session.get_bind(mapper=StatCounter).dialect.name)
+    if insert is not None:
+        statement = insert(table).values(name=name, value=amount)
+        session.execute(statement.on_conflict_do_update(
+            index_elements=[table.c.name], set_={'value': table.c.value + statement.excluded.value}
+        ))
+        return
+    updated = session.execute(table.update().where(table.c.name == name).values(value=table.c.value + amount))
+    if updated.rowcount == 0:
+        session.execute(table.insert().values(name=name, value=amount))
+
+
+def _update_counters(session, flush_context, instances):
+    """before_flush hook: apply counter deltas in the flushing transaction"""
+    if not current_app.config.get('STATS_COUNTERS_ENABLED'):
+        return
+    for name, amount in _counter_deltas(session).items():
+        # In-place increment, so concurrent writers never lose updates
+        _increment(session, name, amount)
+
+
+def init_app(app):
+    """Register the counter maintenance hook and the rebuild-counters command"""
+    if not event.contains(db.session, 'before_flush', _update_counters):
+        event.listen(db.session, 'before_flush', _update_counters)
+
+    @app.cli.command('rebuild-counters')
+    def rebuild_counters_command():
+        """Rebuild dashboard counters from the reports and users tables"""
+        values = rebuild_counters()
+        for name, value in sorted(values.items()):
+            click.echo(f'{name}: {value}')
+
+    if app.config.get('STATS_COUNTERS_ENABLED'):
+        with app.app_context():
+            # Seed the cache the first time counters are switched on
+            if not StatCounter.query.first():
+                rebuild_counters()
@@ -0,0 +1,211 @@
+"""
+Content-addressed upload storage
+Streams uploads through SHA-256 while writing them, stores each distinct
+content once under a sharded path (ab/cd/<sha256>) and reference-counts it.
+Uploads that never get attached to a report are swept after UPLOAD_ORPHAN_HOURS
+"""
+from datetime import datetime, timedelta
+import hashlib
+import os
+import secrets
+import sys
+from functools import lru_cache
+import click
+from flask import current_app
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from extensions import db
+from models import MediaJob, ReportAttachment, StoredFile
+
+# Bytes read and hashed per iteration
+BUFFER_SIZE = 64 * 1024
+
+
+@lru_cache(maxsize=None)
+def _ensure_root(folder):
+    root = os.path.join(os.path.dirname(os.path.abspath(__file__)), folder)
+    os.makedirs(root, exist_ok=True)
+    return root
+
+
+def upload_root():
+    """Absolute path of the upload directory (created once, then cached)"""
+    return _ensure_root(current_app.config['UPLOAD_FOLDER'])
+
+
+def blob_path(sha256):
+    """Sharded location of a blob: two levels of at most 256 directories each"""
+    return os.path.join(upload_root(), sha256[:2], sha256[2:4], sha256)
+
+
+def original_path(sha256):
+    """Where the untouched original of a re-encoded image is kept; never served by /uploads"""
+    return os.path.join(upload_root(), 'originals', sha256[:2], sha256[2:4], sha256)
+
+
+def keep_original(path, sha256):
+    """Move an original upload aside, keyed by the hash of the stored (re-encoded) copy"""
+    target = original_path(sha256)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(path, target)
+
+
+def public_name(sha256, original_filename):
+    """Filename used in /uploads/<filename> URLs: the hash plus the original extension"""
+    ext = os.path.splitext(original_filename)[1].lower()
+    return f'{sha256}{ext}'
+
+
+def new_temp_path():
+    """Fresh path in the upload temp folder (same filesystem as the blobs, so moves are renames)"""
+    folder = os.path.join(upload_root(), '.tmp')
+    os.makedirs(folder, exist_ok=True)
+    return os.path.join(folder, secrets.token_hex(16))
+
+
+def _hash_file(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for buffer in iter(lambda: f.read(BUFFER_SIZE), b''):
+            digest.update(buffer)
+    return digest.hexdigest()
+
+
+def _commit_blob(temp_path, sha256, size, content_type):
+    """Move a hashed temp file into place, or drop it if the content already exists"""
+    target = blob_path(sha256)
+    existing = db.session.get(StoredFile, sha256)
+    if existing is not None and os.path.exists(target):
+        os.remove(temp_path)
+        db.session.execute(
+            update(StoredFile).where(StoredFile.sha256 == sha256)
+            .values(ref_count=StoredFile.ref_count + 1, last_uploaded_at=datetime.utcnow())
+        )
+        db.session.refresh(existing)
+        return existing
+
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    # Atomic rename: concurrent writers of the same content leave identical bytes
+    os.replace(temp_path, target)
+    if existing is not None:
+        # Row survived but the blob went missing; the new copy restores it
+        existing.ref_count += 1
+        existing.last_uploaded_at = datetime.utcnow()
+        return existing
+
+    stored = StoredFile(sha256=sha256, size=size, content_type=content_type, ref_count=1)
+    try:
+        with db.session.begin_nested():
+            db.session.add(stored)
+    except IntegrityError:
+        # Another request stored the same content first
+        db.session.execute(
+            update(StoredFile).where(StoredFile.sha256 == sha256)
+            .values(ref_count=StoredFile.ref_count + 1, last_uploaded_at=datetime.utcnow())
+        )
+        stored = db.session.get(StoredFile, sha256)
+    return stored
+
+
+def save_stream(stream, content_type=None):
+    """Write a readable binary stream to storage, hashing it on the way; returns the StoredFile"""
+    temp_path = new_temp_path()
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(temp_path, 'wb') as out:
+            for buffer in iter(lambda: stream.read(BUFFER_SIZE), b''):
+                digest.update(buffer)
+                out.write(buffer)
+                size += len(buffer)
+        return _commit_blob(temp_path, digest.hexdigest(), size, content_type)
+    finally:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def save_file(path, content_type=None):
+    """Move an already-written file (e.g. a finished chunked upload) into storage"""
+    return _commit_blob(path, _hash_file(path), os.path.getsize(path), content_type)
+
+
+def resolve(filename):
+    """Map a /uploads/<filename> name to (path, StoredFile), or None if it isn't a stored blob"""
+    sha256 = os.path.splitext(filename)[0]
+    if len(sha256) != 64:
+        return None
+    stored = db.session.get(StoredFile, sha256)
+    if stored is None:
+        return None
+    return blob_path(sha256), stored
+
+
+def sha256_from_url(url):
+    """The blob hash in a /uploads/<sha256>.<ext> URL, or None for other URLs"""
+    sha256 = os.path.splitext((url or '').rsplit('/', 1)[-1])[0]
+    return sha256 if len(sha256) == 64 else None
+
+
+def release(sha256):
+    """
+    Drop one reference to a blob (an attachment to it was replaced or
+    removed). When no references remain and no attachment still points at it,
+    the blob, its kept original and its thumbnails/poster are deleted.
+    """
+    db.session.execute(
+        update(StoredFile).where(StoredFile.sha256 == sha256).values(ref_count=StoredFile.ref_count - 1)
+    )
+    stored = db.session.get(StoredFile, sha256, populate_existing=True)
+    if stored is None or stored.ref_count > 0:
+        return
+    # Attachment URLs are client-supplied, so another report may point at the same blob
+    if ReportAttachment.query.filter(ReportAttachment.url.like(f'%/{sha256}.%')).first() is not None:
+        return
+    _delete(stored)
+
+
+def _delete(stored):
+    """Remove a blob's row and files, its kept original, and its thumbnails/poster"""
+    sha256 = stored.sha256
+    db.session.delete(stored)
+    for path in (blob_path(sha256), original_path(sha256)):
+        if os.path.exists(path):
+            os.remove(path)
+    job = MediaJob.query.filter_by(sha256=sha256).first()
+    if job is not None:
+        for url in job.get_derivatives().values():
+            if sha256_from_url(url):
+                release(sha256_from_url(url))
+        db.session.delete(job)
+
+
+def sweep_unattached(hours):
+    """
+    Delete uploads that no report attaches and nobody has uploaded for hours
+    (abandoned forms, failed creates), with their originals and thumbnails.
+    Thumbnails and posters go only with the upload they were rendered from.
+    Returns the number of uploads deleted.
+    """
+    cutoff = datetime.utcnow() - timedelta(hours=hours)
+    attached = {sha256_from_url(url) for (url,) in db.session.query(ReportAttachment.url)}
+    derived = set()
+    for job in MediaJob.query.filter(MediaJob.derivatives.isnot(None)):
+        derived.update(sha256_from_url(url) for url in job.get_derivatives().values())
+    swept = 0
+    for stored in StoredFile.query.filter(StoredFile.last_uploaded_at < cutoff).all():
+        if stored.sha256 in attached or stored.sha256 in derived:
+            continue
+        _delete(stored)
+        swept += 1
+    db.session.commit()
+    return swept
+
+
+def init_app(app):
+    """Register the sweep-uploads command"""
+    @app.cli.command('sweep-uploads')
+    def sweep_uploads_command():
+        """Delete uploads left unattached for UPLOAD_ORPHAN_HOURS"""
+        count = sweep_unattached(app.config['UPLOAD_ORPHAN_HOURS'])
+        click.echo(f'Swept {count} unattached upload(s)')
@@ -0,0 +1,83 @@
+"""
+Structured logging
+Configures the app logger to write one JSON object per line (or plain text)
+at LOG_LEVEL, logs one access line per request, and samples routine
+debug/info records at LOG_SAMPLE_RATE so busy endpoints don't flood the log.
+Warnings and errors, 5xx responses and slow requests are always kept
+"""
+from datetime import datetime, timezone
+import json
+import logging
+import random
+import time
+from flask import g, request
+from flask.logging import default_handler
+
+# Attributes every LogRecord has; anything else was passed via extra={...}
+_RECORD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record, with extra={...} fields at the top level"""
+
+    def format(self, record):
+        entry = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        entry.update({k: v for k, v in vars(record).items() if k not in _RECORD_FIELDS})
+        if record.exc_info:
+            entry['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class SampleFilter(logging.Filter):
+    """Keep a random fraction of records below WARNING"""
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+def init_app(app):
+    """Install the handler on app.logger and log every request"""
+    handler = logging.StreamHandler()
+    if app.config['LOG_FORMAT'] == 'json':
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+    handler.addFilter(SampleFilter(app.config['LOG_SAMPLE_RATE']))
+    # Apps built by the same factory share one logger: replace rather than stack handlers
+    for existing in list(app.logger.handlers):
+        if existing is default_handler or getattr(existing, 'structured', False):
+            app.logger.removeHandler(existing)
+    handler.structured = True
+    app.logger.addHandler(handler)
+    app.logger.setLevel(app.config['LOG_LEVEL'].upper())
+    slow_ms = app.config['LOG_SLOW_REQUEST_MS']
+
+    @app.before_request
+    def start_request_log():
+        g.log_start = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        if 'log_start' not in g:
+            return response
+        duration_ms = round((time.perf_counter() - g.log_start) * 1000, 1)
+        slow = duration_ms >= slow_ms
+        level = logging.WARNING if response.status_code >= 500 or slow else logging.INFO
+        app.logger.log(level, 'request', extra={
+            'method': request.method,
+            'path': request.path,
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': duration_ms,
+            'slow': slow
+        })
+        return response
@@ -0,0 +1,125 @@
+"""
+Delta sync for report lists
+Clients keep an opaque sync token and ask only for what changed after it:
+reports created or updated since (walked in (updated_at, id) order on the
+updated_at indexes) and the IDs of reports that left their view, either
+because they were deleted (report_tombstones) or no longer match the filters
+"""
+import base64
+from datetime import datetime, timedelta
+import click
+from flask import current_app
+from sqlalchemy import and_, event, or_
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from extensions import db
+from models import Report, ReportTombstone
+
+EPOCH = datetime(1970, 1, 1)
+
+
+class SyncTokenExpired(Exception):
+    """The token predates the retained tombstones; the client must refetch everything"""
+
+
+def encode_token(timestamp, row_id, issued_at):
+    """Encode a change position, and when it was handed out, as an opaque token"""
+    raw = f"{timestamp.isoformat()}|{row_id}|{issued_at.isoformat()}".encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_token(token):
+    """Decode a token into ((timestamp, id), issued_at); raises ValueError if malformed"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8')
+        timestamp_str, id_str, issued_str = raw.split('|', 2)
+        return (datetime.fromisoformat(timestamp_str), int(id_str)), datetime.fromisoformat(issued_str)
+    except Exception:
+        raise ValueError('Invalid sync token')
+
+
+def _after(sort_column, id_column, key):
+    """Rows strictly after key in (sort_column, id_column) ascending order"""
+    timestamp, row_id = key
+    return or_(sort_column > timestamp, and_(sort_column == timestamp, id_column > row_id))
+
+
+def collect_changes(scope, view, token=None, limit=50, user_id=None, options=()):
+    """
+    Changes to a report list since token, oldest first.
+
+    scope is every report the client may see (used to find what changed);
+    view is scope with the list's filters applied (what the client displays).
+    Changed reports still in view are returned in full; changed reports that
+    fell out of the view and deleted reports (limited to user_id's when given)
+    are returned as removed IDs. Returns (reports, removed_ids, next_token,
+    has_more); while has_more is true the client should call again at once.
+    """
+    now = datetime.utcnow()
+    since = (EPOCH, 0)
+    if token:
+        since, issued_at = decode_token(token)
+        retention = timedelta(days=current_app.config['SYNC_TOMBSTONE_DAYS'])
+        if issued_at < now - retention:
+            raise SyncTokenExpired('Sync token expired; fetch the full list again')
+
+    # One bounded keyset scan per source, merged into a single ordered page
+    changed = scope.with_entities(Report.updated_at, Report.id) \
+        .filter(_after(Report.updated_at, Report.id, since)) \
+        .order_by(Report.updated_at, Report.id).limit(limit + 1).all()
+    tombstones = ReportTombstone.query.with_entities(ReportTombstone.deleted_at, ReportTombstone.report_id) \
+        .filter(_after(ReportTombstone.deleted_at, ReportTombstone.report_id, since))
+    if user_id is not None:
+        tombstones = tombstones.filter(ReportTombstone.user_id == user_id)
+    tombstones = tombstones.order_by(ReportTombstone.deleted_at, ReportTombstone.report_id).limit(limit + 1).all()
+
+    events = sorted([(ts, row_id, False) for ts, row_id in changed] +
+                    [(ts, row_id, True) for ts, row_id in tombstones])
+    has_more = len(events) > limit
+    events = events[:limit]
+
+    changed_ids = [row_id for _, row_id, deleted in events if not deleted]
+    reports = []
+    if changed_ids:
+        reports = view.filter(Report.id.in_(changed_ids)).options(*options) \
+            .order_by(Report.updated_at, Report.id).all()
+    visible = {report.id for report in reports}
+    removed = [row_id for _, row_id, deleted in events if deleted or row_id not in visible]
+
+    if has_more:
+        position = events[-1][:2]
+    else:
+        # Caught up: step back a settle window so writes flushed just before now
+        # but committed after this read are picked up (and resent) next time
+        settled = (now - timedelta(seconds=current_app.config['SYNC_SETTLE_SECONDS']), 0)
+        position = max(since, min(events[-1][:2], settled) if events else settled)
+    return reports, removed, encode_token(position[0], position[1], now), has_more
+
+
+def _record_tombstones(session, flush_context, instances):
+    """before_flush hook: leave a tombstone for every report being deleted"""
+    for obj in session.deleted:
+        if isinstance(obj, Report) and obj.id is not None:
+            session.add(ReportTombstone(report_id=obj.id, user_id=obj.user_id))
+
+
+def purge_tombstones(days):
+    """Delete tombstones older than days; tokens issued before then are rejected"""
+    cutoff = datetime.utcnow() - timedelta(days=days)
+    count = ReportTombstone.query.filter(ReportTombstone.deleted_at < cutoff).delete()
+    db.session.commit()
+    return count
+
+
+def init_app(app):
+    """Register the tombstone hook and the purge-tombstones command"""
+    if not event.contains(db.session, 'before_flush', _record_tombstones):
+        event.listen(db.session, 'before_flush', _record_tombstones)
+
+    @app.cli.command('purge-tombstones')
+    def purge_tombstones_command():
+        """Delete report tombstones older than SYNC_TOMBSTONE_DAYS"""
+        count = purge_tombstones(app.config['SYNC_TOMBSTONE_DAYS'])
+        click.echo(f'Purged {count} tombstone(s)')
@@ -0,0 +1,135 @@
+"""
+Tests for admin routes
+"""
+import csv
+import gzip
+from datetime import datetime
+from io import StringIO
+from sqlalchemy import text
+from app import create_app
+from conftest import TestConfig
+from extensions import db, engine_options
+from models import Report, StatCounter, User
+import stats
+from user_cache import load_user
+
+
+def _add_report(email, status, created_at):
+    user = User.query.filter_by(email=email).first()
+    db.session.add(Report(user_id=user.id, title=f'{status} report', description='d,with "quotes"',
+                          category='online', status=status, created_at=created_at))
+    db.session.commit()
+
+
+def test_export_reports_streams_filtered_csv(app, client, auth_headers):
+    app.config['EXPORT_BATCH_SIZE'] = 2
+    for day in range(1, 6):
+        _add_report('user@test.com', 'pending', datetime(2025, 3, day, 12))
+    _add_report('other@test.com', 'resolved', datetime(2025, 3, 3, 12))
+
+    response = client.get('/api/admin/reports/export?from=2025-03-02&to=2025-03-04&status=pending',
+                          headers=auth_headers('admin@test.com'))
+    assert response.status_code == 200
+    assert response.is_streamed
+
+    rows = list(csv.reader(StringIO(response.get_data(as_text=True))))
+    assert rows[0][:3] == ['ID', 'User Email', 'Title']
+    assert [row[1] for row in rows[1:]] == ['user@test.com'] * 3
+    assert all(row[5] == 'd,with "quotes"' for row in rows[1:])
+
+
+def test_export_is_gzipped_while_streaming(app, client, auth_headers):
+    for day in range(1, 6):
+        _add_report('user@test.com', 'pending', datetime(2025, 3, day, 12))
+    headers = auth_headers('admin@test.com')
+
+    plain = client.get('/api/admin/reports/export', headers=headers).get_data()
+    response = client.get('/api/admin/reports/export', headers={**headers, 'Accept-Encoding': 'gzip'})
+    assert response.is_streamed
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    assert gzip.decompress(response.get_data()) == plain
+
+
+def test_export_reports_rejects_bad_filters(client, auth_headers):
+    headers = auth_headers('admin@test.com')
+    assert client.get('/api/admin/reports/export?from=yesterday', headers=headers).status_code == 400
+    assert client.get('/api/admin/reports/export?status=open', headers=headers).status_code == 400
+
+
+def test_stats_counters_track_writes(app, client, auth_headers):
+    app.config['STATS_COUNTERS_ENABLED'] = True
+    stats.rebuild_counters()
+
+    client.post('/api/reports', json={'title': 't', 'description': 'd', 'category': 'online'},
+                headers=auth_headers('user@test.com'))
+    report_id = Report.query.first().id
+    client.put(f'/api/reports/{report_id}', json={'status': 'resolved'}, headers=auth_headers('mod@test.com'))
+    client.post('/api/admin/users', json={'email': 'new@test.com', 'password': 'pw', 'role': 'moderator'},
+                headers=auth_headers('admin@test.com'))
+
+    response = client.get('/api/admin/stats', headers=auth_headers('admin@test.com'))
+    assert response.get_json() == stats.collect_stats()
+    assert response.get_json()['reports_by_status']['resolved'] == 1
+    assert response.get_json()['users_by_role']['moderator'] == 2
+
+
+def test_stats_counters_create_missing_rows(app, client, auth_headers):
+    # Counters switched on before any seeding: no rows exist for the first report to bump
+    app.config['STATS_COUNTERS_ENABLED'] = True
+    StatCounter.query.delete()
+    db.session.commit()
+
+    client.post('/api/reports', json={'title': 't', 'description': 'd', 'category': 'online'},
+                headers=auth_headers('user@test.com'))
+    report_id = Report.query.first().id
+    client.put(f'/api/reports/{report_id}', json={'status': 'in_review'}, headers=auth_headers('mod@test.com'))
+
+    counters = stats.read_counter_stats()
+    assert counters['total_reports'] == 1
+    assert counters['reports_by_status'] == stats.collect_stats()['reports_by_status']
+
+
+def test_deactivating_user_invalidates_cached_lookup(app, client, auth_headers):
+    user = User.query.filter_by(email='user@test.com').first()
+    assert load_user(user.id).is_active is True
+
+    response = client.put(f'/api/admin/users/{user.id}', json={'is_active': False},
+                          headers=auth_headers('admin@test.com'))
+    assert response.status_code == 200
+    assert load_user(user.id).is_active is False
+
+
+def test_deactivated_users_existing_token_is_rejected(app, client, auth_headers):
+    headers = auth_headers('user@test.com')
+    assert client.get('/api/reports', headers=headers).status_code == 200
+
+    user = User.query.filter_by(email='user@test.com').first()
+    client.put(f'/api/admin/users/{user.id}', json={'is_active': False}, headers=auth_headers('admin@test.com'))
+    response = client.get('/api/reports', headers=headers)
+    assert response.status_code == 401
+    assert response.get_json()['error'] == 'Account is deactivated or no longer exists'
+
+
+def test_sqlite_file_database_runs_production_pragmas(tmp_path):
+    class FileConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "safeher.db"}'
+
+    app = create_app(FileConfig)
+    with app.app_context():
+        assert db.session.execute(text('PRAGMA journal_mode')).scalar() == 'wal'
+        assert db.session.execute(text('PRAGMA synchronous')).scalar() == 1  # NORMAL
+        assert db.session.execute(text('PRAGMA busy_timeout')).scalar() == 5000
+        db.session.remove()
+        db.engine.dispose()
+
+
+def test_server_databases_get_pool_options():
+    config = {**{k: getattr(TestConfig, k) for k in dir(TestConfig) if k.isupper()},
+              'SQLALCHEMY_DATABASE_URI': 'postgresql://db/safeher',
+              'DB_STATEMENT_TIMEOUT_MS': 15000, 'SQLALCHEMY_ENGINE_OPTIONS': {'pool_size': 3}}
+    options = engine_options(config)
+    assert options['pool_size'] == 3  # Explicit engine options win
+    assert options['max_overflow'] == TestConfig.DB_MAX_OVERFLOW
+    assert options['pool_pre_ping'] is True
+    assert options['connect_args'] == {'options': '-c statement_timeout=15000'}
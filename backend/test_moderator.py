@@ -0,0 +1,236 @@
+"""
+Tests for moderator routes
+"""
+import os
+import runpy
+import pytest
+from datetime import datetime, timedelta
+from extensions import db
+from models import ModeratorNote, Report, User
+from query_counter import track_queries
+from routes.moderator import QUEUE_QUERY_BUDGET
+
+
+def test_reviewed_reports_filtered_sorted_and_paged_in_sql(client, auth_headers):
+    user = User.query.filter_by(email='user@test.com').first()
+    moderator = User.query.filter_by(email='mod@test.com').first()
+    admin = User.query.filter_by(email='admin@test.com').first()
+    start = datetime(2025, 1, 1)
+
+    reports = []
+    for i in range(5):
+        report = Report(user_id=user.id, title=f'Report {i}', report_number=f'REP-TEST-{i}', description='d', category='online',
+                        status='resolved' if i % 2 else 'in_review', updated_at=start + timedelta(hours=5 - i))
+        db.session.add(report)
+        reports.append(report)
+    db.session.flush()
+    for report in reports[:4]:
+        # Two notes on one report must not duplicate it
+        db.session.add(ModeratorNote(report_id=report.id, moderator_id=moderator.id, note='n'))
+    db.session.add(ModeratorNote(report_id=reports[0].id, moderator_id=moderator.id, note='again'))
+    db.session.add(ModeratorNote(report_id=reports[4].id, moderator_id=admin.id, note='n'))
+    db.session.commit()
+
+    headers = auth_headers('mod@test.com')
+    body = client.get('/api/moderator/reports/reviewed?limit=3', headers=headers).get_json()
+    assert [r['title'] for r in body['reports']] == ['Report 0', 'Report 1', 'Report 2']
+    body = client.get(f'/api/moderator/reports/reviewed?limit=3&cursor={body["next_cursor"]}', headers=headers).get_json()
+    assert [r['title'] for r in body['reports']] == ['Report 3']
+    assert body['next_cursor'] is None
+
+    body = client.get('/api/moderator/reports/reviewed?status=resolved', headers=headers).get_json()
+    assert [r['title'] for r in body['reports']] == ['Report 1', 'Report 3']
+
+
+def test_conditional_get_skips_serialization_until_something_changes(client, auth_headers, monkeypatch):
+    user = User.query.filter_by(email='user@test.com').first()
+    report = Report(user_id=user.id, title='Queued', report_number='REP-TEST-Q', description='d', category='online')
+    db.session.add(report)
+    db.session.commit()
+    headers = auth_headers('mod@test.com')
+
+    queue = client.get('/api/moderator/reports', headers=headers)
+    detail = client.get(f'/api/moderator/reports/{report.id}', headers=headers)
+    assert queue.headers['ETag'] and detail.headers['Last-Modified']
+
+    def fail(*args, **kwargs):
+        raise AssertionError('a 304 must not serialize the report')
+
+    with monkeypatch.context() as patch:
+        patch.setattr(Report, 'to_dict', fail)
+        assert client.get('/api/moderator/reports', headers={
+            **headers, 'If-None-Match': queue.headers['ETag']}).status_code == 304
+        assert client.get(f'/api/moderator/reports/{report.id}', headers={
+            **headers, 'If-None-Match': detail.headers['ETag']}).status_code == 304
+        assert client.get(f'/api/moderator/reports/{report.id}', headers={
+            **headers, 'If-Modified-Since': detail.headers['Last-Modified']}).status_code == 304
+
+    # Different filters are a different resource
+    assert client.get('/api/moderator/reports?severity=high', headers={
+        **headers, 'If-None-Match': queue.headers['ETag']}).status_code == 200
+
+    # A note alone (no status change) still invalidates both
+    client.post(f'/api/moderator/reports/{report.id}/note', json={'note': 'Looking into it'}, headers=headers)
+    assert client.get('/api/moderator/reports', headers={
+        **headers, 'If-None-Match': queue.headers['ETag']}).status_code == 200
+    assert client.get(f'/api/moderator/reports/{report.id}', headers={
+        **headers, 'If-None-Match': detail.headers['ETag']}).status_code == 200
+
+
+def test_queue_changes_drop_reports_that_leave_the_queue(app, client, auth_headers):
+    app.config['SYNC_SETTLE_SECONDS'] = 0
+    user = User.query.filter_by(email='user@test.com').first()
+    reports = [Report(user_id=user.id, title=f'Report {i}', report_number=f'REP-TEST-{i}', description='d',
+                      category='online', status=status, updated_at=datetime(2025, 1, 1, i))
+               for i, status in enumerate(['pending', 'in_review', 'resolved'])]
+    db.session.add_all(reports)
+    db.session.commit()
+    headers = auth_headers('mod@test.com')
+
+    body = client.get('/api/moderator/reports/changes', headers=headers).get_json()
+    assert [r['title'] for r in body['reports']] == ['Report 0', 'Report 1']
+    assert body['removed'] == [reports[2].id]
+
+    client.post(f'/api/moderator/reports/{reports[0].id}/note', json={'note': 'Done', 'status': 'resolved'}, headers=headers)
+    changes = client.get(f'/api/moderator/reports/changes?since={body["sync_token"]}', headers=headers).get_json()
+    assert changes['reports'] == [] and changes['removed'] == [reports[0].id]
+    assert client.get('/api/moderator/reports/changes', headers=auth_headers('user@test.com')).status_code == 403
+
+
+def test_event_stream_pushes_queue_events_and_resumes(app, client, auth_headers):
+    app.config['EVENTS_STREAM_SECONDS'] = 0  # Deliver what's there, then end like a timed-out stream
+    headers = auth_headers('user@test.com')
+    report_id = client.post('/api/reports', json={'title': 'Urgent', 'description': 'd', 'category': 'online'},
+                            headers=headers).get_json()['report']['id']
+    client.put(f'/api/reports/{report_id}', json={'title': 'No status change'}, headers=headers)
+    mod_headers = auth_headers('mod@test.com')
+    client.post(f'/api/moderator/reports/{report_id}/note', json={'note': 'On it', 'status': 'in_review'},
+                headers=mod_headers)
+
+    response = client.get('/api/moderator/events', headers={**mod_headers, 'Last-Event-ID': '0'})
+    assert response.mimetype == 'text/event-stream'
+    body = response.get_data(as_text=True)
+    assert body.count('event: ') == 2
+    assert 'id: 1\nevent: report.created\n' in body and '"title":"Urgent"' in body
+    assert 'id: 2\nevent: note.added\n' in body and '"previous_status":"pending"' in body
+
+    # EventSource can't send headers: it uses a short-lived stream token instead of the access token
+    access_token = mod_headers['Authorization'].split()[1]
+    assert client.get(f'/api/moderator/events?jwt={access_token}').status_code == 401
+    assert client.get(f'/api/moderator/events?token={access_token}').status_code == 401
+    assert client.post('/api/moderator/events/token', headers=headers).status_code == 403
+    token = client.post('/api/moderator/events/token', headers=mod_headers).get_json()['token']
+    resumed = client.get(f'/api/moderator/events?token={token}', headers={'Last-Event-ID': '1'}).get_data(as_text=True)
+    assert 'report.created' not in resumed and 'id: 2\nevent: note.added' in resumed
+    # ...which opens nothing but the stream
+    assert client.get('/api/moderator/reports', headers={'Authorization': f'Bearer {token}'}).status_code == 422
+    app.config['EVENTS_TOKEN_SECONDS'] = -1
+    assert client.get(f'/api/moderator/events?token={token}').status_code == 401
+    # An id that is no longer in the backlog asks the client to resync
+    assert 'event: resync' in client.get('/api/moderator/events', headers={**mod_headers, 'Last-Event-ID': '99'}).get_data(as_text=True)
+    assert client.get('/api/moderator/events', headers=headers).status_code == 403
+    assert app.extensions['event_streams'].open == 0
+
+
+def test_bulk_moderation_commits_once_with_per_item_results(app, client, auth_headers):
+    user = User.query.filter_by(email='user@test.com').first()
+    reports = [Report(user_id=user.id, title=f'Spam {i}', report_number=f'REP-SPAM-{i}', description='d',
+                      category='online') for i in range(3)]
+    db.session.add_all(reports)
+    db.session.commit()
+    ids = [r.id for r in reports]
+    headers = auth_headers('mod@test.com')
+    url = '/api/moderator/reports/bulk'
+
+    # Atomic (the default): one bad operation and nothing is applied
+    body = client.post(url, json={'operations': [{'report_id': ids[0], 'status': 'rejected'},
+                                                 {'report_id': 999999, 'status': 'rejected'}]}, headers=headers)
+    assert body.status_code == 400
+    assert [r['ok'] for r in body.get_json()['results']] == [False, False]
+    assert body.get_json()['results'][1]['error'] == 'Report not found'
+    assert db.session.get(Report, ids[0]).status == 'pending'
+
+    body = client.post(url, json={'mode': 'best_effort', 'operations': [
+        {'report_id': ids[0], 'status': 'rejected', 'note': 'Spam'},
+        {'report_id': ids[1], 'status': 'rejected'},
+        {'report_id': ids[2], 'status': 'closed'},
+        {'report_id': ids[2], 'note': 'Needs a look'},
+    ]}, headers=headers).get_json()
+    assert body['applied'] == 3
+    assert [r['ok'] for r in body['results']] == [True, True, False, True]
+    db.session.expire_all()
+    assert [db.session.get(Report, i).status for i in ids] == ['rejected', 'rejected', 'pending']
+    assert sorted(n.note for n in ModeratorNote.query.all()) == ['Needs a look', 'Spam']
+    # Bulk note.added events carry the note id, like the single-note route
+    notes = {n.note: n.id for n in ModeratorNote.query.all()}
+    assert [(data['id'], data['note_id']) for _, event_type, data in app.extensions['events'].read('0', 0)
+            if event_type == 'note.added'] == [(ids[0], notes['Spam']), (ids[2], notes['Needs a look'])]
+
+    app.config['MODERATION_BULK_LIMIT'] = 1
+    assert client.post(url, json={'operations': [{'report_id': i, 'status': 'resolved'} for i in ids]},
+                       headers=headers).status_code == 400
+    assert client.post(url, json={'operations': [{'report_id': ids[0], 'note': 'x'}]},
+                       headers=auth_headers('user@test.com')).status_code == 403
+
+
+def test_queue_query_count_does_not_grow_with_the_queue(app, client, auth_headers, monkeypatch):
+    user = User.query.filter_by(email='user@test.com').first()
+    moderator = User.query.filter_by(email='mod@test.com').first()
+    headers = auth_headers('mod@test.com')
+
+    counts = []
+    for batch in range(2):
+        for i in range(10 * batch + 1):
+            report = Report(user_id=user.id, title='t', report_number=f'REP-N1-{batch}-{i}', description='d',
+                            category='online')
+            report.set_tags(['spam'])
+            db.session.add(report)
+            db.session.flush()
+            db.session.add(ModeratorNote(report_id=report.id, moderator_id=moderator.id, note='n'))
+        db.session.commit()
+        app.extensions['user_cache'].clear()  # Both requests pay for the active-user check
+        with track_queries() as queries:
+            assert client.get('/api/moderator/reports', headers=headers).status_code == 200
+        counts.append(queries.count)
+    # Pinned to the declared budget, so any extra query fails here before it creeps in
+    assert counts[0] == counts[1] == QUEUE_QUERY_BUDGET
+
+    # Over its @query_budget, strict mode (on in tests) turns the request into an error
+    monkeypatch.setattr(app.view_functions['moderator.get_moderator_queue'], 'query_budget', 2)
+    with pytest.raises(AssertionError, match='budget 2'):
+        client.get('/api/moderator/reports', headers=headers)
+
+
+def test_debug_headers_and_n_plus_one_warning(app, client, auth_headers, caplog):
+    app.config.update(QUERY_DEBUG_HEADERS=True, QUERY_N_PLUS_ONE_THRESHOLD=2)
+    user = User.query.filter_by(email='user@test.com').first()
+    reports = [Report(user_id=user.id, title='t', report_number=f'REP-D-{i}', description='d', category='online')
+               for i in range(3)]
+    db.session.add_all(reports)
+    db.session.commit()
+    headers = auth_headers('mod@test.com')
+
+    # Detail lookups one by one in a single request are exactly what the warning is for
+    @app.route('/test/n-plus-one')
+    def n_plus_one():
+        return {'titles': [db.session.get(Report, r.id, populate_existing=True).title for r in reports]}
+
+    response = client.get('/api/moderator/reports', headers=headers)
+    assert int(response.headers['X-Query-Count']) <= QUEUE_QUERY_BUDGET
+    assert response.headers['X-Query-Time'].endswith('ms')
+    assert 'Suspected N+1 query' not in caplog.text
+
+    client.get('/test/n-plus-one')
+    assert 'Suspected N+1 query' in caplog.text
+
+
+def test_gunicorn_config_keeps_memory_events_to_one_worker(monkeypatch):
+    config = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gunicorn.conf.py')
+    monkeypatch.delenv('EVENTS_BACKEND', raising=False)
+    monkeypatch.delenv('GUNICORN_WORKERS', raising=False)
+    assert runpy.run_path(config)['workers'] == 1
+    monkeypatch.setenv('GUNICORN_WORKERS', '4')
+    with pytest.raises(RuntimeError, match='redis'):
+        runpy.run_path(config)
+    monkeypatch.setenv('EVENTS_BACKEND', 'redis')
+    assert runpy.run_path(config)['workers'] == 4
@@ -0,0 +1,388 @@
+"""
+Tests for report listing routes
+"""
+import gzip
+import re
+import shutil
+import pytest
+from datetime import datetime, timedelta
+from flask.json.provider import DefaultJSONProvider
+from flask_jwt_extended import create_access_token
+from werkzeug.datastructures import MultiDict
+from app import create_app
+from conftest import TestConfig
+from extensions import db
+from filters import apply_report_filters
+from json_provider import OrjsonProvider, orjson
+from models import ModeratorNote, Report, User
+from query_counter import track_queries
+
+
+def _seed_reports(email, count, start=None):
+    user = User.query.filter_by(email=email).first()
+    start = start or datetime(2025, 1, 1)
+    reports = []
+    for i in range(count):
+        report = Report(
+            user_id=user.id,
+            title=f'Report {i}',
+            report_number=f'REP-{user.id}-{i:04d}',
+            description='Something happened',
+            category='online',
+            # Pairs of reports share a timestamp so the id tie-breaker is exercised
+            created_at=start + timedelta(minutes=i // 2),
+            updated_at=start + timedelta(minutes=i // 2),
+        )
+        db.session.add(report)
+        reports.append(report)
+    db.session.commit()
+    return reports
+
+
+def test_get_reports_walks_every_page_once(client, auth_headers):
+    reports = _seed_reports('user@test.com', 7)
+    headers = auth_headers('user@test.com')
+
+    seen, cursor = [], None
+    while True:
+        url = '/api/reports?limit=3' + (f'&cursor={cursor}' if cursor else '')
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        body = response.get_json()
+        seen.extend(r['id'] for r in body['reports'])
+        cursor = body['next_cursor']
+        if not cursor:
+            break
+
+    expected = sorted(reports, key=lambda r: (r.created_at, r.id), reverse=True)
+    assert seen == [r.id for r in expected]
+
+
+def test_get_reports_only_returns_own_reports(client, auth_headers):
+    _seed_reports('user@test.com', 2)
+    _seed_reports('other@test.com', 3)
+
+    response = client.get('/api/reports', headers=auth_headers('user@test.com'))
+    assert len(response.get_json()['reports']) == 2
+
+    response = client.get('/api/reports?all=true', headers=auth_headers('mod@test.com'))
+    assert len(response.get_json()['reports']) == 5
+
+
+def test_list_endpoints_batch_load_reporters_and_notes(app, client, auth_headers):
+    moderator = User.query.filter_by(email='mod@test.com').first()
+    urls = {'/api/reports?all=true&limit=200': 'mod@test.com', '/api/moderator/reports': 'mod@test.com',
+            '/api/moderator/reports/reviewed?limit=200': 'mod@test.com', '/api/admin/reports/export': 'admin@test.com'}
+    headers = {email: auth_headers(email) for email in set(urls.values())}
+
+    counts = []
+    # 1 report, then 20 more from a second reporter: each with two moderator notes
+    for email, count in (('user@test.com', 1), ('other@test.com', 20)):
+        for report in _seed_reports(email, count):
+            db.session.add_all([ModeratorNote(report_id=report.id, moderator_id=moderator.id, note=f'n{i}')
+                                for i in range(2)])
+        db.session.commit()
+        run = {}
+        for url, email in urls.items():
+            app.extensions['user_cache'].clear()
+            with track_queries() as queries:
+                response = client.get(url, headers=headers[email])
+                assert response.status_code == 200
+                response.get_data()  # The export streams: count the queries of the whole body
+            run[url] = queries.count
+        counts.append(run)
+
+    # Reporters, notes and note moderators come in batches, not one query per report or note
+    assert counts[0] == counts[1]
+    queue = client.get('/api/moderator/reports', headers=headers['mod@test.com']).get_json()
+    assert len(queue) == 21 and all(len(r['notes']) == 2 and r['notes'][0]['moderator'] for r in queue)
+
+
+def test_get_reports_rejects_bad_cursor(client, auth_headers):
+    response = client.get('/api/reports?cursor=not-a-cursor', headers=auth_headers('user@test.com'))
+    assert response.status_code == 400
+
+
+def test_search_ranks_matches_and_scopes_to_owner(client, auth_headers):
+    user_headers = auth_headers('user@test.com')
+    for payload in [
+        {'title': 'Harassment on the bus', 'description': 'It happened during the commute', 'category': 'physical'},
+        {'title': 'Online messages', 'description': 'Repeated messages, once on a bus ride', 'category': 'online'},
+        {'title': 'Workplace comments', 'description': 'Comments from a manager', 'category': 'workplace'},
+    ]:
+        client.post('/api/reports', json=payload, headers=user_headers)
+    client.post('/api/reports', json={'title': 'Bus stop incident', 'description': 'x', 'category': 'physical'},
+                headers=auth_headers('other@test.com'))
+
+    body = client.get('/api/reports/search?q=bus', headers=user_headers).get_json()
+    assert [r['title'] for r in body['reports']] == ['Harassment on the bus', 'Online messages']
+
+    body = client.get('/api/reports/search?q=bus&limit=2', headers=auth_headers('mod@test.com')).get_json()
+    assert len(body['reports']) == 2 and body['next_offset'] == 2
+
+    # Edits are picked up by the index triggers
+    report_id = client.get('/api/reports/search?q=commute', headers=user_headers).get_json()['reports'][0]['id']
+    client.put(f'/api/reports/{report_id}', json={'title': 'Train incident'}, headers=user_headers)
+    body = client.get('/api/reports/search?q=train', headers=user_headers).get_json()
+    assert [r['id'] for r in body['reports']] == [report_id]
+    body = client.get('/api/reports/search?q=bus', headers=user_headers).get_json()
+    assert [r['title'] for r in body['reports']] == ['Online messages']
+
+
+def test_tags_attachments_and_relations_round_trip_and_filter(client, auth_headers):
+    headers = auth_headers('user@test.com')
+    first = client.post('/api/reports', json={
+        'title': 'First', 'description': 'd', 'category': 'online', 'tags': ['bus', 'night', 'bus'],
+        'file_attachments': [{'name': 'a.png', 'type': 'image/png', 'url': '/uploads/a.png', 'size': 10}]
+    }, headers=headers).get_json()['report']
+    assert first['tags'] == ['bus', 'night']
+    assert first['file_attachments'] == [{'name': 'a.png', 'type': 'image/png', 'url': '/uploads/a.png', 'size': 10}]
+
+    second = client.post('/api/reports', json={
+        'title': 'Second', 'description': 'd', 'category': 'online', 'tags': ['night'],
+        'related_report_ids': [first['id']]
+    }, headers=headers).get_json()['report']
+    assert second['related_report_ids'] == [first['id']]
+
+    titles = [r['title'] for r in client.get('/api/reports?tag=night', headers=headers).get_json()['reports']]
+    assert titles == ['Second', 'First']
+    titles = [r['title'] for r in client.get('/api/reports?tag=bus', headers=headers).get_json()['reports']]
+    assert titles == ['First']
+    titles = [r['title'] for r in client.get(f'/api/reports?related_to={first["id"]}', headers=headers).get_json()['reports']]
+    assert titles == ['Second']
+
+    updated = client.put(f'/api/reports/{first["id"]}', json={'tags': ['night', 'train']},
+                         headers=headers).get_json()['report']
+    assert updated['tags'] == ['night', 'train']
+
+
+def test_attachment_metadata_round_trips(client, auth_headers):
+    attachments = [
+        {'name': 'a.png', 'type': 'image/png', 'url': '/uploads/a.png', 'size': '1024'},
+        {'name': 'b.pdf', 'type': None, 'url': '/uploads/b.pdf', 'size': None, 'uploaded_at': None, 'caption': 'x'},
+        {'name': 'c.txt', 'size': 'unknown'},
+    ]
+    report = client.post('/api/reports', json={
+        'title': 'Attachments', 'description': 'd', 'category': 'online', 'file_attachments': attachments
+    }, headers=auth_headers('user@test.com')).get_json()['report']
+    assert report['file_attachments'] == [
+        {'name': 'a.png', 'type': 'image/png', 'url': '/uploads/a.png', 'size': 1024},
+        attachments[1],
+        attachments[2],
+    ]
+
+
+def _query_plan(query):
+    """Return SQLite's EXPLAIN QUERY PLAN output for an ORM query"""
+    compiled = query.statement.compile(db.engine, compile_kwargs={'literal_binds': True})
+    with db.engine.connect() as conn:
+        rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {compiled}').fetchall()
+    return ' | '.join(row[-1] for row in rows)
+
+
+def test_report_filters_use_indexes(app):
+    cases = {
+        'status': ('pending', 'ix_reports_status_created'),
+        'category': ('online', 'ix_reports_category_created'),
+        'severity': ('high', 'ix_reports_severity_created'),
+        'urgency': ('urgent', 'ix_reports_urgency_created'),
+        # An open-ended range can match most rows: walking created_at newest
+        # first stops after one page, and SQLite prefers that
+        'incident_from': ('2025-01-01', 'ix_reports_created_at'),
+    }
+    for param, (value, index_name) in cases.items():
+        query = apply_report_filters(Report.query, MultiDict({param: value}))
+        plan = _query_plan(query.order_by(Report.created_at.desc(), Report.id.desc()).limit(50))
+        assert re.search(rf'USING INDEX {index_name}\b', plan), (param, plan)
+        assert 'TEMP B-TREE' not in plan, (param, plan)
+
+    # A bounded incident range is searched on its own index; only the matching rows are sorted
+    query = apply_report_filters(Report.query, MultiDict({'incident_from': '2025-01-01', 'incident_to': '2025-01-31'}))
+    plan = _query_plan(query.order_by(Report.created_at.desc(), Report.id.desc()).limit(50))
+    assert plan.startswith('SEARCH reports USING INDEX ix_reports_incident_date '), plan
+
+    # The default moderator queue (several statuses) seeks each status in
+    # ix_reports_status_created and sorts only the open reports
+    query = apply_report_filters(Report.query, MultiDict(), default_statuses=['pending', 'in_review'])
+    plan = _query_plan(query.order_by(Report.created_at.desc(), Report.id.desc()).limit(50))
+    assert plan.startswith('SEARCH reports USING INDEX ix_reports_status_created (status=?)'), plan
+
+    plan = _query_plan(Report.query.filter_by(user_id=1).order_by(Report.created_at.desc(), Report.id.desc()).limit(50))
+    assert 'USING INDEX ix_reports_user_created' in plan
+    assert 'TEMP B-TREE' not in plan
+
+
+def test_fields_projection(client, auth_headers):
+    headers = auth_headers('user@test.com')
+    client.post('/api/reports', json={'title': 'T', 'description': 'D', 'category': 'online', 'tags': ['x']},
+                headers=headers)
+
+    body = client.get('/api/reports?fields=id,title,tags', headers=headers).get_json()
+    assert [sorted(r) for r in body['reports']] == [['id', 'tags', 'title']]
+    assert body['reports'][0]['tags'] == ['x']
+
+    report_id = body['reports'][0]['id']
+    report = client.get(f'/api/reports/{report_id}?fields=status,notes', headers=headers).get_json()
+    assert report == {'status': 'pending', 'notes': []}
+
+    assert client.get('/api/reports?fields=id,password', headers=headers).status_code == 400
+
+
+def test_orjson_provider_matches_stdlib(app):
+    if orjson is None:
+        pytest.skip('orjson is not installed')
+    payload = {'b': [1, 2.5, None, True], 'a': {'nested': 'é'}, 'when': datetime(2025, 1, 2, 3, 4, 5)}
+    fast, default = OrjsonProvider(app), DefaultJSONProvider(app)
+    assert fast.loads(fast.dumps(payload)) == default.loads(default.dumps(payload))
+    assert fast.dumps(payload).startswith('{"a":')
+
+
+def test_large_json_responses_are_compressed(app, client, auth_headers):
+    _seed_reports('user@test.com', 20)
+    headers = auth_headers('user@test.com')
+
+    # Without Accept-Encoding bodies go out as-is
+    assert 'Content-Encoding' not in client.get('/api/reports', headers=headers).headers
+
+    response = client.get('/api/reports', headers={**headers, 'Accept-Encoding': 'gzip, deflate'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert response.headers['ETag'].startswith('W/')
+    assert len(gzip.decompress(response.get_data())) > len(response.get_data())
+    # The weakened ETag still revalidates
+    assert client.get('/api/reports', headers={**headers, 'If-None-Match': response.headers['ETag']}).status_code == 304
+
+    # Below the threshold bodies go out as-is
+    small = client.get('/api/reports?limit=1&fields=id', headers={**headers, 'Accept-Encoding': 'gzip'})
+    assert 'Content-Encoding' not in small.headers
+
+
+def test_serializing_reports_without_numbers_does_not_modify_them(client, auth_headers):
+    user = User.query.filter_by(email='user@test.com').first()
+    report = Report(user_id=user.id, title='Legacy', description='d', category='online',
+                    created_at=datetime(2025, 3, 1), updated_at=datetime(2025, 3, 1))
+    db.session.add(report)
+    db.session.commit()
+    headers = auth_headers('user@test.com')
+
+    first = client.get('/api/reports', headers=headers)
+    assert first.get_json()['reports'][0]['report_number'] == f'REP-20250301-{report.id:04d}'
+    db.session.commit()
+    assert db.session.get(Report, report.id).updated_at == datetime(2025, 3, 1)
+    assert client.get('/api/reports', headers={**headers, 'If-None-Match': first.headers['ETag']}).status_code == 304
+
+
+def test_changes_returns_only_updates_and_removals_since_token(app, client, auth_headers):
+    app.config['SYNC_SETTLE_SECONDS'] = 0
+    reports = _seed_reports('user@test.com', 5)
+    _seed_reports('other@test.com', 2)
+    headers = auth_headers('user@test.com')
+
+    # A full sync pages through everything from the beginning
+    first = client.get('/api/reports/changes?limit=3&fields=id', headers=headers).get_json()
+    assert first['has_more'] and len(first['reports']) == 3
+    second = client.get(f'/api/reports/changes?limit=3&since={first["sync_token"]}', headers=headers).get_json()
+    assert not second['has_more']
+    assert [r['id'] for r in first['reports'] + second['reports']] == [r.id for r in reports]
+    token = second['sync_token']
+    assert client.get(f'/api/reports/changes?since={token}', headers=headers).get_json()['reports'] == []
+
+    client.put(f'/api/reports/{reports[1].id}', json={'title': 'Edited'}, headers=headers)
+    db.session.delete(reports[3])
+    db.session.commit()
+    body = client.get(f'/api/reports/changes?since={token}', headers=headers).get_json()
+    assert [r['title'] for r in body['reports']] == ['Edited']
+    assert body['removed'] == [reports[3].id]
+
+    # Reports that no longer match the filters are removed from the view
+    filtered = client.get(f'/api/reports/changes?since={token}&category=online', headers=headers).get_json()
+    assert [r['id'] for r in filtered['reports']] == [reports[1].id]
+    client.put(f'/api/reports/{reports[1].id}', json={'category': 'physical'}, headers=headers)
+    filtered = client.get(f'/api/reports/changes?since={token}&category=online', headers=headers).get_json()
+    assert filtered['reports'] == [] and set(filtered['removed']) == {reports[1].id, reports[3].id}
+
+    # Other users never see these tombstones
+    other = client.get('/api/reports/changes', headers=auth_headers('other@test.com')).get_json()
+    assert len(other['reports']) == 2 and other['removed'] == []
+
+    assert client.get('/api/reports/changes?since=garbage', headers=headers).status_code == 400
+    app.config['SYNC_TOMBSTONE_DAYS'] = 0
+    assert client.get(f'/api/reports/changes?since={token}', headers=headers).status_code == 410
+
+
+def test_requests_are_timed_and_exported_as_prometheus_metrics(app, client, auth_headers):
+    _seed_reports('user@test.com', 3)
+    headers = auth_headers('user@test.com')
+    # Server-Timing is a debug aid, off unless asked for
+    assert 'Server-Timing' not in client.get('/api/reports', headers=headers).headers
+    app.config['SERVER_TIMING_HEADERS'] = True
+    response = client.get('/api/reports', headers=headers)
+    timing = response.headers['Server-Timing']
+    assert 'db;dur=' in timing and 'serialize;dur=' in timing and 'total;dur=' in timing
+    client.get('/api/no-such-route')
+
+    # Without a token the endpoint is off, not public
+    assert client.get('/api/metrics').status_code == 404
+    app.config['METRICS_TOKEN'] = 'scrape-secret'
+    assert client.get('/api/metrics').status_code == 401
+    body = client.get('/api/metrics', headers={'Authorization': 'Bearer scrape-secret'}).get_data(as_text=True)
+    labels = 'blueprint="reports",endpoint="reports.get_reports",method="GET"'
+    assert f'safeher_http_request_duration_seconds_count{{{labels}}} 2' in body
+    assert f'safeher_http_requests_total{{{labels},status="200"}} 2' in body
+    assert 'endpoint="unmatched",method="GET",status="404"} 1' in body
+    # The scrape itself is still in flight
+    assert 'safeher_http_requests_in_flight 1' in body
+
+
+def test_reads_go_to_replica_until_user_writes(tmp_path):
+    class ReplicaConfig(TestConfig):
+        SQLALCHEMY_DATABASE_URI = f'sqlite:///{tmp_path / "primary.db"}'
+        DB_REPLICA_URIS = [f'sqlite:///{tmp_path / "replica.db"}']
+
+    app = create_app(ReplicaConfig)
+    client = app.test_client()
+    with app.app_context():
+        for email in ['user@test.com', 'other@test.com']:
+            db.session.add(User(email=email, full_name=email.split('@')[0], role='user', password_hash='x'))
+        db.session.commit()
+        user_id = User.query.filter_by(email='user@test.com').first().id
+        _seed_reports('user@test.com', 1)
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
+        # The replica is a snapshot; the next report only reaches the primary ("replication lag")
+        shutil.copy(tmp_path / 'primary.db', tmp_path / 'replica.db')
+        lagging = Report(user_id=user_id, report_number='REP-LAG', title='Lagging', description='d', category='online')
+        db.session.add(lagging)
+        db.session.commit()
+        lagging_id = lagging.id
+        headers = {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+        db.session.remove()
+
+    assert [r['title'] for r in client.get('/api/reports', headers=headers).get_json()['reports']] == ['Report 0']
+    assert client.get(f'/api/reports/{lagging_id}', headers=headers).status_code == 200  # Unmarked views read the primary
+
+    response = client.post('/api/reports', json={'title': 'Mine', 'description': 'd', 'category': 'online'},
+                           headers=headers)
+    assert response.status_code == 201
+    titles = [r['title'] for r in client.get('/api/reports', headers=headers).get_json()['reports']]
+    assert sorted(titles) == ['Lagging', 'Mine', 'Report 0']
+
+    # Another worker has its own memory of writers, but honours the signed cookie from the write
+    other_worker = create_app(ReplicaConfig).test_client()
+    titles = [r['title'] for r in other_worker.get('/api/reports', headers=headers).get_json()['reports']]
+    assert titles == ['Report 0']
+    marker = client.get_cookie('read_primary').value
+    other_worker.set_cookie('read_primary', marker)
+    titles = [r['title'] for r in other_worker.get('/api/reports', headers=headers).get_json()['reports']]
+    assert sorted(titles) == ['Lagging', 'Mine', 'Report 0']
+    assert other_worker.get('/api/reports/search?q=Lagging', headers=headers).get_json()['reports'] != []
+    # A tampered marker is ignored
+    other_worker.set_cookie('read_primary', marker[:-2] + 'xx')
+    titles = [r['title'] for r in other_worker.get('/api/reports', headers=headers).get_json()['reports']]
+    assert titles == ['Report 0']
+
+    with app.app_context():
+        db.session.remove()
+        for engine in db.engines.values():
+            engine.dispose()
@@ -0,0 +1,393 @@
+"""
+Tests for upload routes
+"""
+import io
+import os
+import shutil
+import subprocess
+import threading
+from datetime import datetime, timedelta
+import pytest
+from PIL import Image
+from app import create_app
+from conftest import TestConfig
+from extensions import db
+from models import MediaJob, StoredFile
+import ingest
+import media
+import storage
+
+
+@pytest.fixture
+def upload_dir(app, tmp_path):
+    app.config['UPLOAD_FOLDER'] = str(tmp_path)
+    app.config['UPLOAD_CHUNK_SIZE'] = 4
+    app.config['IMAGE_INGEST_ENABLED'] = False  # Most tests upload placeholder bytes, not real images
+    return tmp_path
+
+
+def _put_chunk(client, headers, upload_id, data, start, total):
+    return client.put(f'/api/uploads/sessions/{upload_id}', data=data, headers={
+        **headers, 'Content-Range': f'bytes {start}-{start + len(data) - 1}/{total}'
+    })
+
+
+def test_chunked_upload_resumes_and_finalizes(client, auth_headers, upload_dir):
+    headers = auth_headers('user@test.com')
+    content = b'0123456789'
+
+    session = client.post('/api/uploads/sessions', json={
+        'filename': 'clip.mp4', 'size': len(content), 'content_type': 'video/mp4'
+    }, headers=headers).get_json()
+    upload_id = session['upload_id']
+    assert session['offset'] == 0
+
+    assert _put_chunk(client, headers, upload_id, content[0:4], 0, 10).get_json()['offset'] == 4
+    # Skipping ahead is refused with the offset to resume from
+    response = _put_chunk(client, headers, upload_id, content[8:10], 8, 10)
+    assert response.status_code == 409 and response.get_json()['offset'] == 4
+    # After a "disconnect" the client asks where to resume, and re-sent chunks are harmless
+    assert client.get(f'/api/uploads/sessions/{upload_id}', headers=headers).get_json()['offset'] == 4
+    _put_chunk(client, headers, upload_id, content[0:4], 0, 10)
+    _put_chunk(client, headers, upload_id, content[4:8], 4, 10)
+
+    assert client.post(f'/api/uploads/sessions/{upload_id}/complete', headers=headers).status_code == 409
+    _put_chunk(client, headers, upload_id, content[8:10], 8, 10)
+
+    # While a concurrent complete holds the received bytes, another one gets 409 rather than a 500
+    part_path = upload_dir / '.partial' / f'{upload_id}.part'
+    os.rename(part_path, f'{part_path}.claimed')
+    response = client.post(f'/api/uploads/sessions/{upload_id}/complete', headers=headers)
+    assert response.status_code == 409
+    os.rename(f'{part_path}.claimed', part_path)
+
+    response = client.post(f'/api/uploads/sessions/{upload_id}/complete', headers=headers)
+    assert response.status_code == 201
+    metadata = response.get_json()['file']
+    assert metadata['name'] == 'clip.mp4' and metadata['type'] == 'video/mp4' and metadata['size'] == 10
+    assert client.get(response.get_json()['preview_url']).data == content
+
+
+def test_chunked_upload_checks_size_and_owner_up_front(app, client, auth_headers, upload_dir):
+    headers = auth_headers('user@test.com')
+    too_big = client.post('/api/uploads/sessions', json={
+        'filename': 'big.mov', 'size': app.config['MAX_FILE_SIZE'] + 1
+    }, headers=headers)
+    assert too_big.status_code == 400
+
+    upload_id = client.post('/api/uploads/sessions', json={'filename': 'a.png', 'size': 3},
+                            headers=headers).get_json()['upload_id']
+    assert client.get(f'/api/uploads/sessions/{upload_id}', headers=auth_headers('other@test.com')).status_code == 404
+
+
+def test_identical_uploads_are_stored_once(client, auth_headers, upload_dir):
+    headers = auth_headers('user@test.com')
+    urls = []
+    for name in ['shot.png', 'copy.png']:
+        response = client.post('/api/uploads', data={'file': (io.BytesIO(b'same bytes'), name)},
+                               headers=headers, content_type='multipart/form-data')
+        assert response.status_code == 201
+        urls.append(response.get_json()['file']['url'])
+
+    assert urls[0] == urls[1]
+    sha256 = os.path.splitext(os.path.basename(urls[0]))[0]
+    assert db.session.get(StoredFile, sha256).ref_count == 2
+    assert os.path.exists(os.path.join(upload_dir, sha256[:2], sha256[2:4], sha256))
+    assert client.get(urls[0], headers=auth_headers('mod@test.com')).data == b'same bytes'
+
+
+def test_replaced_attachments_release_their_blobs(client, auth_headers, upload_dir):
+    headers = auth_headers('user@test.com')
+    uploads = [client.post('/api/uploads', data={'file': (io.BytesIO(b'shared evidence'), 'shot.png')},
+                           headers=headers).get_json()['file'] for _ in range(2)]
+    sha256 = uploads[0]['sha256']
+    blob = os.path.join(upload_dir, sha256[:2], sha256[2:4], sha256)
+    report_ids = [client.post('/api/reports', json={
+        'title': 'Incident', 'description': 'd', 'category': 'online', 'file_attachments': [metadata]
+    }, headers=headers).get_json()['report']['id'] for metadata in uploads]
+
+    # One report drops the file: the other upload's reference keeps it
+    client.put(f'/api/reports/{report_ids[0]}', json={'file_attachments': []}, headers=headers)
+    assert db.session.get(StoredFile, sha256).ref_count == 1
+    assert os.path.exists(blob)
+
+    # The last reference goes when the second report replaces it
+    other = client.post('/api/uploads', data={'file': (io.BytesIO(b'new evidence'), 'new.pdf')},
+                        headers=headers).get_json()['file']
+    client.put(f'/api/reports/{report_ids[1]}', json={'file_attachments': [other]}, headers=headers)
+    assert db.session.get(StoredFile, sha256) is None
+    assert not os.path.exists(blob)
+    assert client.get(uploads[0]['url'], headers=auth_headers('mod@test.com')).status_code == 404
+    assert client.get(other['url'], headers=headers).status_code == 200
+
+
+def test_unattached_uploads_are_swept(app, client, auth_headers, upload_dir, monkeypatch):
+    headers = auth_headers('user@test.com')
+
+    def upload(content, name):
+        return client.post('/api/uploads', data={'file': (io.BytesIO(content), name)}, headers=headers).get_json()['file']
+
+    def fake_thumbnails(path):
+        target = storage.new_temp_path()
+        with open(target, 'wb') as f:
+            f.write(b'thumbnail of ' + open(path, 'rb').read())
+        return {'thumbnail': (target, 'image/jpeg', '.jpg')}
+
+    monkeypatch.setitem(media.RENDERERS, 'image', fake_thumbnails)
+    abandoned = upload(b'abandoned photo', 'photo.jpg')
+    media.process_pending()
+    thumbnail = storage.sha256_from_url(MediaJob.query.filter_by(sha256=abandoned['sha256']).one()
+                                        .get_derivatives()['thumbnail'])
+    attached = upload(b'attached evidence', 'doc.pdf')
+    client.post('/api/reports', json={'title': 'Incident', 'description': 'd', 'category': 'online',
+                                      'file_attachments': [attached]}, headers=headers)
+    reuploaded = upload(b'still wanted', 'draft.pdf')
+    StoredFile.query.update({'last_uploaded_at': datetime.utcnow() - timedelta(hours=72)})
+    db.session.commit()
+    # Uploading the same content again restarts its clock
+    upload(b'still wanted', 'draft.pdf')
+    fresh = upload(b'form still open', 'new.pdf')
+
+    result = app.test_cli_runner().invoke(args=['sweep-uploads'])
+    assert result.output.strip() == 'Swept 1 unattached upload(s)'
+    db.session.expire_all()
+    for sha256 in [abandoned['sha256'], thumbnail]:
+        assert db.session.get(StoredFile, sha256) is None
+        assert not os.path.exists(storage.blob_path(sha256))
+    assert MediaJob.query.filter_by(sha256=abandoned['sha256']).first() is None
+    for metadata in [attached, reuploaded, fresh]:
+        assert os.path.exists(storage.blob_path(metadata['sha256']))
+
+
+def test_uploads_are_served_cacheable_with_ranges(app, client, auth_headers, upload_dir):
+    content = b'0123456789' * 10
+    url = client.post('/api/uploads', data={'file': (io.BytesIO(content), 'photo.jpg')},
+                      headers=auth_headers('user@test.com')).get_json()['file']['url']
+    sha = url.rsplit('/', 1)[1].split('.')[0]
+    headers = auth_headers('mod@test.com')
+
+    response = client.get(url, headers=headers)
+    assert response.data == content
+    assert response.headers['ETag'] == f'"{sha}"'
+    # Browsers may cache evidence, shared caches may not
+    cache_control = response.headers['Cache-Control']
+    assert 'private' in cache_control and 'immutable' in cache_control and 'public' not in cache_control
+
+    assert client.get(url, headers={**headers, 'If-None-Match': f'"{sha}"'}).status_code == 304
+
+    response = client.get(url, headers={**headers, 'Range': 'bytes=10-19'})
+    assert response.status_code == 206 and response.data == content[10:20]
+
+    # Offloaded to nginx: headers only, the proxy sends the bytes
+    app.config['UPLOAD_SERVE_MODE'] = 'x-accel'
+    response = client.get(url, headers=headers)
+    assert response.data == b''
+    assert response.headers['X-Accel-Redirect'] == f'/protected-uploads/{sha[:2]}/{sha[2:4]}/{sha}'
+    assert response.headers['ETag'] == f'"{sha}"'
+    assert 'private' in response.headers['Cache-Control'] and 'public' not in response.headers['Cache-Control']
+    assert client.get(url, headers={**headers, 'If-None-Match': f'"{sha}"'}).status_code == 304
+
+
+def test_uploads_are_only_served_to_owners_and_moderators(app, client, auth_headers, upload_dir):
+    headers = auth_headers('user@test.com')
+    uploaded = client.post('/api/uploads', data={'file': (io.BytesIO(b'private evidence'), 'shot.png')},
+                           headers=headers).get_json()
+    url, filename = uploaded['file']['url'], uploaded['file']['url'].rsplit('/', 1)[1]
+
+    # Not attached to a report yet: only the uploader's preview link and moderators can open it
+    assert client.get(uploaded['preview_url']).data == b'private evidence'
+    assert client.get(url, headers=headers).status_code == 403
+    assert client.get(url, headers=auth_headers('mod@test.com')).status_code == 200
+
+    client.post('/api/reports', json={'title': 'Incident', 'description': 'd', 'category': 'online',
+                                      'file_attachments': [uploaded['file']]}, headers=headers)
+    for mode in ['flask', 'x-accel']:
+        app.config['UPLOAD_SERVE_MODE'] = mode
+        assert client.get(url).status_code == 401
+        assert client.get(url, headers=auth_headers('other@test.com')).status_code == 403
+        assert client.get(url, headers=headers).status_code == 200
+        assert client.get(url, headers=auth_headers('admin@test.com')).status_code == 200
+
+    # Links for <img>/<a> tags: issued only to readers, scoped to one file, short-lived
+    app.config['UPLOAD_SERVE_MODE'] = 'flask'
+    token_url = f'/api/uploads/files/{filename}/token'
+    assert client.post(token_url, headers=auth_headers('other@test.com')).status_code == 403
+    link = client.post(token_url, headers=headers).get_json()['url']
+    assert client.get(link).data == b'private evidence'
+    other = client.post('/api/uploads', data={'file': (io.BytesIO(b'someone else'), 'other.png')},
+                        headers=auth_headers('other@test.com')).get_json()['file']['url']
+    assert client.get(other + '?' + link.split('?')[1]).status_code == 401
+    app.config['UPLOAD_LINK_SECONDS'] = -1
+    assert client.get(link).status_code == 401
+
+
+def test_upload_type_comes_from_extension_not_client(app, client, auth_headers, upload_dir):
+    page = b'<html><script>alert(document.cookie)</script></html>'
+    metadata = client.post('/api/uploads', data={'file': (io.BytesIO(page), 'evil.pdf', 'text/html')},
+                           headers=auth_headers('user@test.com')).get_json()['file']
+    assert metadata['type'] == 'application/pdf'
+    assert db.session.get(StoredFile, metadata['sha256']).content_type == 'application/pdf'
+    headers = auth_headers('mod@test.com')
+
+    for mode in ['flask', 'x-accel']:
+        app.config['UPLOAD_SERVE_MODE'] = mode
+        response = client.get(metadata['url'], headers=headers)
+        assert response.mimetype == 'application/pdf'
+        assert response.headers['X-Content-Type-Options'] == 'nosniff'
+        assert response.headers['Content-Disposition'].startswith('attachment')
+
+    # A hostile type stored before this check is still never served as HTML
+    db.session.get(StoredFile, metadata['sha256']).content_type = 'text/html'
+    db.session.commit()
+    for mode in ['flask', 'x-accel']:
+        app.config['UPLOAD_SERVE_MODE'] = mode
+        response = client.get(metadata['url'], headers=headers)
+        assert response.mimetype == 'application/octet-stream'
+        assert response.headers['Content-Disposition'].startswith('attachment')
+
+    app.config['UPLOAD_SERVE_MODE'] = 'flask'
+    url = client.post('/api/uploads', data={'file': (io.BytesIO(b'jpeg bytes'), 'photo.jpg', 'text/html')},
+                      headers=auth_headers('user@test.com')).get_json()['file']['url']
+    response = client.get(url, headers=headers)
+    assert response.mimetype == 'image/jpeg'
+    assert response.headers['Content-Disposition'].startswith('inline')
+
+
+def test_media_jobs_add_derivatives_to_attachments(app, client, auth_headers, upload_dir, monkeypatch):
+    headers = auth_headers('user@test.com')
+    metadata = client.post('/api/uploads', data={'file': (io.BytesIO(b'fake image bytes'), 'photo.jpg')},
+                           headers=headers).get_json()['file']
+    job = MediaJob.query.filter_by(sha256=metadata['sha256']).one()
+    assert job.status == 'queued'
+
+    report_id = client.post('/api/reports', json={
+        'title': 'Incident', 'description': 'Details', 'category': 'verbal', 'file_attachments': [metadata]
+    }, headers=headers).get_json()['report']['id']
+
+    def fake_thumbnails(path):
+        target = storage.new_temp_path()
+        with open(target, 'wb') as f:
+            f.write(b'thumbnail of ' + open(path, 'rb').read())
+        return {'thumbnail': (target, 'image/jpeg', '.jpg')}
+
+    monkeypatch.setitem(media.RENDERERS, 'image', fake_thumbnails)
+    assert media.process_pending() == 1
+    assert db.session.get(MediaJob, job.id).status == 'done'
+
+    attachment = client.get(f'/api/reports/{report_id}', headers=headers).get_json()['file_attachments'][0]
+    thumbnail_url = attachment['derivatives']['thumbnail']
+    # The thumbnail is readable by whoever may read the upload it was rendered from
+    assert client.get(thumbnail_url, headers=headers).data == b'thumbnail of fake image bytes'
+    assert client.get(thumbnail_url, headers=auth_headers('other@test.com')).status_code == 403
+
+    # A report saved after processing finished picks the derivatives up straight away
+    later = client.post('/api/reports', json={
+        'title': 'Again', 'description': 'Details', 'category': 'verbal', 'file_attachments': [metadata]
+    }, headers=headers).get_json()['report']
+    assert later['file_attachments'][0]['derivatives'] == {'thumbnail': thumbnail_url}
+
+
+def test_real_renderers_store_typed_derivatives(client, auth_headers, upload_dir):
+    headers = auth_headers('user@test.com')
+    photo = io.BytesIO()
+    Image.new('RGB', (1200, 600), 'blue').save(photo, 'PNG')
+    photo.seek(0)
+    metadata = client.post('/api/uploads', data={'file': (photo, 'photo.png')}, headers=headers).get_json()['file']
+    assert media.process_pending() == 1
+
+    derivatives = MediaJob.query.filter_by(sha256=metadata['sha256']).one().get_derivatives()
+    assert derivatives['thumbnail'].endswith('.jpg') and derivatives['thumbnail_webp'].endswith('.webp')
+    for url, mimetype in [(derivatives['thumbnail'], 'image/jpeg'), (derivatives['thumbnail_webp'], 'image/webp')]:
+        response = client.get(url, headers=auth_headers('mod@test.com'))
+        assert response.mimetype == mimetype
+        with Image.open(io.BytesIO(response.data)) as thumbnail:
+            assert max(thumbnail.size) <= client.application.config['MEDIA_THUMBNAIL_SIZE']
+
+
+def test_rendering_leaves_the_gevent_loop(client, auth_headers, upload_dir, monkeypatch):
+    class ThreadPool:
+        """Stands in for gevent's hub threadpool: runs the work on a real OS thread"""
+        def apply(self, fn):
+            result = {}
+            worker = threading.Thread(target=lambda: result.update(value=fn()))
+            worker.start()
+            worker.join()
+            return result['value']
+
+    class Hub:
+        threadpool = ThreadPool()
+
+    rendered_on = []
+
+    def fake_thumbnails(path):
+        rendered_on.append(threading.get_ident())
+        target = storage.new_temp_path()  # Needs the app context the pool thread pushes
+        with open(target, 'wb') as f:
+            f.write(b'thumbnail')
+        return {'thumbnail': (target, 'image/jpeg', '.jpg')}
+
+    monkeypatch.setattr(media, 'get_hub', lambda: Hub())
+    monkeypatch.setattr(media, 'is_module_patched', lambda name: True, raising=False)
+    monkeypatch.setitem(media.RENDERERS, 'image', fake_thumbnails)
+    metadata = client.post('/api/uploads', data={'file': (io.BytesIO(b'image bytes'), 'photo.jpg')},
+                           headers=auth_headers('user@test.com')).get_json()['file']
+    assert media.process_pending() == 1
+    assert rendered_on and rendered_on[0] != threading.get_ident()
+    assert MediaJob.query.filter_by(sha256=metadata['sha256']).one().status == 'done'
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='ffmpeg is not installed')
+def test_real_video_poster(client, auth_headers, upload_dir, tmp_path):
+    video = tmp_path / 'clip.mp4'
+    subprocess.run(['ffmpeg', '-nostdin', '-loglevel', 'error', '-f', 'lavfi', '-i', 'testsrc=duration=2:size=640x360:rate=10',
+                    '-pix_fmt', 'yuv420p', str(video)], check=True)
+    metadata = client.post('/api/uploads', data={'file': (io.BytesIO(video.read_bytes()), 'clip.mp4')},
+                           headers=auth_headers('user@test.com')).get_json()['file']
+    assert media.process_pending() == 1
+
+    poster = MediaJob.query.filter_by(sha256=metadata['sha256']).one().get_derivatives()['poster']
+    assert poster.endswith('.jpg')
+    response = client.get(poster, headers=auth_headers('mod@test.com'))
+    assert response.mimetype == 'image/jpeg' and response.data[:2] == b'\xff\xd8'
+
+
+def test_media_queue_applies_backpressure(app, client, auth_headers, upload_dir):
+    app.config['MEDIA_QUEUE_LIMIT'] = 0
+    metadata = client.post('/api/uploads', data={'file': (io.BytesIO(b'more image bytes'), 'photo.png')},
+                           headers=auth_headers('user@test.com')).get_json()['file']
+    assert MediaJob.query.filter_by(sha256=metadata['sha256']).one().status == 'skipped'
+
+
+def test_images_are_stripped_and_downscaled_on_ingest(app, client, auth_headers, upload_dir):
+    app.config.update(IMAGE_INGEST_ENABLED=True, IMAGE_MAX_DIMENSION=100)
+
+    exif = Image.Exif()
+    exif[0x8825] = {2: (1.0, 17.0, 0.0)}  # GPSInfo: latitude
+    photo = io.BytesIO()
+    Image.new('RGB', (400, 200), 'red').save(photo, 'JPEG', exif=exif, quality=100)
+    photo.seek(0)
+
+    ingested = []
+    with ingest.image_ingested.connected_to(lambda sender, **kw: ingested.append(kw), app):
+        metadata = client.post('/api/uploads', data={'file': (photo, 'photo.jpg')},
+                               headers=auth_headers('user@test.com')).get_json()['file']
+
+    with Image.open(storage.blob_path(metadata['sha256'])) as stored:
+        assert stored.size == (100, 50)
+        assert not stored.getexif()
+    assert ingested[0]['stored_size'] == metadata['size'] < ingested[0]['original_size']
+    assert not os.path.exists(storage.original_path(metadata['sha256']))
+
+    corrupt = client.post('/api/uploads', data={'file': (io.BytesIO(b'not an image'), 'fake.jpg')},
+                          headers=auth_headers('user@test.com'))
+    assert corrupt.status_code == 400
+
+
+def test_startup_fails_when_photos_cannot_be_stripped(monkeypatch):
+    monkeypatch.setattr(ingest, 'Image', None)
+    with pytest.raises(RuntimeError, match='Pillow'):
+        create_app(TestConfig)
+
+    class NoIngestConfig(TestConfig):
+        IMAGE_INGEST_ENABLED = False
+    create_app(NoIngestConfig)
@@ -0,0 +1,134 @@
+"""
+Current-user resolution
+Resolves the JWT identity to a user through a bounded TTL/LRU cache. Every
+authenticated request checks that the token's user still exists and is
+active, which costs at most one users query per user per USER_CACHE_TTL
+"""
+from collections import OrderedDict, namedtuple
+from threading import Lock
+import time
+from flask import current_app
+import sys
+import os
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+from extensions import db
+from models import User
+
+# Detached, immutable copy of the fields routes need; safe to share across requests
+UserSnapshot = namedtuple('UserSnapshot', ['id', 'email', 'role', 'full_name', 'is_active'])
+
+_MISSING = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after ttl seconds"""
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return _MISSING
+            value, expires_at = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+def _cache():
+    return current_app.extensions['user_cache']
+
+
+def load_user(user_id):
+    """Return a UserSnapshot for user_id (cached), or None if the user doesn't exist"""
+    user = _cache().get(user_id)
+    if user is not _MISSING:
+        return user
+
+    row = db.session.get(User, user_id)
+    if row is None:
+        return None
+    user = UserSnapshot(row.id, row.email, row.role, row.full_name, row.is_active)
+    _cache().set(user_id, user)
+    return user
+
+
+def invalidate_user(user_id):
+    """Drop a cached user after it changes (e.g. is_active toggled).
+    Other worker processes pick the change up once their entry's TTL expires."""
+    _cache().delete(user_id)
+
+
+class LazyUser:
+    """
+    Value handed to flask-jwt-extended's current_user. The id comes straight
+    from the token; the database (via the cache) is only consulted when the
+    route asks for anything else, or checks the user exists with bool().
+    """
+    __slots__ = ('id', '_user', '_loaded')
+
+    def __init__(self, user_id):
+        self.id = user_id
+        self._user = None
+        self._loaded = False
+
+    def _resolve(self):
+        if not self._loaded:
+            self._user = load_user(self.id)
+            self._loaded = True
+        return self._user
+
+    def __bool__(self):
+        return self._resolve() is not None
+
+    def __getattr__(self, name):
+        user = self._resolve()
+        if user is None:
+            raise AttributeError(f'User {self.id} not found')
+        return getattr(user, name)
+
+    def __repr__(self):
+        return f'<LazyUser {self.id}>'
+
+
+def init_app(app, jwt):
+    """Create the per-app user cache and register the JWT user loader"""
+    app.extensions['user_cache'] = TTLCache(app.config['USER_CACHE_SIZE'], app.config['USER_CACHE_TTL'])
+
+    @jwt.user_lookup_loader
+    def user_lookup_callback(jwt_header, jwt_payload):
+        try:
+            return LazyUser(int(jwt_payload['sub']))
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    @jwt.token_in_blocklist_loader
+    def reject_inactive_user(jwt_header, jwt_payload):
+        """Tokens stop working once their user is deleted or deactivated (one cached lookup per request)"""
+        try:
+            user = load_user(int(jwt_payload['sub']))
+        except (KeyError, TypeError, ValueError):
+            return True
+        return user is None or not user.is_active
@@ -4,6 +4,7 @@
  */
 import { useState, useEffect } from 'react';
 import { reportsAPI } from '../services/api';
+import api from '../lib/axios';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
 import { 
   FileText, Clock, CheckCircle, XCircle, AlertCircle, Loader2, 
@@ -65,6 +66,17 @@ const ReportDetail = ({ reportId, onClose }: ReportDetailProps) => {
     }
   };
 
+  // Uploads need authorization, which a plain link can't send: fetch a short-lived link to the file instead
+  const openAttachment = async (url: string) => {
+    try {
+      const filename = url.split('/').pop();
+      const response = await api.post(`/uploads/files/${filename}/token`);
+      window.open(response.data.url, '_blank', 'noopener,noreferrer');
+    } catch (err: any) {
+      setError(err.response?.data?.error || 'Failed to open attachment');
+    }
+  };
+
   const getStatusBadge = (status: string) => {
     const statusConfig: Record<string, { icon: any; color: string; bg: string }> = {
       pending: { icon: Clock, color: 'text-yellow-600', bg: 'bg-yellow-50 border-yellow-200' },
@@ -174,16 +186,15 @@ const ReportDetail = ({ reportId, onClose }: ReportDetailProps) => {
               <label className="text-sm font-medium text-foreground">File Attachments</label>
               <div className="space-y-2">
                 {report.file_attachments.map((file: any, index: number) => (
-                  <a
+                  <button
                     key={index}
-                    href={file.url}
-                    target="_blank"
-                    rel="noopener noreferrer"
-                    className="flex items-center gap-2 p-2 bg-muted rounded-lg hover:bg-muted/80 transition-colors"
+                    type="button"
+                    onClick={() => openAttachment(file.url)}
+                    className="flex w-full items-center gap-2 p-2 bg-muted rounded-lg hover:bg-muted/80 transition-colors text-left"
                   >
                     <FileText className="w-4 h-4 text-primary" />
                     <span className="text-sm text-foreground">{file.name}</span>
-                  </a>
+                  </button>
                 ))}
               </div>
             </div>
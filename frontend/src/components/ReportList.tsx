@@ -5,6 +5,7 @@
 import { useState, useEffect } from 'react';
 import { reportsAPI } from '../services/api';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from '@/components/ui/card';
+import { Button } from '@/components/ui/button';
 import { FileText, Clock, CheckCircle, XCircle, AlertCircle, Loader2 } from 'lucide-react';
 
 interface Report {
@@ -18,6 +19,12 @@ interface Report {
   };
 }
 
+// GET /api/reports returns one page at a time; pass next_cursor back to get the next one
+interface ReportPage {
+  reports: Report[];
+  next_cursor: string | null;
+}
+
 interface ReportListProps {
   showAll?: boolean;
   onReportClick?: (report: Report) => void;
@@ -27,6 +34,8 @@ const ReportList = ({ showAll = false, onReportClick }: ReportListProps) => {
   const [reports, setReports] = useState<Report[]>([]);
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
 
   useEffect(() => {
     loadReports();
@@ -37,16 +46,35 @@ const ReportList = ({ showAll = false, onReportClick }: ReportListProps) => {
       setLoading(true);
       setError('');
       const response = await reportsAPI.getAll(showAll);
-      setReports(response.data || []);
+      const page: ReportPage = response.data;
+      setReports(page?.reports || []);
+      setNextCursor(page?.next_cursor || null);
     } catch (err: any) {
       console.error('Error loading reports:', err);
       setError(err.response?.data?.error || 'Failed to load reports');
       setReports([]);
+      setNextCursor(null);
     } finally {
       setLoading(false);
     }
   };
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    try {
+      setLoadingMore(true);
+      const response = await reportsAPI.getAll(showAll, nextCursor);
+      const page: ReportPage = response.data;
+      setReports(prev => [...prev, ...(page?.reports || [])]);
+      setNextCursor(page?.next_cursor || null);
+    } catch (err: any) {
+      console.error('Error loading reports:', err);
+      setError(err.response?.data?.error || 'Failed to load reports');
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const getStatusBadge = (status: string) => {
     const statusConfig: Record<string, { icon: any; color: string; bg: string }> = {
       pending: {
@@ -133,7 +161,9 @@ const ReportList = ({ showAll = false, onReportClick }: ReportListProps) => {
           </div>
           <div>
             <CardTitle className="text-2xl font-display">Reports</CardTitle>
-            <CardDescription>{reports.length} {reports.length === 1 ? 'report' : 'reports'} found</CardDescription>
+            <CardDescription>
+              {reports.length}{nextCursor ? '+' : ''} {reports.length === 1 && !nextCursor ? 'report' : 'reports'} found
+            </CardDescription>
           </div>
         </div>
       </CardHeader>
@@ -166,6 +196,13 @@ const ReportList = ({ showAll = false, onReportClick }: ReportListProps) => {
             </div>
           ))}
         </div>
+        {nextCursor && (
+          <div className="mt-4 flex justify-center">
+            <Button variant="outline" onClick={loadMore} disabled={loadingMore}>
+              {loadingMore ? <Loader2 className="w-4 h-4 animate-spin" /> : 'Load more'}
+            </Button>
+          </div>
+        )}
       </CardContent>
     </Card>
   );